@@ -1,48 +1,416 @@
 import os
+import cProfile
+import functools
+import hashlib
 import logging
-import pandas as pd
-import joblib
-from flask import Flask, request, jsonify
+import random
+import threading
+import time
+import numpy as np
+from flask import Blueprint, Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import warnings
-import shap
+
+# Modules légers uniquement : pandas, joblib, LightGBM, scikit-learn et shap ne sont importés
+# qu'au chargement des données et des modèles (voir load_state), pas à l'import de l'application
+from coalescer import MicroBatcher
+from explanations import EXPLAINER_BACKENDS, ShapCache, top_k_indices
+from id_allocator import IdAllocator
+from metrics import SIZE_BUCKETS, Metrics, gauge_lines
+from overrides import FeatureOverrides, InvalidOverride
+from serialization import encode
 
 # Ignorer les warnings
 warnings.filterwarnings("ignore")
 
-# Initialiser une application Flask
-app = Flask(__name__)
-CORS(app)
+# Routes de l'API, enregistrées sur l'application par create_app()
+api = Blueprint("api", __name__)
 
 # Activer les logs
 logging.basicConfig(level=logging.INFO)
 
-# Chemins des fichiers nécessaires
+# Chemins des fichiers nécessaires (surchargeables par variables d'environnement, ex. benchmarks)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "best_model_lgb_no.pkl")
-CLIENTS_DATA_PATH = os.path.join(BASE_DIR, "clients_data.csv")
-FEATURES_PATH = os.path.join(BASE_DIR, "selected_features.txt")
-
-# Vérifications et chargements initiaux
-if not os.path.exists(MODEL_PATH) or not os.path.exists(FEATURES_PATH):
-    raise FileNotFoundError("Modèle ou fichier des features introuvable.")
-
-# Charger le modèle
-model = joblib.load(MODEL_PATH)
-
-# Charger les features nécessaires
-with open(FEATURES_PATH, "r") as f:
-    required_features = f.read().strip().split(",")
-
-# Charger les données clients
-if os.path.exists(CLIENTS_DATA_PATH):
-    clients_data = pd.read_csv(CLIENTS_DATA_PATH)
-    logging.info(f"Fichier clients_data.csv chargé avec succès. Nombre de clients : {len(clients_data)}")
-else:
-    clients_data = pd.DataFrame()
-    logging.warning("Le fichier clients_data.csv est introuvable ou vide.")
-
-@app.route("/", methods=["GET"])
+MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(BASE_DIR, "best_model_lgb_no.pkl"))
+CLIENTS_DATA_PATH = os.environ.get("CLIENTS_DATA_PATH", os.path.join(BASE_DIR, "clients_data.csv"))
+# Format binaire memory-mappé (produit par convert_clients_data.py), prioritaire sur le CSV
+CLIENTS_STORE_PATH = os.environ.get("CLIENTS_STORE_PATH", os.path.join(BASE_DIR, "clients_store"))
+FEATURES_PATH = os.environ.get("FEATURES_PATH", os.path.join(BASE_DIR, "selected_features.txt"))
+# Artefacts supplémentaires (best_model_<nom>.pkl) servis à côté du modèle par défaut :
+# seuls les noms listés dans MODELS (séparés par des virgules, "*" pour tous) sont servis
+MODELS_DIR = os.environ.get("MODELS_DIR", os.path.join(os.path.dirname(BASE_DIR), "best modele"))
+MODELS = os.environ.get("MODELS", "")
+# Pool immuable des IDs attribuables aux nouveaux clients (le curseur est dans current_id.txt.cursor)
+ID_FILE_PATH = os.path.join(BASE_DIR, "current_id.txt")
+
+# Plafond mémoire du cache des valeurs SHAP par client (en Mo)
+SHAP_CACHE_MAX_MB = float(os.environ.get("SHAP_CACHE_MAX_MB", "64"))
+
+# Nombre de lignes scorées par appel au modèle dans /predict_batch, et nombre maximal de
+# lignes (IDs et lignes brutes) par requête
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "1000"))
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "10000"))
+
+# Moteur de scoring : "compiled" (arbres aplatis en NumPy, vérifiés contre LightGBM) ou "model".
+# Le moteur compilé n'est utilisé que jusqu'à COMPILED_ENGINE_MAX_ROWS lignes : au-delà,
+# la prédiction multi-thread de LightGBM est plus rapide
+SCORING_ENGINE = os.environ.get("SCORING_ENGINE", "compiled")
+COMPILED_ENGINE_MAX_ROWS = int(os.environ.get("COMPILED_ENGINE_MAX_ROWS", "64"))
+
+# Backend d'explication par défaut : "native" (contributions TreeSHAP de LightGBM, repli sur
+# shap pour les autres modèles) ou "shap" ; une requête peut le changer avec "explainer".
+# EXPLAIN_THREADS : threads LightGBM d'une explication unitaire (client seul, what-if), 1 par
+# défaut, les workers gunicorn se partageant déjà les coeurs ; EXPLAIN_BATCH_THREADS : threads
+# des lots et des importances globales, répartis par lignes (0 : tous les coeurs)
+EXPLAINER = os.environ.get("EXPLAINER", "native")
+EXPLAIN_THREADS = int(os.environ.get("EXPLAIN_THREADS", "1"))
+EXPLAIN_BATCH_THREADS = int(os.environ.get("EXPLAIN_BATCH_THREADS", "0"))
+
+# Période de contrôle des fichiers des modèles pour le rechargement à chaud (0 pour désactiver)
+MODEL_RELOAD_SECONDS = float(os.environ.get("MODEL_RELOAD_SECONDS", "10"))
+
+# Micro-batching des requêtes unitaires (optionnel) : taille maximale d'un lot et attente maximale
+PREDICT_COALESCE = os.environ.get("PREDICT_COALESCE", "0") == "1"
+PREDICT_COALESCE_MAX_BATCH = int(os.environ.get("PREDICT_COALESCE_MAX_BATCH", "32"))
+PREDICT_COALESCE_MAX_WAIT_MS = float(os.environ.get("PREDICT_COALESCE_MAX_WAIT_MS", "2"))
+
+# Importances globales : taille de l'échantillon stratifié servi en attendant le calcul exact
+# (0 pour désactiver) et période de surveillance des fichiers modèle/données (0 pour désactiver)
+GLOBAL_IMPORTANCE_SAMPLE_ROWS = int(os.environ.get("GLOBAL_IMPORTANCE_SAMPLE_ROWS", "2000"))
+GLOBAL_IMPORTANCE_REFRESH_SECONDS = float(os.environ.get("GLOBAL_IMPORTANCE_REFRESH_SECONDS", "0"))
+
+# Nombre d'IDs réservés d'un coup par chaque worker pour /get_next_client_id. Le pool est
+# petit : au-delà de 1, garder la taille du pool divisée par le nombre de workers comme plafond
+ID_LEASE_SIZE = int(os.environ.get("ID_LEASE_SIZE", "1"))
+
+# Métriques Prometheus : répertoire partagé par les workers gunicorn (vide : métriques du seul processus)
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+
+# Profilage cProfile d'une fraction des requêtes (0 pour désactiver), fichiers .prof écrits dans PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# Nombre maximal de jeux de valeurs personnalisées scorés ensemble par /predict_with_custom_values,
+# et de valeurs d'un balayage ("sweep")
+OVERRIDE_SETS_MAX = int(os.environ.get("OVERRIDE_SETS_MAX", "1000"))
+SWEEP_VALUES_MAX = int(os.environ.get("SWEEP_VALUES_MAX", "1000"))
+
+# Pagination de /get_client_ids : taille de page par défaut et maximale
+CLIENT_IDS_PAGE_SIZE = int(os.environ.get("CLIENT_IDS_PAGE_SIZE", "100"))
+CLIENT_IDS_MAX_PAGE_SIZE = int(os.environ.get("CLIENT_IDS_MAX_PAGE_SIZE", "1000"))
+
+# Ingestion de clients : journal de segments (partagé par les workers), période de prise en
+# compte des segments des autres workers (0 pour désactiver), nombre de segments déclenchant
+# une compaction dans le format binaire (0 pour désactiver), taille maximale d'une ingestion
+SEGMENTS_PATH = os.environ.get("SEGMENTS_PATH", os.path.join(CLIENTS_STORE_PATH, "segments"))
+INGEST_POLL_SECONDS = float(os.environ.get("INGEST_POLL_SECONDS", "2"))
+INGEST_COMPACT_SEGMENTS = int(os.environ.get("INGEST_COMPACT_SEGMENTS", "64"))
+INGEST_MAX_CLIENTS = int(os.environ.get("INGEST_MAX_CLIENTS", "1000"))
+
+# Suivi de la dérive : lignes de l'échantillon de référence tiré des données clients (0 pour
+# désactiver) et nombre d'intervalles (quantiles de la référence) par feature
+DRIFT_REFERENCE_ROWS = int(os.environ.get("DRIFT_REFERENCE_ROWS", "5000"))
+DRIFT_BINS = int(os.environ.get("DRIFT_BINS", "10"))
+
+# Chargement de l'état (données, modèles, importances globales) : "background" (thread lancé à la
+# création de l'application, /ready répond 503 en attendant), "lazy" (à la première requête) ou "eager"
+WARM_START = os.environ.get("WARM_START", "background")
+
+# Seuil de probabilité au-delà duquel le crédit est refusé
+DECISION_THRESHOLD = 0.09
+
+# Histogrammes des durées par endpoint et par étape, et des tailles de lots
+metrics = Metrics("projet7", METRICS_DIR or None)
+metrics.histogram("request_duration_seconds", "Durée totale de traitement des requêtes, par endpoint.")
+metrics.histogram("stage_duration_seconds", "Durée de chaque étape du traitement, par endpoint.")
+metrics.counter("requests_total", "Nombre de requêtes traitées, par endpoint et code de statut.")
+metrics.histogram("batch_rows", "Nombre de lignes scorées par appel au modèle en lot.", SIZE_BUCKETS)
+
+def endpoint_name():
+    """Nom de l'endpoint en cours, sans le préfixe du blueprint (étiquette des métriques)."""
+    return (request.endpoint or "unmatched").rsplit(".", 1)[-1]
+
+def stage(name):
+    """Chronométrer une étape de l'endpoint en cours."""
+    return metrics.time("stage_duration_seconds", endpoint=endpoint_name(), stage=name)
+
+# Cache des valeurs SHAP par version de modèle et client
+shap_cache = ShapCache(int(SHAP_CACHE_MAX_MB * 1024 * 1024))
+
+# Micro-batching optionnel, un regroupeur par modèle et backend d'explication (créé à la première requête) :
+# coalescers[modèle][explainer]
+coalescers = {}
+
+# Attribution des IDs des nouveaux clients, sûre entre workers
+id_allocator = IdAllocator(ID_FILE_PATH, lease_size=ID_LEASE_SIZE)
+
+# État chargé par load_state() : features, données clients, registre des modèles, importances globales
+STATE_NAMES = ("required_features", "feature_overrides", "feature_index", "features_digest", "clients_data",
+               "client_store", "registry", "global_importance", "segment_log",
+               "drift_monitor")
+_state_lock = threading.Lock()
+_state_ready = threading.Event()
+_state = {"started_at": None, "loaded_in_seconds": None, "error": None}
+
+# Ingestion : verrou de mise à jour du stockage, empreinte de meta.json au dernier chargement, thread de suivi
+_ingest_lock = threading.Lock()
+_ingest = {"store_stamp": None, "watcher_pid": None}
+
+def read_required_features(path=FEATURES_PATH):
+    """Liste ordonnée des features attendues par le modèle."""
+    with open(path, "r") as f:
+        return f.read().strip().split(",")
+
+def load_clients_data():
+    """Charger les données clients et construire le stockage indexé.
+
+    Le format binaire est memory-mappé (démarrage quasi instantané, pages partagées
+    entre workers) ; à défaut, le CSV est lu en mémoire.
+    """
+    import pandas as pd
+    from client_store import META_FILE, ClientStore
+
+    if os.path.exists(os.path.join(CLIENTS_STORE_PATH, META_FILE)):
+        store = ClientStore.from_directory(CLIENTS_STORE_PATH, required_features)
+        logging.info(f"Format binaire clients_store chargé (memory-map). Nombre de clients : {len(store)}")
+        frame = store.frame
+    elif os.path.exists(CLIENTS_DATA_PATH):
+        frame = pd.read_csv(CLIENTS_DATA_PATH)
+        logging.info(f"Fichier clients_data.csv chargé avec succès. Nombre de clients : {len(frame)}")
+        store = ClientStore.from_frame(frame, required_features)
+    else:
+        logging.warning("Le fichier clients_data.csv est introuvable ou vide.")
+        frame = pd.DataFrame()
+        store = ClientStore.from_frame(frame, required_features)
+
+    # Clients ingérés depuis la dernière compaction
+    for sequence, rows in segment_log.read_since(store.segments_through):
+        store.append(rows, sequence)
+    return frame, store
+
+def load_model(name, path):
+    """Charger un modèle du registre avec son explainer, son moteur compilé (vérifié à 1e-9
+    près contre predict_proba sur des clients existants) et son what-if incrémental."""
+    from model_registry import ModelBundle
+
+    return ModelBundle.load(name, path, required_features, client_store.features[:256],
+                            use_engine=SCORING_ENGINE == "compiled",
+                            max_engine_rows=COMPILED_ENGINE_MAX_ROWS,
+                            explainer_backend=EXPLAINER, explain_threads=EXPLAIN_THREADS,
+                            explain_batch_threads=EXPLAIN_BATCH_THREADS)
+
+def score_batch(model_name, explainer, design, shap_mask):
+    """Scorer un micro-lot : un appel de prédiction et un appel SHAP pour les lignes du masque."""
+    bundle = registry.get(model_name)
+    metrics.observe("batch_rows", len(design), source="coalescer")
+    probabilities = bundle.predict_design(design)
+    shap_values = bundle.explain_design(design[shap_mask], explainer) if shap_mask.any() else None
+    return probabilities, shap_values
+
+def coalescer_for(model_name, explainer):
+    by_explainer = coalescers.get(model_name)
+    if by_explainer is None:
+        by_explainer = coalescers.setdefault(model_name, {})
+    batcher = by_explainer.get(explainer)
+    if batcher is None:
+        batcher = by_explainer.setdefault(explainer, MicroBatcher(
+            functools.partial(score_batch, model_name, explainer),
+            PREDICT_COALESCE_MAX_BATCH, PREDICT_COALESCE_MAX_WAIT_MS))
+    return batcher
+
+def coalescer_stats():
+    """Statistiques des regroupeurs, par modèle puis par backend d'explication."""
+    return {name: {explainer: batcher.stats() for explainer, batcher in list(by_explainer.items())}
+            for name, by_explainer in list(coalescers.items())}
+
+def reload_for_global_importance():
+    """Recharger modèle et données depuis le disque pour recalculer les importances globales."""
+    import joblib
+    from model_registry import build_explainer
+
+    fresh_model = joblib.load(MODEL_PATH)
+    _, fresh_store = load_clients_data()
+    explainer = (build_explainer(EXPLAINER, fresh_model, None, EXPLAIN_THREADS, EXPLAIN_BATCH_THREADS)
+                 or build_explainer("shap", fresh_model, fresh_store.features[:256]))
+    return fresh_model, explainer, fresh_store.features
+
+def load_state():
+    """Charger features, données clients, modèles et importances globales, une seule fois.
+
+    Les appels concurrents attendent le premier chargement ; en cas d'échec, l'erreur est
+    exposée par /ready et le chargement sera retenté au prochain appel.
+    """
+    global required_features, feature_overrides, feature_index, features_digest
+    global clients_data, client_store, registry, global_importance, segment_log
+    global drift_monitor
+    if _state_ready.is_set():
+        return
+    with _state_lock:
+        if _state_ready.is_set():
+            return
+        started = time.perf_counter()
+        try:
+            from client_store import META_FILE
+            from global_importance import GlobalImportanceService
+            from model_registry import DEFAULT_MODEL, ModelRegistry, discover_models, file_stamp
+            from segment_log import SegmentLog
+
+            # Vérifications et chargements initiaux
+            if not os.path.exists(MODEL_PATH) or not os.path.exists(FEATURES_PATH):
+                raise FileNotFoundError("Modèle ou fichier des features introuvable.")
+
+            # Charger les features nécessaires
+            required_features = read_required_features()
+            feature_overrides = FeatureOverrides(required_features)
+            feature_index = feature_overrides.index
+
+            # Empreinte de la liste des features (partie de l'ETag du schéma)
+            features_digest = hashlib.sha1(",".join(required_features).encode()).hexdigest()[:12]
+
+            # Charger les données clients et construire le stockage indexé (index SK_ID_CURR + matrice des features),
+            # complété par les clients ingérés depuis la dernière compaction
+            segment_log = SegmentLog(SEGMENTS_PATH)
+            _ingest["store_stamp"] = file_stamp(os.path.join(CLIENTS_STORE_PATH, META_FILE))
+            clients_data, client_store = load_clients_data()
+
+            # Registre des modèles : le modèle par défaut et les artefacts de MODELS_DIR listés dans MODELS, rechargés à chaud
+            names = None if MODELS.strip() == "*" else [name.strip() for name in MODELS.split(",") if name.strip()]
+            registry = ModelRegistry({DEFAULT_MODEL: MODEL_PATH, **discover_models(MODELS_DIR, names)}, load_model,
+                                     reload_interval=MODEL_RELOAD_SECONDS)
+            logging.info(f"Modèles chargés : {', '.join(registry.names())}")
+
+            # Suivi de la dérive des features et des probabilités par rapport aux données clients
+            drift_monitor = build_drift_monitor()
+
+            # Importances globales précalculées pour le modèle par défaut (artefact versionné à côté du modèle,
+            # version des données : meta.json du format binaire s'il existe, sinon le CSV)
+            global_importance = GlobalImportanceService(
+                os.path.dirname(MODEL_PATH), MODEL_PATH, CLIENTS_DATA_PATH, required_features,
+                sample_rows=GLOBAL_IMPORTANCE_SAMPLE_ROWS, store_path=CLIENTS_STORE_PATH,
+            )
+            if not client_store.empty:
+                default_bundle = registry.get()
+                global_importance.start(default_bundle.model, default_bundle.explainer, client_store.features)
+                if GLOBAL_IMPORTANCE_REFRESH_SECONDS > 0:
+                    global_importance.watch(GLOBAL_IMPORTANCE_REFRESH_SECONDS, reload_for_global_importance)
+        except Exception as e:
+            _state["error"] = f"{type(e).__name__}: {e}"
+            logging.error(f"Erreur lors du chargement du service : {e}")
+            raise
+        _state.update(error=None, loaded_in_seconds=time.perf_counter() - started)
+        _state_ready.set()
+        logging.info(f"Service chargé en {_state['loaded_in_seconds']:.2f} s.")
+
+def build_drift_monitor():
+    """Moniteur de dérive dont la référence est un échantillon des clients, scoré par le modèle par défaut."""
+    from drift import DriftMonitor
+
+    if DRIFT_REFERENCE_ROWS <= 0 or client_store.empty:
+        return None
+    rng = np.random.default_rng(0)
+    n_rows = min(DRIFT_REFERENCE_ROWS, client_store.n_base)
+    positions = np.sort(rng.choice(client_store.n_base, size=n_rows, replace=False))
+    reference = np.asarray(client_store.features[positions], dtype=np.float64)
+    probabilities = registry.get().predict_positive(reference, client_store.base_ids[positions])
+    return DriftMonitor(required_features, reference, probabilities, n_bins=DRIFT_BINS,
+                        threshold=DECISION_THRESHOLD, directory=METRICS_DIR or None)
+
+def observe_drift(bundle, features, probabilities):
+    """Ajouter des lignes scorées au suivi de la dérive (probabilités comptées pour le seul modèle par défaut)."""
+    if drift_monitor is None:
+        return
+    with stage("drift"):
+        drift_monitor.observe(features, probabilities if bundle.name == registry.default else None)
+
+def refresh_clients():
+    """Appliquer les segments écrits depuis le dernier passage ; recharger le stockage après une compaction.
+
+    Après une compaction, meta.json a changé : le stockage est rechargé (memory-map, sans
+    copie) puis substitué d'un coup, les requêtes en cours gardent l'ancien.
+    """
+    global clients_data, client_store
+    from client_store import META_FILE
+    from model_registry import file_stamp
+
+    with _ingest_lock:
+        stamp = file_stamp(os.path.join(CLIENTS_STORE_PATH, META_FILE))
+        if stamp != _ingest["store_stamp"]:
+            clients_data, client_store = load_clients_data()
+            _ingest["store_stamp"] = stamp
+            return
+        for sequence, rows in segment_log.read_since(client_store.segments_through):
+            client_store.append(rows, sequence)
+
+def ensure_ingest_watch():
+    """Suivre les segments des autres workers et compacter le journal (un thread par processus)."""
+    if INGEST_POLL_SECONDS <= 0 or _ingest["watcher_pid"] == os.getpid():
+        return
+    with _ingest_lock:
+        if _ingest["watcher_pid"] == os.getpid():
+            return
+        _ingest["watcher_pid"] = os.getpid()
+
+    def loop():
+        from segment_log import compact
+
+        while True:
+            time.sleep(INGEST_POLL_SECONDS)
+            try:
+                refresh_clients()
+                # Les segments intégrés par une compaction sont supprimés : ceux qui restent sont en attente
+                if 0 < INGEST_COMPACT_SEGMENTS <= len(segment_log.sequences()):
+                    compact(CLIENTS_STORE_PATH, segment_log, required_features, CLIENTS_DATA_PATH)
+                    refresh_clients()
+            except Exception as e:
+                logging.error(f"Erreur lors du suivi des clients ingérés : {e}")
+
+    threading.Thread(target=loop, name="client-ingest-watch", daemon=True).start()
+
+def start_background_load():
+    """Charger l'état dans un thread (un par processus)."""
+    if _state_ready.is_set() or _state["started_at"] == os.getpid():
+        return
+    _state["started_at"] = os.getpid()
+
+    def run():
+        try:
+            warmup()
+        except Exception:
+            pass
+
+    threading.Thread(target=run, name="warm-start", daemon=True).start()
+
+def __getattr__(name):
+    # État chargé à la demande : `from app import client_store` attend la fin du chargement
+    if name in STATE_NAMES:
+        load_state()
+        return globals()[name]
+    # Modèle par défaut courant (il peut avoir été rechargé à chaud depuis l'import)
+    if name == "model":
+        load_state()
+        return registry.get().model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def shutdown_worker():
+    """Arrêt d'un worker : rendre les IDs réservés et écrire ses derniers instantanés de métriques et de dérive."""
+    id_allocator.release()
+    metrics.flush()
+    monitor = globals().get("drift_monitor")
+    if monitor is not None:
+        monitor.flush()
+
+def warmup():
+    """Charger l'état puis préchauffer les prédicteurs et les explainers SHAP de tous les modèles."""
+    load_state()
+    if client_store.empty:
+        sample = np.zeros((1, len(required_features)))
+    else:
+        sample = np.asarray(client_store.features[:1])
+    for name in registry.names():
+        registry.get(name).warmup(sample)
+    logging.info("Modèles et explainers SHAP préchauffés.")
+
+@api.route("/", methods=["GET"])
 def index():
     """Endpoint pour afficher saisir et afficher prediction a partir d'un formulaire"""
     html_form = """
@@ -94,229 +462,726 @@ def index():
     """
     return html_form
 
-@app.route("/get_client_ids", methods=["GET"])
+def credit_decision(probability_of_default):
+    """Décision basée sur le seuil"""
+    return "Crédit refusé" if probability_of_default > DECISION_THRESHOLD else "Crédit accepté"
+
+def respond(payload, status=200):
+    """Réponse encodée par le sérialiseur rapide (orjson, ou msgpack si demandé dans Accept)"""
+    body, mimetype = encode(payload, request.headers.get("Accept"))
+    return Response(body, status=status, mimetype=mimetype)
+
+def explanation_fields(shap_values, data):
+    """Valeurs SHAP renvoyées selon les options de la requête (top_k, include_feature_names).
+
+    Avec top_k, seules les k contributions les plus fortes sont renvoyées, avec leurs indices
+    dans la liste des features servie par /schema.
+    """
+    include_names = data.get("include_feature_names", True)
+    top_k = requested_top_k(data)
+    if not top_k:
+        fields = {"shap_values": shap_values}
+        if include_names:
+            fields["feature_names"] = required_features
+        return fields
+
+    indices = top_k_indices(shap_values, top_k)[0]
+    fields = {"shap_values": shap_values[indices], "feature_indices": indices}
+    if include_names:
+        fields["feature_names"] = [required_features[i] for i in indices]
+    return fields
+
+def requested_model(data):
+    """Modèle demandé par la requête (champ "model" ou paramètre ?model=), None s'il est inconnu."""
+    name = data.get("model") or request.args.get("model")
+    if name is not None and name not in registry:
+        return None
+    return registry.get(name)
+
+def requested_explainer(bundle, data):
+    """Backend d'explication de la requête (champ "explainer" ou ?explainer=), résolu pour le modèle ;
+    None s'il est inconnu."""
+    name = data.get("explainer") or request.args.get("explainer")
+    if name is not None and name not in EXPLAINER_BACKENDS:
+        return None
+    return bundle.explainer_name(name)
+
+def requested_top_k(data):
+    """Nombre de contributions SHAP demandé (champ "top_k") : 0 s'il est absent, None s'il n'est pas un entier positif."""
+    top_k = data.get("top_k")
+    if top_k is None:
+        return 0
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k <= 0:
+        return None
+    return top_k
+
+def invalid_top_k_response():
+    return jsonify({"error": "top_k doit être un entier strictement positif."}), 400
+
+def unknown_explainer_response():
+    return jsonify({"error": f"Explainer inconnu. Backends disponibles : {', '.join(EXPLAINER_BACKENDS)}"}), 400
+
+def unknown_model_response():
+    return jsonify({"error": f"Modèle inconnu. Modèles disponibles : {', '.join(registry.names())}"}), 400
+
+def score_row(bundle, data_for_prediction, sk_id_curr=None, use_cache=True, explainer=None):
+    """Probabilité de défaut et valeurs SHAP d'une ligne pour un modèle du registre.
+
+    Les valeurs SHAP d'un client existant sont servies depuis le cache si possible ;
+    avec le micro-batching activé, la ligne est scorée avec les requêtes concurrentes.
+    """
+    explainer = bundle.explainer_name(explainer)
+    cache_key = (bundle.version, explainer, sk_id_curr) if use_cache and sk_id_curr is not None else None
+    shap_values = shap_cache.get(cache_key) if cache_key is not None else None
+    design = bundle.design(data_for_prediction, None if sk_id_curr is None else [sk_id_curr])
+
+    if PREDICT_COALESCE:
+        with stage("coalesced_scoring"):
+            batcher = coalescer_for(bundle.name, explainer)
+            probability_of_default, computed = batcher.submit(design, with_shap=shap_values is None).result()
+    else:
+        with stage("predict"):
+            probability_of_default = bundle.predict_design(design)[0]
+        computed = None
+        if shap_values is None:
+            with stage("shap"):
+                computed = bundle.explain_design(design, explainer)[0]
+
+    if shap_values is None:
+        shap_values = computed
+        if cache_key is not None:
+            shap_cache.put(cache_key, shap_values)
+    return probability_of_default, shap_values
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@api.before_app_request
+def require_state():
+    """Attendre le chargement de l'état avant de servir une route qui en dépend."""
+    if endpoint_name() in ("index", "ready", "prometheus_metrics", "unmatched"):
+        return None
+    try:
+        load_state()
+    except Exception:
+        return jsonify({"error": "Service indisponible : chargement en échec.", "detail": _state["error"]}), 503
+    ensure_ingest_watch()
+
+@api.after_app_request
+def record_request(response):
+    """Durée totale et statut de la requête ; écriture du profil si la requête a été échantillonnée."""
+    endpoint = endpoint_name()
+    metrics.observe("request_duration_seconds", time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.inc("requests_total", endpoint=endpoint, status=response.status_code)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{endpoint}_{os.getpid()}_{time.time_ns()}.prof"))
+    return response
+
+@api.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Métriques au format texte Prometheus (durées par étape, caches, lots, modèles chargés)"""
+    cache = shap_cache.stats()
+    lines = metrics.render()
+    lines += gauge_lines("projet7_shap_cache_entries", "Entrées du cache SHAP de ce worker.",
+                         [({}, cache["entries"])])
+    lines += gauge_lines("projet7_shap_cache_bytes", "Taille du cache SHAP de ce worker (octets).",
+                         [({}, cache["bytes"])])
+    lines += gauge_lines("projet7_shap_cache_hit_ratio", "Taux de succès du cache SHAP de ce worker.",
+                         [({}, cache["hit_rate"])])
+    batchers = [({"model": name, "explainer": explainer}, batcher)
+                for name, by_explainer in coalescer_stats().items() for explainer, batcher in by_explainer.items()]
+    lines += gauge_lines("projet7_coalescer_queue_depth", "Requêtes en attente de micro-batching.",
+                         [(labels, batcher["queue_depth"]) for labels, batcher in batchers])
+    lines += gauge_lines("projet7_coalescer_mean_batch_size", "Taille moyenne des micro-lots de ce worker.",
+                         [(labels, batcher["mean_batch_size"]) for labels, batcher in batchers])
+    # Aucun modèle tant que l'état n'est pas chargé : /metrics ne déclenche pas le chargement
+    models = registry.stats()["models"] if _state_ready.is_set() else {}
+    lines += gauge_lines("projet7_ready", "État chargé (1) ou en cours de chargement (0).",
+                         [({}, int(_state_ready.is_set()))])
+    if _state_ready.is_set() and drift_monitor is not None:
+        report = drift_monitor.report(top=0)
+        lines += gauge_lines("projet7_drift_prediction_psi", "PSI des probabilités de défaut par rapport à la référence.",
+                             [({}, report["prediction"]["psi"])])
+        lines += gauge_lines("projet7_drift_features_drifted", "Features en dérive forte (PSI >= 0.25).",
+                             [({}, report["drifted_features"])])
+    lines += gauge_lines("projet7_model_info", "Modèles chargés (version de l'artefact).",
+                         [({"model": name, "version": info["version"], "type": info["type"],
+                            "compiled": str(info["compiled"]).lower()}, 1) for name, info in models.items()])
+    lines += gauge_lines("projet7_model_loaded_timestamp_seconds", "Date de chargement de chaque modèle.",
+                         [({"model": name}, info["loaded_at"]) for name, info in models.items()])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@api.route("/ready", methods=["GET"])
+def ready():
+    """Disponibilité du service : 200 une fois données et modèles chargés, 503 avant ou en cas d'échec."""
+    if not _state_ready.is_set():
+        status = "error" if _state["error"] else "loading"
+        return jsonify({"status": status, "error": _state["error"]}), 503
+    return jsonify({
+        "status": "ready",
+        "models": registry.names(),
+        "clients": len(client_store),
+        "loaded_in_seconds": round(_state["loaded_in_seconds"], 3),
+    })
+
+@api.route("/stats", methods=["GET"])
+def stats():
+    """Compteurs internes du service (modèles chargés, cache SHAP, micro-batching, IDs restants)"""
+    return jsonify({
+        "model_version": registry.get().version,
+        "models": registry.stats(),
+        "shap_cache": shap_cache.stats(),
+        "coalescer": coalescer_stats() if PREDICT_COALESCE else None,
+        "client_ids_remaining": id_allocator.remaining()
+    }), 200
+
+@api.route("/drift", methods=["GET"])
+def drift():
+    """Dérive des features (PSI, moyennes, valeurs manquantes) et des probabilités, fusionnée entre workers.
+
+    Les requêtes de simulation (/predict_with_custom_values) ne sont pas comptées.
+    """
+    try:
+        if drift_monitor is None:
+            return jsonify({"error": "Suivi de la dérive désactivé ou données de référence indisponibles."}), 404
+        top = request.args.get("top", type=int)
+        if "top" in request.args and (top is None or top < 0):
+            return jsonify({"error": "top doit être un entier positif ou nul."}), 400
+        with stage("report"):
+            report = drift_monitor.report(top=top)
+        return respond(report)
+
+    except Exception as e:
+        logging.error(f"Erreur lors du calcul de la dérive : {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/schema", methods=["GET"])
+def schema():
+    """Noms des features et version du modèle, à mettre en cache côté client (ETag)"""
+    model_version = registry.get().version
+    response = respond({
+        "model_version": model_version,
+        "models": registry.names(),
+        "feature_names": required_features,
+        "decision_threshold": DECISION_THRESHOLD
+    })
+    response.set_etag(f"{model_version}-{features_digest}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
+
+@api.route("/get_client_ids", methods=["GET"])
 def get_client_ids():
-    """Récupérer la liste des IDs clients disponibles"""
-    if clients_data.empty:
-        return jsonify({"client_ids": []}), 200
-    return jsonify({"client_ids": clients_data["SK_ID_CURR"].tolist()}), 200
+    """Récupérer les IDs clients disponibles.
+
+    Sans paramètre, la liste complète (ancien comportement). Avec `limit`, `cursor`,
+    `prefix`, `min_id` ou `max_id`, une page d'IDs triés, le nombre total de
+    correspondances et le curseur de la page suivante (None à la dernière page).
+    """
+    paginated = any(key in request.args for key in ("limit", "cursor", "prefix", "min_id", "max_id"))
+    if not paginated:
+        if client_store.empty:
+            return jsonify({"client_ids": []}), 200
+        return respond({"client_ids": client_store.ids})
+
+    try:
+        limit = request.args.get("limit", CLIENT_IDS_PAGE_SIZE, type=int)
+        cursor, min_id, max_id = (request.args.get(key, type=int) for key in ("cursor", "min_id", "max_id"))
+        prefix = request.args.get("prefix", "").strip()
+        if limit is None or not 1 <= limit <= CLIENT_IDS_MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit doit être compris entre 1 et {CLIENT_IDS_MAX_PAGE_SIZE}."}), 400
+        if any(request.args.get(key) and value is None
+               for key, value in (("cursor", cursor), ("min_id", min_id), ("max_id", max_id))):
+            return jsonify({"error": "cursor, min_id et max_id doivent être des entiers."}), 400
+        if prefix and not prefix.isdigit():
+            return jsonify({"error": "prefix doit être composé de chiffres."}), 400
+
+        with stage("search"):
+            ids, total, next_cursor = client_store.search_ids(limit=limit, after=cursor, prefix=prefix or None,
+                                                              min_id=min_id, max_id=max_id)
+        return respond({"client_ids": ids, "total": total, "next_cursor": next_cursor, "limit": limit})
 
-@app.route("/predict", methods=["POST"])
+    except Exception as e:
+        logging.error(f"Erreur lors de la recherche des IDs clients : {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/predict", methods=["POST"])
 def predict():
     """Faire une prédiction pour un client donné"""
     try:
         # Récupérer les données envoyées
         data = request.get_json()
         sk_id_curr = int(data.get("SK_ID_CURR"))
+        bundle = requested_model(data)
+        if bundle is None:
+            return unknown_model_response()
+        explainer = requested_explainer(bundle, data)
+        if explainer is None:
+            return unknown_explainer_response()
+        if requested_top_k(data) is None:
+            return invalid_top_k_response()
 
-        # Trouver les données du client
-        client_data = clients_data[clients_data["SK_ID_CURR"] == sk_id_curr]
-        if client_data.empty:
+        # Trouver les données du client (vue sur la matrice des features)
+        with stage("lookup"):
+            data_for_prediction = client_store.row(sk_id_curr)
+        if data_for_prediction is None:
             return jsonify({"error": f"Client {sk_id_curr} introuvable."}), 404
 
-        # Préparer les données pour la prédiction
-        data_for_prediction = client_data[required_features]
-        logging.info(f"Données prêtes pour la prédiction :\n{data_for_prediction}")
-
-        # Prédiction avec le modèle
-        predictions = model.predict_proba(data_for_prediction)
-        probability_of_default = predictions[0][1]  # Probabilité pour la classe positive
-        logging.info(f"Probabilité de défaut de paiement : {probability_of_default}")
+        # Prédiction avec le modèle et valeurs SHAP (cache par version du modèle et client)
+        probability_of_default, shap_values = score_row(bundle, data_for_prediction, sk_id_curr,
+                                                        explainer=explainer)
+        logging.debug(f"Probabilité de défaut de paiement : {probability_of_default}")
+        observe_drift(bundle, data_for_prediction, probability_of_default)
 
         # Décision basée sur le seuil
-        decision = "Crédit refusé" if probability_of_default > 0.09 else "Crédit accepté"
-        
-        # Calcul des valeurs SHAP
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(data_for_prediction)
-
-        # Gestion des SHAP values pour plusieurs classes
-        if len(shap_values) > 1:
-            shap_values = shap_values[1]  # SHAP values pour la classe positive
-        else:
-            shap_values = shap_values[0]
-
-        # Informations descriptives du client
-        client_info = client_data.iloc[0].to_dict()
+        decision = credit_decision(probability_of_default)
 
-        # Retourner la réponse
-        return jsonify({
+        # Retourner la réponse (SHAP et informations descriptives selon les options de la requête)
+        response = {
             "SK_ID_CURR": sk_id_curr,
             "probability_of_default": float(f"{probability_of_default:.2f}"),
-            "shap_values": shap_values.tolist(),
-            "feature_names": required_features,
-            "client_info": client_info,
-            "decision": decision        
-        }), 200
+            "decision": decision,
+            "model": bundle.name,
+            "explainer": explainer
+        }
+        response.update(explanation_fields(shap_values, data))
+        if data.get("include_client_info", True):
+            with stage("client_info"):
+                response["client_info"] = client_store.client_info(sk_id_curr)
+        with stage("serialize"):
+            return respond(response)
 
     except Exception as e:
         logging.error(f"Erreur lors de la prédiction : {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/get_global_importance", methods=["GET"])
-def get_global_importance():
-    """Calculer les importances globales des caractéristiques"""
+@api.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    """Scorer en une requête une liste d'IDs clients et/ou de lignes de features brutes"""
     try:
-        if clients_data.empty:
-            return jsonify({"error": "Les données clients sont vides ou indisponibles."}), 404
+        data = request.get_json()
+        sk_ids = data.get("SK_ID_CURR", [])
+        rows = data.get("rows", [])
+        if not isinstance(sk_ids, list) or not isinstance(rows, list):
+            return jsonify({"error": "SK_ID_CURR et rows doivent être des listes."}), 400
+        if len(sk_ids) + len(rows) > BATCH_MAX_ROWS:
+            return jsonify({"error": f"Au plus {BATCH_MAX_ROWS} lignes (SK_ID_CURR et rows) par lot."}), 400
+        chunk_size = data.get("chunk_size", BATCH_CHUNK_SIZE)
+        top_k = requested_top_k(data)
+        include_shap = bool(data.get("include_shap", True))
+        if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size <= 0:
+            return jsonify({"error": "chunk_size doit être un entier strictement positif."}), 400
+        bundle = requested_model(data)
+        if bundle is None:
+            return unknown_model_response()
+        explainer = requested_explainer(bundle, data)
+        if explainer is None:
+            return unknown_explainer_response()
+        if top_k is None:
+            return invalid_top_k_response()
 
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(clients_data[required_features])
+        # Rassembler les lignes à scorer dans une seule matrice
+        results = []
+        matrix_rows = []
+        matrix_ids = []
+        with stage("assemble"):
+            for position, sk_id_curr in enumerate(sk_ids):
+                try:
+                    sk_id_curr = int(sk_id_curr)
+                except (TypeError, ValueError):
+                    raise InvalidOverride(f"SK_ID_CURR invalide à la position {position}.")
+                position = client_store.position(sk_id_curr)
+                if position is None:
+                    results.append({"SK_ID_CURR": sk_id_curr, "error": f"Client {sk_id_curr} introuvable."})
+                    continue
+                results.append({"SK_ID_CURR": sk_id_curr})
+                matrix_rows.append(client_store.row_at(position)[0])
+                matrix_ids.append(sk_id_curr)
+            # Lignes brutes validées et converties comme les valeurs personnalisées ; les features
+            # absentes d'une ligne sont traitées comme valeurs manquantes
+            try:
+                raw_rows = feature_overrides.apply_many(np.full(len(required_features), np.nan), rows)
+            except InvalidOverride as e:
+                raise InvalidOverride(f"rows : {e}")
+            for position, (row, raw_row) in enumerate(zip(rows, raw_rows)):
+                sk_id_curr = row.get("SK_ID_CURR")
+                try:
+                    matrix_ids.append(int(sk_id_curr or 0))
+                except (TypeError, ValueError):
+                    raise InvalidOverride(f"rows : SK_ID_CURR invalide pour la ligne {position}.")
+                results.append({"SK_ID_CURR": sk_id_curr})
+                matrix_rows.append(raw_row)
 
-        if isinstance(shap_values, list):
-            shap_values = shap_values[1]
+        scored = [result for result in results if "error" not in result]
+        if matrix_rows:
+            features = np.vstack(matrix_rows)
+            design = bundle.design(features, matrix_ids)
+            for start in range(0, len(design), chunk_size):
+                chunk = design[start:start + chunk_size]
+                metrics.observe("batch_rows", len(chunk), source="predict_batch")
+                with stage("predict"):
+                    probabilities = bundle.predict_design(chunk)
+                observe_drift(bundle, features[start:start + chunk_size], probabilities)
+                with stage("shap"):
+                    shap_values = bundle.explain_design(chunk, explainer) if include_shap else None
+                if shap_values is not None and top_k:
+                    top_indices = top_k_indices(shap_values, top_k)
 
-        global_importances = pd.DataFrame({
-            "Feature": required_features,
-            "Global Importance": abs(shap_values).mean(axis=0)
-        }).sort_values(by="Global Importance", ascending=False)
+                for offset, probability_of_default in enumerate(probabilities):
+                    result = scored[start + offset]
+                    result["probability_of_default"] = float(probability_of_default)
+                    result["decision"] = credit_decision(probability_of_default)
+                    if shap_values is None:
+                        continue
+                    if top_k:
+                        result["top_features"] = [
+                            {"feature": required_features[i], "shap_value": float(shap_values[offset, i])}
+                            for i in top_indices[offset]
+                        ]
+                    else:
+                        result["shap_values"] = shap_values[offset]
 
-        return jsonify({
-            "status": "success",
-            "global_importances": global_importances.to_dict(orient="records")
-        }), 200
+        response = {"results": results, "model": bundle.name, "explainer": explainer}
+        if include_shap and not top_k and data.get("include_feature_names", True):
+            response["feature_names"] = required_features
+        with stage("serialize"):
+            return respond(response)
+
+    except InvalidOverride as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erreur lors de la prédiction par lot : {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/get_global_importance", methods=["GET"])
+def get_global_importance():
+    """Renvoyer les importances globales des caractéristiques (précalculées)"""
+    try:
+        if client_store.empty:
+            return jsonify({"error": "Les données clients sont vides ou indisponibles."}), 404
+
+        result = global_importance.current()
+        if result is None:
+            return jsonify({"error": "Importances globales en cours de calcul."}), 503
+
+        with stage("serialize"):
+            return respond({
+                "status": "success",
+                "mode": result["mode"],
+                "rows": result["rows"],
+                "model_version": result["model_version"],
+                "global_importances": result["global_importances"]
+            })
 
     except Exception as e:
         logging.error(f"Erreur lors du calcul des importances globales : {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/predict_with_custom_values", methods=["POST"])
+@api.route("/predict_with_custom_values", methods=["POST"])
 def predict_with_custom_values():
     """Faire une prédiction avec des valeurs modifiées par l'utilisateur"""
     try:
         # Récupérer les données envoyées
         data = request.get_json()
         sk_id_curr = int(data.get("SK_ID_CURR"))
+        bundle = requested_model(data)
+        if bundle is None:
+            return unknown_model_response()
+        explainer = requested_explainer(bundle, data)
+        if explainer is None:
+            return unknown_explainer_response()
+        if requested_top_k(data) is None:
+            return invalid_top_k_response()
 
         # Trouver les données du client
-        client_data = clients_data[clients_data["SK_ID_CURR"] == sk_id_curr].copy()
-        if client_data.empty:
+        with stage("lookup"):
+            base_row = client_store.row(sk_id_curr)
+        if base_row is None:
             return jsonify({"error": f"Client {sk_id_curr} introuvable."}), 404
+        with stage("client_info"):
+            client_info = client_store.client_info(sk_id_curr)
 
-        # Mise à jour des valeurs si elles sont fournies dans la requête
+        # Valeurs fournies dans la requête : validées et converties en un seul passage
         for key, value in data.items():
-            if key in client_data.columns and value is not None:
-                client_data[key] = value
-
-        # Préparer les données pour la prédiction
-        data_for_prediction = client_data[required_features]
-        logging.info(f"Données prêtes pour la prédiction avec valeurs personnalisées :\n{data_for_prediction}")
-
-        # Prédiction avec le modèle
-        predictions = model.predict_proba(data_for_prediction)
-        probability_of_default = predictions[0][1]  # Probabilité pour la classe positive
-        logging.info(f"Probabilité de défaut de paiement avec valeurs personnalisées : {probability_of_default}")
-    
-        # Calcul des valeurs SHAP
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(data_for_prediction)
-
-        # Gestion des SHAP values pour plusieurs classes
-        if len(shap_values) > 1:
-            shap_values = shap_values[1]  # SHAP values pour la classe positive
-        else:
-            shap_values = shap_values[0]
+            if key in client_info and value is not None:
+                client_info[key] = value
+        indices, values = feature_overrides.parse(data)
+        overrides = dict(zip(indices.tolist(), values.tolist()))
+        override_sets = data.get("override_sets")
+        if override_sets is not None:
+            if not isinstance(override_sets, list) or len(override_sets) > OVERRIDE_SETS_MAX:
+                return jsonify({"error": f"override_sets doit être une liste d'au plus {OVERRIDE_SETS_MAX} objets."}), 400
 
-        # Informations descriptives du client
-        client_info = client_data.iloc[0].to_dict()
+        # Prédiction et valeurs SHAP : incrémentales à partir de la référence du client si possible.
+        # Les deltas incrémentaux sont des contributions natives de LightGBM : avec un autre
+        # explainer demandé, les valeurs SHAP sont recalculées entièrement par celui-ci
+        whatif = bundle.whatif
+        if whatif is not None and explainer == "native":
+            _, base_shap = score_row(bundle, base_row, sk_id_curr, explainer=explainer)
+            with stage("whatif"):
+                probability_of_default, shap_values, _ = whatif.evaluate(base_row, base_shap, overrides)
+        else:
+            probability_of_default, shap_values = score_row(bundle, feature_overrides.apply(base_row, data),
+                                                            sk_id_curr, use_cache=False, explainer=explainer)
+        logging.debug(f"Probabilité de défaut de paiement avec valeurs personnalisées : {probability_of_default}")
 
-        # Retourner la réponse
-        return jsonify({
+        response = {
             "SK_ID_CURR": sk_id_curr,
             "probability_of_default": probability_of_default,
-            "shap_values": shap_values.tolist(),
-            "feature_names": required_features,
-            "client_info": client_info,      
-        }), 200
+            "model": bundle.name,
+            "explainer": explainer
+        }
+        response.update(explanation_fields(shap_values, data))
+        if data.get("include_client_info", True):
+            response["client_info"] = client_info
 
-    except Exception as e:
-        logging.error(f"Erreur lors de la prédiction avec valeurs personnalisées : {e}")
-        return jsonify({"error": str(e)}), 500
+        modified_row = base_row.copy()
+        modified_row[0, indices] = values
 
-# Chemin vers le fichier contenant la liste d'IDs disponibles
-ID_FILE_PATH = "current_id.txt"
+        # Scénarios : plusieurs jeux de valeurs appliqués à la ligne modifiée, scorés en une matrice
+        if override_sets is not None:
+            with stage("scenarios"):
+                matrix = feature_overrides.apply_many(modified_row, override_sets)
+                ids = np.full(len(matrix), sk_id_curr)
+                probabilities = bundle.predict_positive(matrix, ids)
+                include_shap = data.get("include_shap", True) and len(matrix) > 0
+                scenario_shap = bundle.shap_values(matrix, ids, explainer) if include_shap else None
+            metrics.observe("batch_rows", len(matrix), source="scenarios")
+            scenarios = []
+            for position, probability in enumerate(probabilities):
+                scenario = {"probability_of_default": probability}
+                if scenario_shap is not None:
+                    scenario.update(explanation_fields(scenario_shap[position], data))
+                scenarios.append(scenario)
+            response["scenarios"] = scenarios
 
-def read_available_ids():
-    """Lire la liste d'IDs disponibles à partir du fichier."""
-    if os.path.exists(ID_FILE_PATH):
-        with open(ID_FILE_PATH, "r") as f:
-            ids = f.read().strip().split(",")
-            return [int(id) for id in ids if id.strip().isdigit()]
-    return []
+        # Balayage optionnel d'une feature (courbe de dépendance partielle pour ce client)
+        sweep = data.get("sweep")
+        if sweep:
+            if not isinstance(sweep, dict):
+                return jsonify({"error": "sweep doit être un objet {feature, values}."}), 400
+            if not isinstance(sweep.get("feature"), str) or sweep["feature"] not in feature_index:
+                return jsonify({"error": f"Feature inconnue : {sweep.get('feature')}"}), 400
+            sweep_index = feature_index[sweep["feature"]]
+            values = sweep.get("values", [])
+            try:
+                values = (np.asarray(values, dtype=np.float64)
+                          if isinstance(values, list) and len(values) <= SWEEP_VALUES_MAX else None)
+            except (TypeError, ValueError):
+                values = None
+            if values is None or values.ndim != 1:
+                return jsonify({"error": f"sweep.values doit être une liste d'au plus {SWEEP_VALUES_MAX} "
+                                         "valeurs numériques."}), 400
+            with stage("sweep"):
+                if whatif is not None:
+                    probabilities = whatif.sweep(modified_row, sweep_index, values)
+                else:
+                    matrix = np.repeat(modified_row, len(values), axis=0)
+                    matrix[:, sweep_index] = values
+                    probabilities = bundle.predict_positive(matrix, np.full(len(values), sk_id_curr))
+            response["sweep"] = {
+                "feature": sweep["feature"],
+                "values": values,
+                "probabilities": probabilities
+            }
+
+        # Retourner la réponse
+        with stage("serialize"):
+            return respond(response)
 
-def write_available_ids(ids):
-    """Écrire la liste mise à jour d'IDs disponibles dans le fichier."""
-    with open(ID_FILE_PATH, "w") as f:
-        f.write(",".join(map(str, ids)))
+    except InvalidOverride as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erreur lors de la prédiction avec valeurs personnalisées : {e}")
+        return jsonify({"error": str(e)}), 500
 
-@app.route("/get_next_client_id", methods=["GET"])
+@api.route("/get_next_client_id", methods=["GET"])
 def get_next_client_id():
     """Renvoie un ID disponible pour un nouveau client."""
-    available_ids = read_available_ids()
-    
-    if not available_ids:
+    next_id = id_allocator.allocate()
+
+    if next_id is None:
         return jsonify({"error": "Aucun ID disponible dans la liste."}), 404
 
-    # Attribuer le premier ID disponible
-    next_id = available_ids.pop(0)
-    
-    # Mettre à jour le fichier avec les IDs restants
-    write_available_ids(available_ids)
-    
     return jsonify({"next_id": next_id}), 200
 
-@app.route("/predict_new_client", methods=["POST"])
+@api.route("/predict_new_client", methods=["POST"])
 def predict_new_client():
     """Faire une prédiction pour un nouveau client avec des valeurs par défaut et médianes"""
     try:
         # Récupérer les données envoyées
         data = request.get_json()
+        bundle = requested_model(data)
+        if bundle is None:
+            return unknown_model_response()
+        explainer = requested_explainer(bundle, data)
+        if explainer is None:
+            return unknown_explainer_response()
+        if requested_top_k(data) is None:
+            return invalid_top_k_response()
 
-        # Créer une ligne avec des valeurs par défaut
-        default_client = {col: 0 for col in required_features}
-
-        # Remplacer les colonnes avec les données fournies
-        for key, value in data.items():
-            if key in default_client:
-                default_client[key] = value
-
-        # Convertir en DataFrame
-        new_client_df = pd.DataFrame([default_client])
-
-        # Remplacer les valeurs par défaut avec les médianes des données clients existantes
-        if not clients_data.empty:
-            for col in new_client_df.columns:
-                if new_client_df[col].iloc[0] == 0:  # Vérifier si la valeur est par défaut (0)
-                    if col in clients_data.columns:
-                        median_value = clients_data[col].median()
-                        new_client_df[col] = median_value
-                    else:
-                        logging.warning(f"Colonne {col} non trouvée dans les données existantes.")
+        # Créer une ligne avec des valeurs par défaut, remplacées par les données fournies
+        new_client = feature_overrides.apply(np.zeros(len(required_features)), data)
 
-        # Prédiction avec le modèle
-        predictions = model.predict_proba(new_client_df)
-        probability_of_default = predictions[0][1]  # Probabilité pour la classe positive
+        # Remplacer les valeurs par défaut avec les médianes précalculées des données clients
+        with stage("impute"):
+            new_client = client_store.imputation.fill(new_client)
 
-        # Calcul des valeurs SHAP
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(new_client_df)
+        # Client à enregistrer ("persist") : un ID lui est attribué s'il n'en a pas
+        persist = bool(data.get("persist"))
+        if persist and data.get("SK_ID_CURR") is None:
+            next_id = id_allocator.allocate()
+            if next_id is None:
+                return jsonify({"error": "Aucun ID disponible dans la liste."}), 404
+            data = {**data, "SK_ID_CURR": next_id}
 
-        # Gestion des SHAP values pour plusieurs classes
-        if len(shap_values) > 1:
-            shap_values = shap_values[1]  # SHAP values pour la classe positive
-        else:
-            shap_values = shap_values[0]
+        # Prédiction avec le modèle et valeurs SHAP (classe positive)
+        sk_id_curr = data.get("SK_ID_CURR")
+        probability_of_default, shap_values = score_row(bundle, new_client, sk_id_curr, use_cache=False,
+                                                        explainer=explainer)
+        observe_drift(bundle, new_client, probability_of_default)
 
         # Retourner la réponse
-        return jsonify({
-            "probability_of_default": probability_of_default,
-            "shap_values": shap_values.tolist(),
-            "feature_names": required_features
-        }), 200
+        response = {"probability_of_default": probability_of_default, "model": bundle.name,
+                    "explainer": explainer}
+        response.update(explanation_fields(shap_values, data))
+
+        # Enregistrer le client dans le journal d'ingestion : il devient un client existant
+        if persist:
+            with stage("ingest"):
+                result = ingest([data])["results"][0]
+            response["SK_ID_CURR"] = result["SK_ID_CURR"]
+            response["persisted"] = "error" not in result
+            if "error" in result:
+                response["persist_error"] = result["error"]
 
+        with stage("serialize"):
+            return respond(response)
+
+    except InvalidOverride as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"Erreur lors de la prédiction pour un nouveau client : {e}")
         return jsonify({"error": str(e)}), 500
 
+def client_table_row(client, sk_id_curr):
+    """Ligne complète (colonnes du stockage) d'un client ingéré, complétée comme dans /predict_new_client."""
+    n_features = len(required_features)
+    row = np.full(len(client_store.columns), np.nan)
+    row[:n_features] = client_store.imputation.fill(feature_overrides.apply(np.zeros(n_features), client))[0]
+    for position, column in enumerate(client_store.columns[n_features:], start=n_features):
+        value = client.get(column)
+        if value is None or column == "SK_ID_CURR":
+            continue
+        try:
+            row[position] = float(value)
+        except (TypeError, ValueError):
+            raise InvalidOverride(f"Valeur non numérique pour : {column}")
+    row[client_store.columns.index("SK_ID_CURR")] = sk_id_curr
+    return row
+
+def ingest(clients):
+    """Écrire les nouveaux clients dans un segment du journal et les rendre interrogeables dans ce worker.
+
+    Toutes les lignes sont validées avant d'attribuer le moindre ID : une requête refusée
+    (InvalidOverride) ne consomme aucun ID. Un client sans SK_ID_CURR reçoit ensuite le
+    prochain ID disponible ; un ID déjà connu est signalé en erreur pour cette ligne, sans
+    faire échouer l'ingestion des autres. Le contrôle final des doublons est fait sous le
+    verrou du journal, après application des segments écrits par les autres workers.
+    """
+    validated = []
+    for position, client in enumerate(clients):
+        if not isinstance(client, dict):
+            raise InvalidOverride(f"Le client {position} n'est pas un objet JSON.")
+        sk_id_curr = client.get("SK_ID_CURR")
+        if sk_id_curr is not None:
+            try:
+                sk_id_curr = int(sk_id_curr)
+            except (TypeError, ValueError):
+                raise InvalidOverride(f"SK_ID_CURR invalide pour le client {position}.")
+        validated.append((sk_id_curr, client_table_row(client, np.nan)))
+
+    results = []
+    rows = []
+    seen = set()
+    id_column = client_store.columns.index("SK_ID_CURR")
+    for sk_id_curr, row in validated:
+        if sk_id_curr is None:
+            sk_id_curr = id_allocator.allocate()
+            if sk_id_curr is None:
+                results.append({"SK_ID_CURR": None, "error": "Aucun ID disponible dans la liste."})
+                continue
+        if sk_id_curr in client_store or sk_id_curr in seen:
+            results.append({"SK_ID_CURR": sk_id_curr, "error": f"Client {sk_id_curr} déjà présent."})
+            continue
+        seen.add(sk_id_curr)
+        row[id_column] = sk_id_curr
+        rows.append(row)
+        results.append({"SK_ID_CURR": sk_id_curr})
+
+    sequence = None
+    ingested = 0
+    if rows:
+        pending = [result for result in results if "error" not in result]
+
+        def keep(candidates):
+            refresh_clients()
+            mask = [result["SK_ID_CURR"] not in client_store for result in pending]
+            for result, kept in zip(pending, mask):
+                if not kept:
+                    result["error"] = f"Client {result['SK_ID_CURR']} déjà présent."
+            return mask
+
+        sequence = segment_log.append(np.vstack(rows), keep=keep)
+        ingested = sum("error" not in result for result in pending)
+        refresh_clients()
+    return {"results": results, "ingested": ingested, "segment": sequence}
+
+@api.route("/ingest_clients", methods=["POST"])
+def ingest_clients():
+    """Ajouter des clients sans recharger les données : interrogeables par tous les workers en quelques secondes."""
+    try:
+        data = request.get_json()
+        clients = data.get("clients")
+        if not isinstance(clients, list) or not clients:
+            return jsonify({"error": "Le champ 'clients' doit être une liste non vide."}), 400
+        if len(clients) > INGEST_MAX_CLIENTS:
+            return jsonify({"error": f"Au plus {INGEST_MAX_CLIENTS} clients par ingestion."}), 400
+
+        with stage("ingest"):
+            response = ingest(clients)
+        return jsonify(response), 200
+
+    except InvalidOverride as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erreur lors de l'ingestion de clients : {e}")
+        return jsonify({"error": str(e)}), 500
+
+def create_app(warm_start=None):
+    """Créer l'application Flask.
+
+    L'état n'est pas chargé à l'import : selon `warm_start` (WARM_START par défaut), il est
+    chargé dans un thread ("background"), à la première requête ("lazy") ou tout de suite ("eager").
+    """
+    warm_start = warm_start or WARM_START
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+    flask_app.register_blueprint(api)
+    if warm_start == "eager":
+        load_state()
+    elif warm_start == "background":
+        start_background_load()
+    return flask_app
+
+app = create_app()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
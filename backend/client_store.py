@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from imputation import IMPUTATION_FILE, ImputationTable
+
+# Fichiers du format binaire : une matrice (n_clients, n_colonnes) en float64, features
+# en premier dans l'ordre de `required_features`, puis les autres colonnes (SK_ID_CURR, ...),
+# et l'index des SK_ID_CURR (int64) à part : le lire ne parcourt pas toutes les pages de la table
+TABLE_FILE = "table.npy"
+IDS_FILE = "ids.npy"
+META_FILE = "meta.json"
+
+
+class ClientStore:
+    """Stockage indexé des données clients, construit une seule fois au démarrage.
+
+    Contient un index SK_ID_CURR -> position de ligne et une matrice NumPy contiguë
+    des features dans l'ordre de `required_features`. Une recherche est en O(1) et
+    renvoie une vue (sans copie) prête pour `model.predict_proba`. La matrice peut
+    être memory-mappée depuis le format binaire (voir `write_table`).
+
+    Les clients ingérés ensuite (segments, voir `segment_log`) sont ajoutés par `append`
+    dans un tampon à part, agrandi par doublement, et leurs IDs dans un petit index trié
+    distinct : ni la matrice ni l'index principaux ne sont recopiés, le coût d'un ajout
+    dépend des clients ajoutés depuis la dernière compaction et non de la taille de la
+    table. Leurs positions suivent celles de la matrice principale.
+    """
+
+    def __init__(self, ids, features, feature_names, frame=None, imputation=None, columns=None,
+                 segments_through=0):
+        self.base_ids = np.asarray(ids, dtype=np.int64)
+        self.features = features
+        self.feature_names = list(feature_names)
+        self.frame = frame
+        self.n_base = len(self.base_ids)
+
+        # Colonnes d'une ligne complète (features en premier, comme le format binaire)
+        self.columns = list(columns) if columns is not None else self.feature_names + ["SK_ID_CURR"]
+        if self.columns[:len(self.feature_names)] != self.feature_names or "SK_ID_CURR" not in self.columns:
+            raise ValueError("Les colonnes doivent commencer par les features et contenir SK_ID_CURR.")
+
+        # Lignes ajoutées après le chargement, IDs nouveaux qu'elles apportent (triés) et dernier segment appliqué
+        self._id_column = self.columns.index("SK_ID_CURR")
+        self._extra = np.empty((0, len(self.columns)))
+        self._n_extra = 0
+        self.extra_sorted_ids = np.empty(0, dtype=np.int64)
+        self._append_lock = threading.Lock()
+        self.segments_through = segments_through
+
+        if self.features.shape != (len(self.base_ids), len(self.feature_names)):
+            raise ValueError("La matrice des features ne correspond pas aux IDs ou aux noms de features.")
+
+        # En cas de doublon, la première ligne est conservée (comme l'ancien filtrage booléen)
+        self.index = {}
+        for position, sk_id in enumerate(self.base_ids.tolist()):
+            self.index.setdefault(sk_id, position)
+
+        # IDs uniques triés : pagination par curseur et recherche par préfixe ou intervalle
+        self.sorted_ids = np.unique(self.base_ids)
+
+        # Table d'imputation (médianes...) recalculée à chaque chargement des données
+        self.imputation = imputation or ImputationTable.compute(self.features, self.feature_names)
+
+    @classmethod
+    def from_frame(cls, df, feature_names, dtype=np.float64):
+        """Construire le stockage à partir d'un DataFrame contenant SK_ID_CURR et les features."""
+        if df.empty:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, len(feature_names)), dtype=dtype),
+                       feature_names, frame=df)
+
+        missing = [col for col in feature_names if col not in df.columns]
+        if missing:
+            raise KeyError(f"Features absentes des données clients : {missing}")
+
+        features = np.ascontiguousarray(df[feature_names].to_numpy(dtype=dtype))
+        columns = list(feature_names) + [col for col in df.columns if col not in feature_names]
+        return cls(df["SK_ID_CURR"].to_numpy(), features, feature_names, frame=df, columns=columns)
+
+    @classmethod
+    def from_directory(cls, path, feature_names):
+        """Charger le format binaire en memory-map (lecture seule, pages partagées entre processus)."""
+        meta = read_meta(path)
+        if meta["feature_names"] != list(feature_names):
+            raise ValueError("Les features du format binaire ne correspondent pas à selected_features.txt.")
+
+        table = np.load(os.path.join(path, meta.get("table", TABLE_FILE)), mmap_mode="r")
+        frame = pd.DataFrame(table, columns=meta["columns"], copy=False)
+        features = table[:, :len(feature_names)]
+        ids = read_ids(path, meta, table)
+
+        imputation_path = os.path.join(path, IMPUTATION_FILE)
+        imputation = ImputationTable.load(imputation_path) if os.path.exists(imputation_path) else None
+        return cls(ids, features, feature_names, frame=frame, imputation=imputation, columns=meta["columns"],
+                   segments_through=meta.get("segments_through", 0))
+
+    @property
+    def ids(self):
+        """IDs de toutes les lignes, dans l'ordre des positions (copie s'il y a des lignes ajoutées)."""
+        if not self._n_extra:
+            return self.base_ids
+        return np.concatenate([self.base_ids, self._extra[:self._n_extra, self._id_column].astype(np.int64)])
+
+    def __len__(self):
+        return self.n_base + self._n_extra
+
+    def __contains__(self, sk_id):
+        return int(sk_id) in self.index
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def position(self, sk_id):
+        """Position de ligne d'un client, ou None s'il est introuvable."""
+        return self.index.get(int(sk_id))
+
+    def row(self, sk_id):
+        """Vue (1, n_features) sur les features d'un client, ou None s'il est introuvable."""
+        position = self.position(sk_id)
+        if position is None:
+            return None
+        return self.row_at(position)
+
+    def row_at(self, position):
+        """Vue (1, n_features) sur les features de la ligne `position` (principale ou ajoutée)."""
+        if position < self.n_base:
+            return self.features[position:position + 1]
+        offset = position - self.n_base
+        return self._extra[offset:offset + 1, :len(self.feature_names)]
+
+    def append(self, rows, sequence=None):
+        """Ajouter des lignes complètes (dans l'ordre de `columns`) ; renvoie le nombre de nouveaux clients.
+
+        Comme au chargement, un ID déjà présent garde sa première ligne. `sequence` est
+        le numéro du segment appliqué (voir `segment_log`).
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        if rows.shape[1] != len(self.columns):
+            raise ValueError("Les lignes ajoutées ne correspondent pas aux colonnes du stockage.")
+        ids = rows[:, self._id_column].astype(np.int64)
+
+        with self._append_lock:
+            start = self._n_extra
+            stop = start + len(rows)
+            if stop > len(self._extra):
+                grown = np.empty((max(stop, 2 * len(self._extra), 64), len(self.columns)))
+                grown[:start] = self._extra[:start]
+                self._extra = grown
+            self._extra[start:stop] = rows
+            self._n_extra = stop
+
+            added = []
+            for offset, sk_id in enumerate(ids.tolist()):
+                if sk_id not in self.index:
+                    self.index[sk_id] = self.n_base + start + offset
+                    added.append(sk_id)
+            # Fusion avec les seuls IDs ajoutés depuis la compaction (absents de l'index principal)
+            self.extra_sorted_ids = np.union1d(self.extra_sorted_ids, np.asarray(added, dtype=np.int64))
+            if sequence is not None:
+                self.segments_through = sequence
+        return len(added)
+
+    def _prefix_ranges(self, prefix):
+        """Intervalles [bas, haut] des IDs dont l'écriture décimale commence par `prefix`.
+
+        Un intervalle par nombre de chiffres possible (ex. "12" : 12, 120-129, 1200-1299...),
+        dans l'ordre croissant : la concaténation reste triée. Aucun ID n'a d'écriture
+        commençant par un zéro, sauf 0 lui-même.
+        """
+        if self.empty:
+            return []
+        if prefix.startswith("0"):
+            return [(0, 0)] if prefix == "0" else []
+        value = int(prefix)
+        largest = max(int(sorted_ids[-1]) for sorted_ids in (self.sorted_ids, self.extra_sorted_ids) if len(sorted_ids))
+        max_digits = len(str(largest))
+        return [(value * 10 ** extra, (value + 1) * 10 ** extra - 1)
+                for extra in range(max_digits - len(prefix) + 1)]
+
+    def search_ids(self, limit=None, after=None, prefix=None, min_id=None, max_id=None):
+        """Page d'IDs triés correspondant aux filtres, nombre total de correspondances et curseur suivant.
+
+        `after` est le dernier ID de la page précédente (pagination par clé : stable même si
+        des clients sont ajoutés entre deux pages). Chaque borne est une recherche
+        dichotomique dans `sorted_ids` et dans `extra_sorted_ids` (IDs ajoutés, disjoints des
+        premiers) : le coût ne dépend que de la taille de la page.
+        """
+        ranges = self._prefix_ranges(prefix) if prefix else [(None, None)]
+        total = 0
+        page = []
+        for low, high in ranges:
+            if min_id is not None:
+                low = min_id if low is None else max(low, min_id)
+            if max_id is not None:
+                high = max_id if high is None else min(high, max_id)
+            # Un ID de plus que la page demandée : indique s'il reste une page suivante
+            wanted = None if limit is None else limit + 1 - len(page)
+            candidates = []
+            for sorted_ids in (self.sorted_ids, self.extra_sorted_ids):
+                start = 0 if low is None else int(np.searchsorted(sorted_ids, low, side="left"))
+                stop = len(sorted_ids) if high is None else int(np.searchsorted(sorted_ids, high, side="right"))
+                if stop <= start:
+                    continue
+                total += stop - start
+                if after is not None:
+                    start = max(start, int(np.searchsorted(sorted_ids, after, side="right")))
+                candidates.append(sorted_ids[start:stop if wanted is None else min(stop, start + max(wanted, 0))])
+            if candidates and (wanted is None or wanted > 0):
+                page.extend(np.sort(np.concatenate(candidates))[:wanted].tolist())
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1] if page else None
+        return page, total, next_cursor
+
+    def client_info(self, sk_id):
+        """Informations descriptives complètes d'un client (toutes les colonnes)."""
+        position = self.position(sk_id)
+        if position is None:
+            return None
+        if position >= self.n_base:
+            return dict(zip(self.columns, self._extra[position - self.n_base].tolist()))
+        if self.frame is None:
+            return None
+        return self.frame.iloc[position].to_dict()
+
+
+def write_table(csv_path, feature_names, path, chunksize=50000):
+    """Convertir le CSV clients vers le format binaire, par blocs (mémoire bornée)."""
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    missing = [col for col in feature_names if col not in header]
+    if missing:
+        raise KeyError(f"Features absentes des données clients : {missing}")
+    columns = list(feature_names) + [col for col in header if col not in feature_names]
+
+    # Premier passage : nombre de lignes et empreinte de la source (version des données)
+    digest = hashlib.sha1()
+    n_lines = 0
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+            n_lines += block.count(b"\n")
+            last = block
+    n_rows = n_lines - 1 if n_lines and last.endswith(b"\n") else n_lines
+
+    os.makedirs(path, exist_ok=True)
+    table_path = os.path.join(path, TABLE_FILE)
+    table = np.lib.format.open_memmap(f"{table_path}.tmp", mode="w+", dtype=np.float64,
+                                      shape=(n_rows, len(columns)))
+    ids = np.empty(n_rows, dtype=np.int64)
+    start = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        table[start:start + len(chunk)] = chunk[columns].to_numpy(dtype=np.float64)
+        ids[start:start + len(chunk)] = chunk["SK_ID_CURR"].to_numpy(dtype=np.int64)
+        start += len(chunk)
+    if start != n_rows:
+        raise ValueError(f"Nombre de lignes incohérent : {start} lues, {n_rows} attendues.")
+    table.flush()
+    ImputationTable.compute(table[:, :len(feature_names)], feature_names).save(os.path.join(path, IMPUTATION_FILE))
+    del table
+    os.replace(f"{table_path}.tmp", table_path)
+    write_ids(path, IDS_FILE, ids)
+
+    write_meta(path, columns, feature_names, n_rows, os.path.basename(csv_path), digest.hexdigest()[:12])
+    return n_rows
+
+
+def write_ids(path, name, ids):
+    """Écrire l'index des SK_ID_CURR d'une table (fichier temporaire renommé)."""
+    ids_path = os.path.join(path, name)
+    with open(f"{ids_path}.tmp", "wb") as f:
+        np.save(f, np.asarray(ids, dtype=np.int64))
+    os.replace(f"{ids_path}.tmp", ids_path)
+
+
+def read_ids(path, meta, table):
+    """SK_ID_CURR des lignes de `table` : index à part s'il existe, sinon la colonne de la table (ancien format)."""
+    ids_name = meta.get("ids")
+    if ids_name and os.path.exists(os.path.join(path, ids_name)):
+        return np.load(os.path.join(path, ids_name))
+    return table[:, meta["columns"].index("SK_ID_CURR")].astype(np.int64)
+
+
+def write_meta(path, columns, feature_names, n_rows, source, source_digest, table=TABLE_FILE, segments_through=0,
+               ids=IDS_FILE):
+    """Écrire la description de la table (colonnes, features, source, index des IDs, segments intégrés) ; à faire en dernier."""
+    meta = {"columns": list(columns), "feature_names": list(feature_names), "rows": n_rows,
+            "source": source, "source_digest": source_digest, "table": table, "ids": ids,
+            "segments_through": segments_through}
+    tmp_path = os.path.join(path, f"{META_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+def data_version_path(store_path, csv_path):
+    """Fichier dont l'empreinte sert de version des données clients : meta.json du format binaire s'il existe, sinon le CSV."""
+    meta_path = os.path.join(store_path, META_FILE)
+    return meta_path if os.path.exists(meta_path) else csv_path
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE), "r") as f:
+        return json.load(f)
@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Regroupe les requêtes unitaires concurrentes en micro-lots.
+
+    Chaque ligne soumise est mise en file ; un thread dédié vide la file par lots,
+    dès que `max_batch_size` lignes sont en attente ou après `max_wait_ms`. Chaque
+    lot est scoré par un seul appel à `score_batch(matrice, masque_shap)`, qui renvoie
+    (probabilités, valeurs SHAP des lignes du masque), puis les résultats sont
+    redistribués aux requêtes en attente.
+    """
+
+    def __init__(self, score_batch, max_batch_size=32, max_wait_ms=2.0):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.requests = 0
+        self.last_batch_size = 0
+        self.max_seen_batch_size = 0
+
+    def _ensure_started(self):
+        # Le thread est démarré dans chaque worker, après le fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, row, with_shap=True):
+        """Mettre une ligne de features en file ; renvoie un Future de (probabilité, SHAP ou None)."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float64).reshape(-1), with_shap, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            rows, with_shap, futures = zip(*batch)
+            try:
+                shap_mask = np.array(with_shap, dtype=bool)
+                probabilities, shap_values = self.score_batch(np.vstack(rows), shap_mask)
+                shap_rows = iter(shap_values if shap_values is not None else [])
+                for probability, needs_shap, future in zip(probabilities, shap_mask, futures):
+                    future.set_result((probability, next(shap_rows) if needs_shap else None))
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.last_batch_size = len(batch)
+                self.max_seen_batch_size = max(self.max_seen_batch_size, len(batch))
+
+    def stats(self):
+        """Métriques du regroupement : profondeur de file et tailles de lots."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "requests": self.requests,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_seen_batch_size,
+                "max_batch_size_limit": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
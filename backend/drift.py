@@ -0,0 +1,222 @@
+import hashlib
+import threading
+
+import numpy as np
+
+import snapshots
+
+# Seuils usuels du PSI : stable en dessous de 0.1, dérive modérée jusqu'à 0.25, forte au-delà
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Lissage des proportions nulles dans le calcul du PSI
+PSI_EPSILON = 1e-4
+
+# Préfixe des instantanés des workers et de l'agrégat des workers arrêtés, par version de référence
+SNAPSHOT_PREFIX = "drift"
+EMPTY_RETIRED = {"states": {}}
+
+
+def assign_bins(matrix, edges):
+    """Intervalle de chaque valeur (n_lignes, n_features) ; les valeurs manquantes vont dans le dernier.
+
+    `edges` (n_features, n_bins - 1) contient les bornes internes de chaque feature : une
+    valeur est placée dans l'intervalle ]borne précédente, borne].
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float64))
+    bins = (matrix[:, :, None] > edges[None, :, :]).sum(axis=2)
+    bins[np.isnan(matrix)] = edges.shape[1] + 1
+    return bins
+
+
+def bin_counts(bins, n_bins):
+    """Effectifs (n_features, n_bins) d'une matrice d'intervalles, en un seul bincount."""
+    n_features = bins.shape[1]
+    flat = (np.arange(n_features) * n_bins + bins).ravel()
+    return np.bincount(flat, minlength=n_features * n_bins).reshape(n_features, n_bins)
+
+
+def population_stability_index(current, reference):
+    """PSI entre deux histogrammes (effectifs sur le dernier axe) ; 0 tant que `current` est vide."""
+    current = np.asarray(current, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    current_total = current.sum(axis=-1, keepdims=True)
+    if not current_total.all():
+        return np.zeros(current.shape[:-1])
+    p = current / current_total
+    q = reference / np.maximum(reference.sum(axis=-1, keepdims=True), 1)
+    return ((p - q) * np.log((p + PSI_EPSILON) / (q + PSI_EPSILON))).sum(axis=-1)
+
+
+def drift_status(psi):
+    if psi >= PSI_SIGNIFICANT:
+        return "significant"
+    if psi >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+class DriftMonitor:
+    """Suivi en continu de la dérive des features et des probabilités de défaut.
+
+    La référence (un échantillon des données clients et ses probabilités) fixe des
+    intervalles par quantiles pour chaque feature ; chaque requête scorée n'ajoute que
+    des effectifs d'intervalles, des sommes (moyennes courantes) et des compteurs :
+    mémoire bornée, sans garder aucune ligne. Les états des workers sont additifs :
+    chaque processus écrit un instantané dans `directory` (voir `snapshots.ProcessSnapshots`)
+    et le rapport (PSI par feature) fusionne ceux des workers en vie et l'agrégat des
+    workers arrêtés.
+    """
+
+    def __init__(self, feature_names, reference_features, reference_probabilities, n_bins=10,
+                 prediction_bins=20, threshold=0.5, directory=None, flush_interval=1.0):
+        self.feature_names = list(feature_names)
+        self.threshold = threshold
+        self.directory = directory
+        reference_features = np.asarray(reference_features, dtype=np.float64)
+        reference_probabilities = np.asarray(reference_probabilities, dtype=np.float64)
+
+        # Bornes internes par quantiles de la référence (n_bins intervalles + valeurs manquantes)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        with np.errstate(all="ignore"):
+            edges = np.nanquantile(reference_features, quantiles, axis=0).T
+        self.edges = np.nan_to_num(edges, nan=np.inf)
+        self.n_slots = n_bins + 1
+        self.prediction_edges = np.linspace(0, 1, prediction_bins + 1)[1:-1]
+
+        self.reference = self._accumulate(self._empty(), reference_features, reference_probabilities)
+        self.version = hashlib.sha1(self.edges.tobytes() + self.prediction_edges.tobytes()).hexdigest()[:12]
+
+        self._state = self._empty()
+        self._lock = threading.Lock()
+        self._snapshots = snapshots.ProcessSnapshots(directory, SNAPSHOT_PREFIX, flush_interval)
+
+    def _empty(self):
+        n_features = len(self.feature_names)
+        return {
+            "rows": 0,
+            "feature_counts": np.zeros((n_features, self.n_slots), dtype=np.int64),
+            "feature_sums": np.zeros(n_features),
+            "predictions": 0,
+            "prediction_counts": np.zeros(len(self.prediction_edges) + 1, dtype=np.int64),
+            "prediction_sum": 0.0,
+            "refused": 0,
+        }
+
+    def _accumulate(self, state, features, probabilities=None):
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        state["rows"] += len(features)
+        state["feature_counts"] += bin_counts(assign_bins(features, self.edges), self.n_slots)
+        state["feature_sums"] += np.nansum(features, axis=0)
+        if probabilities is not None:
+            probabilities = np.atleast_1d(np.asarray(probabilities, dtype=np.float64))
+            state["predictions"] += len(probabilities)
+            state["prediction_counts"] += np.bincount(np.searchsorted(self.prediction_edges, probabilities),
+                                                      minlength=len(self.prediction_edges) + 1)
+            state["prediction_sum"] += float(probabilities.sum())
+            state["refused"] += int((probabilities > self.threshold).sum())
+        return state
+
+    def observe(self, features, probabilities=None):
+        """Ajouter des lignes scorées (features dans l'ordre de référence) et, si fournies, leurs probabilités."""
+        with self._lock:
+            self._check_fork()
+            self._accumulate(self._state, features, probabilities)
+        self._snapshots.ensure_flusher(self.flush)
+
+    def _check_fork(self):
+        # Comme pour Metrics, les observations du maître ne sont pas reprises par les workers
+        if self._snapshots.forked():
+            self._state = self._empty()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {key: value.tolist() if isinstance(value, np.ndarray) else value
+                    for key, value in self._state.items()}
+
+    def flush(self):
+        """Écrire l'instantané du processus."""
+        self._snapshots.write({"version": self.version, "state": self.snapshot()})
+
+    def collect(self):
+        """État fusionné : ce processus, les instantanés des autres workers et l'agrégat des workers arrêtés.
+
+        Seuls comptent les instantanés de même référence (même `version`).
+        """
+        others, retired = self._snapshots.read(EMPTY_RETIRED)
+        states = [self.snapshot()] + [content["state"] for content in others if content.get("version") == self.version]
+        if self.version in retired["states"]:
+            states.append(retired["states"][self.version])
+        merged = self._empty()
+        for state in states:
+            _add_state(merged, state)
+        return merged
+
+    def report(self, top=None):
+        """PSI, moyennes et taux de valeurs manquantes par feature (tri par PSI décroissant) et des probabilités."""
+        current = self.collect()
+        reference = self.reference
+        feature_psi = population_stability_index(current["feature_counts"], reference["feature_counts"])
+        observed = current["feature_counts"][:, :-1].sum(axis=1)
+        reference_observed = reference["feature_counts"][:, :-1].sum(axis=1)
+
+        features = []
+        for i in np.argsort(-feature_psi, kind="stable")[:top]:
+            features.append({
+                "feature": self.feature_names[i],
+                "psi": float(feature_psi[i]),
+                "status": drift_status(feature_psi[i]),
+                "mean": _ratio(current["feature_sums"][i], observed[i]),
+                "reference_mean": _ratio(reference["feature_sums"][i], reference_observed[i]),
+                "missing_rate": _ratio(current["feature_counts"][i, -1], current["rows"]),
+                "reference_missing_rate": _ratio(reference["feature_counts"][i, -1], reference["rows"]),
+            })
+
+        prediction_psi = float(population_stability_index(current["prediction_counts"],
+                                                          reference["prediction_counts"]))
+        return {
+            "rows": current["rows"],
+            "reference_rows": reference["rows"],
+            "drifted_features": int((feature_psi >= PSI_SIGNIFICANT).sum()),
+            "prediction": {
+                "psi": prediction_psi,
+                "status": drift_status(prediction_psi),
+                "count": current["predictions"],
+                "mean": _ratio(current["prediction_sum"], current["predictions"]),
+                "reference_mean": _ratio(reference["prediction_sum"], reference["predictions"]),
+                "refusal_rate": _ratio(current["refused"], current["predictions"]),
+                "reference_refusal_rate": _ratio(reference["refused"], reference["predictions"]),
+                "histogram": {
+                    "edges": self.prediction_edges.tolist(),
+                    "counts": current["prediction_counts"].tolist(),
+                    "reference_counts": reference["prediction_counts"].tolist(),
+                },
+            },
+            "features": features,
+        }
+
+
+def _ratio(numerator, denominator):
+    return float(numerator / denominator) if denominator else None
+
+
+def _add_state(total, state):
+    for key, value in state.items():
+        total[key] = total[key] + (np.asarray(value) if isinstance(total[key], np.ndarray) else value)
+    return total
+
+
+def _merge_retired(retired, content):
+    previous = retired["states"].get(content["version"])
+    state = content["state"] if previous is None else {
+        key: (np.asarray(value) + np.asarray(content["state"][key])).tolist() if isinstance(value, list)
+        else value + content["state"][key]
+        for key, value in previous.items()
+    }
+    return {"states": {**retired["states"], content["version"]: state}}
+
+
+def retire_snapshot(directory, pid):
+    """Intégrer l'instantané d'un worker arrêté à l'agrégat de sa référence (voir `snapshots.retire_snapshot`)."""
+    snapshots.retire_snapshot(directory, SNAPSHOT_PREFIX, pid, _merge_retired, EMPTY_RETIRED)
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Surcoût mémoire estimé par entrée du cache (clé, noeud de l'OrderedDict, en-tête du tableau)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def file_digest(path):
+    """Empreinte SHA-1 (tronquée) d'un fichier, utilisée comme version d'un modèle ou de données."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def positive_class(shap_values):
+    """Extraire les valeurs SHAP de la classe positive, sous forme (n_lignes, n_features)."""
+    if isinstance(shap_values, list):
+        return shap_values[1] if len(shap_values) > 1 else shap_values[0]
+    shap_values = np.asarray(shap_values)
+    if shap_values.ndim == 3:
+        return shap_values[..., 1]
+    return shap_values
+
+
+def top_k_indices(shap_values, k):
+    """Indices des k contributions de plus forte valeur absolue, par ligne et triés."""
+    shap_values = np.atleast_2d(shap_values)
+    k = min(k, shap_values.shape[1])
+    magnitudes = np.abs(shap_values)
+    candidates = np.argpartition(-magnitudes, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitudes, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+# Backends d'explication : contributions natives de LightGBM ou paquet shap
+EXPLAINER_BACKENDS = ("native", "shap")
+
+
+def lightgbm_threads(num_threads):
+    """Paramètres de threads d'un appel `booster.predict` (0 : tous les coeurs).
+
+    Le nombre est toujours explicite : OpenMP garde le réglage du dernier appel.
+    """
+    return {"num_threads": num_threads if num_threads > 0 else os.cpu_count()}
+
+
+class NativeTreeExplainer:
+    """Valeurs SHAP exactes calculées par LightGBM (`booster.predict(..., pred_contrib=True)`).
+
+    Même disposition que `shap.TreeExplainer` (une colonne par feature, sans la valeur
+    attendue) sans dépendre du paquet shap ni convertir les arbres au chargement. Une
+    ligne seule est calculée sur `num_threads` threads (1 par défaut : une requête
+    unitaire ne prend pas tous les coeurs d'un worker) ; les lots et les importances
+    globales sont répartis par lignes sur `batch_threads` threads (0 : tous les coeurs).
+    """
+
+    def __init__(self, booster, num_threads=1, batch_threads=0):
+        self.booster = booster
+        self.num_threads = num_threads
+        self.batch_threads = batch_threads
+
+    @classmethod
+    def for_model(cls, model, num_threads=1, batch_threads=0):
+        """Explainer natif d'un modèle LightGBM, None pour les autres modèles."""
+        booster = getattr(model, "booster_", None)
+        if booster is None or not hasattr(booster, "predict"):
+            return None
+        return cls(booster, num_threads, batch_threads)
+
+    def _contributions(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        threads = self.num_threads if len(X) <= 1 else self.batch_threads
+        return self.booster.predict(X, pred_contrib=True, validate_features=False, **lightgbm_threads(threads))
+
+    def shap_values(self, X):
+        return self._contributions(X)[:, :-1]
+
+    @property
+    def expected_value(self):
+        return float(self._contributions(np.zeros((1, self.booster.num_feature())))[0, -1])
+
+
+class ShapCache:
+    """Cache LRU borné des valeurs SHAP, indexé par (version du modèle, SK_ID_CURR).
+
+    Les entrées les plus anciennes sont évincées dès que la mémoire occupée
+    dépasse `max_bytes`. Les compteurs de hits/misses sont exposés par `stats()`.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(values):
+        return values.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key):
+        """Renvoyer les valeurs SHAP en cache, ou None."""
+        with self._lock:
+            values = self._entries.get(key)
+            if values is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+
+    def put(self, key, values):
+        """Ajouter (ou remplacer) une entrée puis évincer jusqu'à respecter le plafond mémoire."""
+        values = np.array(values, dtype=np.float64)
+        values.setflags(write=False)
+        size = self._size(values)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= self._size(previous)
+            self._entries[key] = values
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Compteurs du cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from client_store import data_version_path
+from explanations import file_digest, positive_class
+
+# Nombre de lignes expliquées par appel à l'explainer lors du calcul exact
+EXACT_CHUNK_SIZE = 10000
+
+
+def compute_global_importance(explainer, features, feature_names, chunk_size=EXACT_CHUNK_SIZE):
+    """Moyenne des |SHAP| par feature, triée par importance décroissante.
+
+    Le calcul est fait par blocs pour ne jamais matérialiser la matrice SHAP complète.
+    """
+    totals = np.zeros(len(feature_names))
+    for start in range(0, len(features), chunk_size):
+        shap_values = positive_class(explainer.shap_values(features[start:start + chunk_size]))
+        totals += np.abs(shap_values).sum(axis=0)
+    importances = totals / max(len(features), 1)
+
+    order = np.argsort(-importances, kind="stable")
+    return [{"Feature": feature_names[i], "Global Importance": float(importances[i])} for i in order]
+
+
+def stratified_sample(scores, n_rows, n_strata=10, seed=0):
+    """Positions d'un échantillon stratifié sur les déciles du score du modèle."""
+    if n_rows >= len(scores):
+        return np.arange(len(scores))
+    rng = np.random.default_rng(seed)
+    edges = np.quantile(scores, np.linspace(0, 1, n_strata + 1)[1:-1])
+    strata = np.searchsorted(edges, scores, side="right")
+
+    positions = []
+    for stratum in range(n_strata):
+        members = np.flatnonzero(strata == stratum)
+        if len(members) == 0:
+            continue
+        size = max(1, round(n_rows * len(members) / len(scores)))
+        positions.append(rng.choice(members, size=min(size, len(members)), replace=False))
+    return np.sort(np.concatenate(positions))
+
+
+class GlobalImportanceService:
+    """Importances globales SHAP précalculées et persistées à côté du modèle.
+
+    L'artefact est indexé par l'empreinte du modèle et des données : il est relu
+    tel quel au démarrage si rien n'a changé. Sinon, le calcul tourne en arrière-plan :
+    une approximation sur un échantillon stratifié est servie dès qu'elle est prête,
+    puis le calcul exact. Avec `store_path`, la version des données est celle du format
+    binaire s'il existe (voir `data_version_path`), le CSV `data_path` sinon.
+    """
+
+    # Délai minimal entre deux contrôles de l'artefact attendu sur disque
+    RELOAD_INTERVAL = 5.0
+
+    def __init__(self, artifact_dir, model_path, data_path, feature_names, sample_rows=0, store_path=None):
+        self.artifact_dir = artifact_dir
+        self.model_path = model_path
+        self.csv_path = data_path
+        self.store_path = store_path
+        self.feature_names = list(feature_names)
+        self.sample_rows = sample_rows
+        self.result = None
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._read_stamp = None
+        self._expected = None
+        self._path = None
+        self._last_reload = 0.0
+
+    @property
+    def data_path(self):
+        if self.store_path is None:
+            return self.csv_path
+        return data_version_path(self.store_path, self.csv_path)
+
+    def _versions(self):
+        data_path = self.data_path
+        data_version = file_digest(data_path) if os.path.exists(data_path) else "none"
+        return file_digest(self.model_path), data_version
+
+    def _file_stamp(self):
+        """Signature bon marché (chemin, mtime, taille) des fichiers pour détecter un changement."""
+        stamps = []
+        for path in (self.model_path, self.data_path):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                stamps.append((path, stat.st_mtime_ns, stat.st_size))
+            else:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def artifact_path(self, model_version, data_version):
+        return os.path.join(self.artifact_dir, f"global_importance_{model_version}_{data_version}.json")
+
+    def _load_artifact(self, path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_artifact(self, path, result):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def start(self, model, explainer, features, background=True):
+        """Charger l'artefact correspondant ou lancer son calcul (échantillon puis calcul exact)."""
+        self._fingerprint = self._read_stamp = self._file_stamp()
+        model_version, data_version = self._expected = self._versions()
+        path = self._path = self.artifact_path(model_version, data_version)
+
+        cached = self._load_artifact(path)
+        if cached is not None:
+            self.result = cached
+            logging.info(f"Importances globales chargées depuis {path}")
+            return
+
+        def describe(mode, rows, importances):
+            return {
+                "model_version": model_version,
+                "data_version": data_version,
+                "mode": mode,
+                "rows": int(rows),
+                "computed_at": time.time(),
+                "global_importances": importances,
+            }
+
+        def compute():
+            with self._lock:
+                # Scorer toute la population pour stratifier l'échantillon : hors du chargement de l'état
+                if self.sample_rows and len(features) > self.sample_rows and self.result is None:
+                    scores = model.predict_proba(features)[:, 1]
+                    sample = features[stratified_sample(scores, self.sample_rows)]
+                    self.result = describe("sample", len(sample),
+                                           compute_global_importance(explainer, sample, self.feature_names))
+                result = describe("exact", len(features),
+                                  compute_global_importance(explainer, features, self.feature_names))
+                self._save_artifact(path, result)
+                self.result = result
+                logging.info(f"Importances globales exactes enregistrées dans {path}")
+
+        if background:
+            threading.Thread(target=compute, name="global-importance", daemon=True).start()
+        else:
+            compute()
+
+    def current(self):
+        """Résultat courant.
+
+        Dans un worker forké, le calcul et la surveillance des fichiers tournent dans le processus
+        maître : l'artefact attendu est redéterminé d'après les fichiers du modèle et des données
+        et relu dès qu'il existe, tant que le résultat servi n'est pas le calcul exact attendu.
+        """
+        now = time.monotonic()
+        if self._path is not None and now - self._last_reload >= self.RELOAD_INTERVAL:
+            self._last_reload = now
+            stamp = self._file_stamp()
+            if stamp != self._read_stamp:
+                self._read_stamp = stamp
+                self._expected = self._versions()
+                self._path = self.artifact_path(*self._expected)
+            result = self.result
+            if (result is None or result["mode"] != "exact"
+                    or (result["model_version"], result["data_version"]) != tuple(self._expected)):
+                cached = self._load_artifact(self._path)
+                if cached is not None:
+                    self.result = cached
+        return self.result
+
+    def watch(self, interval, loader):
+        """Recalculer en arrière-plan quand le fichier du modèle ou des données change.
+
+        `loader` recharge depuis le disque et renvoie (model, explainer, features).
+        """
+        def loop():
+            while True:
+                time.sleep(interval)
+                if self._file_stamp() == self._fingerprint:
+                    continue
+                try:
+                    logging.info("Modèle ou données modifiés : recalcul des importances globales.")
+                    self.start(*loader(), background=False)
+                except Exception as e:
+                    logging.error(f"Erreur lors du recalcul des importances globales : {e}")
+
+        threading.Thread(target=loop, name="global-importance-watch", daemon=True).start()
+
+
+if __name__ == "__main__":
+    # Précalcul hors ligne de l'artefact exact, avec les chemins et la version des données du backend :
+    # python global_importance.py
+    os.environ.setdefault("WARM_START", "lazy")
+    import joblib
+
+    import app
+    from client_store import META_FILE, ClientStore
+    from explanations import NativeTreeExplainer
+
+    feature_names = app.read_required_features()
+    if os.path.exists(os.path.join(app.CLIENTS_STORE_PATH, META_FILE)):
+        features = ClientStore.from_directory(app.CLIENTS_STORE_PATH, feature_names).features
+    else:
+        import pandas as pd
+
+        features = pd.read_csv(app.CLIENTS_DATA_PATH)[feature_names].to_numpy(dtype=np.float64)
+    model = joblib.load(app.MODEL_PATH)
+    service = GlobalImportanceService(os.path.dirname(app.MODEL_PATH), app.MODEL_PATH, app.CLIENTS_DATA_PATH,
+                                      feature_names, store_path=app.CLIENTS_STORE_PATH)
+    service.start(model, NativeTreeExplainer.for_model(model, batch_threads=app.EXPLAIN_BATCH_THREADS), features,
+                  background=False)
+    print(f"Importances globales calculées sur {len(features)} clients ({service.data_path}).")
@@ -0,0 +1,76 @@
+import gc
+import multiprocessing
+import os
+import tempfile
+
+# Configuration gunicorn du backend : gunicorn -c gunicorn.conf.py app:app
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Nombre de workers et de threads par worker
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", "2"))
+worker_class = "gthread"
+
+# Importer l'application dans le maître avant le fork. L'import est léger (l'état n'est pas
+# chargé, WARM_START=lazy) ; le chargement se fait dans when_ready (WARM_IN_MASTER=1, les
+# workers partagent alors ces pages en copy-on-write) ou dans chaque worker après le fork
+preload_app = True
+os.environ.setdefault("WARM_START", "lazy")
+WARM_IN_MASTER = os.environ.get("WARM_IN_MASTER", "1") == "1"
+
+# Recyclage progressif des workers (limite la dérive mémoire) et arrêt propre
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Répertoire des instantanés de métriques fusionnés par /metrics (un fichier par worker)
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"projet7_metrics_{os.getpid()}"))
+
+
+def on_starting(server):
+    """Repartir d'un répertoire de métriques (et d'instantanés de dérive) vide à chaque démarrage du serveur."""
+    import drift
+    import metrics
+    import snapshots
+
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    for prefix in (metrics.SNAPSHOT_PREFIX, drift.SNAPSHOT_PREFIX):
+        snapshots.clear_directory(os.environ["METRICS_DIR"], prefix)
+
+
+def when_ready(server):
+    """Préchauffer le modèle dans le maître, avant le lancement des workers."""
+    if not WARM_IN_MASTER:
+        return
+    import app
+
+    app.warmup()
+    # Sortir les objets déjà chargés du suivi du GC : les workers ne réécrivent pas
+    # leurs pages en parcourant ces objets, qui restent donc partagés
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Sans préchauffage dans le maître, charger l'état en arrière-plan dans chaque worker (/ready répond 503 d'ici là)."""
+    if not WARM_IN_MASTER:
+        import app
+
+        app.start_background_load()
+
+
+def worker_exit(server, worker):
+    """Dans le worker qui s'arrête (recyclage par max_requests) : rendre ses IDs clients réservés et non
+    attribués, écrire ses derniers instantanés."""
+    import app
+
+    app.shutdown_worker()
+
+
+def child_exit(server, worker):
+    """Dans le maître : intégrer les instantanés du worker arrêté à l'agrégat des workers recyclés, puis les supprimer."""
+    import drift
+    import metrics
+
+    metrics.retire_snapshot(os.environ["METRICS_DIR"], worker.pid)
+    drift.retire_snapshot(os.environ["METRICS_DIR"], worker.pid)
@@ -0,0 +1,109 @@
+import fcntl
+import os
+import threading
+
+import numpy as np
+
+# Largeur fixe du curseur sur disque : chaque écriture recouvre entièrement la précédente
+CURSOR_WIDTH = 20
+
+
+def read_id_pool(path):
+    """Lire la liste d'IDs disponibles (liste séparée par des virgules), sans la modifier."""
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.int64)
+    with open(path, "r") as f:
+        ids = [token.strip() for token in f.read().split(",")]
+    return np.array([int(token) for token in ids if token.isdigit()], dtype=np.int64)
+
+
+class IdAllocator:
+    """Attribution d'IDs unique entre processus, à partir d'un pool immuable et d'un curseur.
+
+    Le pool (`current_id.txt`) n'est plus réécrit : seul un curseur, position du prochain
+    ID libre, est avancé sous verrou exclusif (`flock`). Chaque processus réserve un bail
+    de `lease_size` IDs en une seule opération disque, puis les distribue en mémoire. Les
+    IDs d'un bail non consommés sont rendus par `release()` (à l'arrêt d'un worker) dans
+    une liste d'IDs libres, tenue sous le même verrou et servie avant le curseur.
+    """
+
+    def __init__(self, pool_path, cursor_path=None, lease_size=1):
+        self.pool_path = pool_path
+        self.cursor_path = cursor_path or f"{pool_path}.cursor"
+        self.free_path = f"{self.cursor_path}.free"
+        self.lease_size = max(1, int(lease_size))
+        self.pool = read_id_pool(pool_path)
+        self._lock = threading.Lock()
+        self._lease = []
+        self._pid = None
+
+    def _locked_cursor(self, update):
+        """Appeler `update(fd)` sous verrou exclusif du curseur (qui protège aussi la liste des IDs libres)."""
+        fd = os.open(self.cursor_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return update(fd)
+        finally:
+            os.close(fd)
+
+    def _read_free(self):
+        if not os.path.exists(self.free_path):
+            return []
+        with open(self.free_path, "r") as f:
+            return [int(token) for token in f.read().split(",") if token.strip().isdigit()]
+
+    def _write_free(self, ids):
+        with open(f"{self.free_path}.tmp", "w") as f:
+            f.write(",".join(str(i) for i in ids))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.free_path}.tmp", self.free_path)
+
+    def _reserve(self):
+        """Réserver un bail : d'abord des IDs rendus, puis en avançant le curseur partagé."""
+        def update(fd):
+            free = self._read_free()
+            if free:
+                self._write_free(free[self.lease_size:])
+                return free[:self.lease_size]
+            raw = os.read(fd, CURSOR_WIDTH).strip()
+            start = int(raw) if raw else 0
+            stop = min(start + self.lease_size, len(self.pool))
+            if stop > start:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, str(stop).rjust(CURSOR_WIDTH).encode())
+                os.fsync(fd)
+            return self.pool[start:stop].tolist()
+
+        return self._locked_cursor(update)
+
+    def release(self):
+        """Rendre les IDs du bail non distribués (à l'arrêt du processus) ; renvoie leur nombre."""
+        with self._lock:
+            if self._pid != os.getpid() or not self._lease:
+                return 0
+            lease, self._lease = self._lease, []
+        self._locked_cursor(lambda fd: self._write_free(self._read_free() + lease))
+        return len(lease)
+
+    def allocate(self):
+        """Prochain ID disponible, ou None si le pool est épuisé."""
+        with self._lock:
+            # Un bail hérité du processus maître ne doit pas être distribué par chaque worker
+            if self._pid != os.getpid():
+                self._lease = []
+                self._pid = os.getpid()
+            if not self._lease:
+                self._lease = self._reserve()
+            if not self._lease:
+                return None
+            return self._lease.pop(0)
+
+    def remaining(self):
+        """Nombre d'IDs jamais réservés dans le pool ou rendus depuis."""
+        released = len(self._read_free())
+        if not os.path.exists(self.cursor_path):
+            return len(self.pool) + released
+        with open(self.cursor_path, "r") as f:
+            raw = f.read().strip()
+        return max(len(self.pool) - (int(raw) if raw else 0), 0) + released
@@ -0,0 +1,60 @@
+import json
+import os
+import warnings
+
+import numpy as np
+
+# Fichier de la table d'imputation, enregistré avec le format binaire des clients
+IMPUTATION_FILE = "imputation.json"
+
+STATISTICS = ("median", "mean")
+
+
+class ImputationTable:
+    """Statistiques par feature (médiane, moyenne) calculées une seule fois sur les données clients.
+
+    Sert à compléter un nouveau client : chaque feature restée à la valeur par défaut (0)
+    est remplacée par la statistique choisie, en une seule opération vectorisée.
+    """
+
+    def __init__(self, feature_names, statistics):
+        self.feature_names = list(feature_names)
+        self.statistics = {name: np.asarray(values, dtype=np.float64) for name, values in statistics.items()}
+
+    @classmethod
+    def compute(cls, features, feature_names):
+        """Calculer la table, colonne par colonne pour borner la mémoire (matrice memory-mappée)."""
+        n_features = len(feature_names)
+        if len(features) == 0:
+            # Sans données de référence, les valeurs par défaut sont conservées
+            zeros = np.zeros(n_features)
+            return cls(feature_names, {name: zeros for name in STATISTICS})
+
+        statistics = {name: np.empty(n_features) for name in STATISTICS}
+        with warnings.catch_warnings():
+            # Colonne entièrement vide : la statistique vaut NaN, comme avec pandas
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for j in range(n_features):
+                column = np.asarray(features[:, j], dtype=np.float64)
+                statistics["median"][j] = np.nanmedian(column)
+                statistics["mean"][j] = np.nanmean(column)
+        return cls(feature_names, statistics)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            content = json.load(f)
+        return cls(content["feature_names"], {name: content[name] for name in STATISTICS})
+
+    def save(self, path):
+        content = {"feature_names": self.feature_names}
+        content.update({name: values.tolist() for name, values in self.statistics.items()})
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(content, f)
+        os.replace(tmp_path, path)
+
+    def fill(self, row, statistic="median"):
+        """Remplacer les valeurs par défaut (0) d'une ligne de features par la statistique choisie."""
+        row = np.asarray(row, dtype=np.float64)
+        return np.where(row == 0, self.statistics[statistic], row)
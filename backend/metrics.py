@@ -0,0 +1,159 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import snapshots
+
+# Bornes des histogrammes de durée (secondes) et de taille (nombre de lignes)
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+# Préfixe des instantanés des workers et de l'agrégat des workers arrêtés (voir retire_snapshot)
+SNAPSHOT_PREFIX = "metrics"
+EMPTY_RETIRED = {"series": []}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def gauge_lines(name, help_text, samples):
+    """Lignes au format texte Prometheus d'une jauge ; `samples` est une liste de (labels, valeur)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+    return lines
+
+
+class Metrics:
+    """Histogrammes et compteurs du processus, exportés au format texte Prometheus.
+
+    L'enregistrement d'une mesure coûte un verrou et une recherche dichotomique. Avec
+    plusieurs workers gunicorn, chaque processus écrit un instantané de ses séries dans
+    `directory` (voir `snapshots.ProcessSnapshots`) ; l'export fusionne les instantanés
+    des workers en vie et l'agrégat des workers recyclés, pour que les compteurs restent
+    croissants.
+    """
+
+    def __init__(self, namespace, directory=None, flush_interval=1.0):
+        self.namespace = namespace
+        self.directory = directory
+        self._families = {}
+        self._series = {}
+        self._lock = threading.Lock()
+        self._snapshots = snapshots.ProcessSnapshots(directory, SNAPSHOT_PREFIX, flush_interval)
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        self._families[f"{self.namespace}_{name}"] = ("histogram", help_text, tuple(buckets))
+
+    def counter(self, name, help_text):
+        self._families[f"{self.namespace}_{name}"] = ("counter", help_text, None)
+
+    def _check_fork(self):
+        # Un worker forké repart de zéro : les séries du maître ne sont pas comptées deux fois
+        if self._snapshots.forked():
+            self._series = {}
+
+    def observe(self, name, value, **labels):
+        """Ajouter une observation à un histogramme."""
+        family = f"{self.namespace}_{name}"
+        buckets = self._families[family][2]
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(buckets, value)] += 1
+            series[1] += value
+        self._snapshots.ensure_flusher(self.flush)
+
+    def inc(self, name, amount=1, **labels):
+        """Incrémenter un compteur."""
+        key = (f"{self.namespace}_{name}", tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._series[key] = self._series.get(key, 0) + amount
+        self._snapshots.ensure_flusher(self.flush)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Mesurer la durée d'un bloc dans un histogramme (en secondes)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return [[family, [list(pair) for pair in labels], value if not isinstance(value, list)
+                     else [list(value[0]), value[1]]]
+                    for (family, labels), value in self._series.items()]
+
+    def flush(self):
+        """Écrire l'instantané du processus."""
+        self._snapshots.write({"series": self.snapshot()})
+
+    def collect(self):
+        """Séries fusionnées : instantanés des autres processus, agrégat des workers arrêtés et état de celui-ci."""
+        others, retired = self._snapshots.read(EMPTY_RETIRED)
+        return merge_snapshots([self.snapshot()] + [content["series"] for content in others] + [retired["series"]])
+
+    def render(self):
+        """Texte Prometheus des histogrammes et compteurs (fusionnés entre workers)."""
+        merged = self.collect()
+        lines = []
+        for family, (kind, help_text, buckets) in self._families.items():
+            lines += [f"# HELP {family} {help_text}", f"# TYPE {family} {kind}"]
+            for (name, labels), value in sorted(merged.items()):
+                if name != family:
+                    continue
+                if kind == "counter":
+                    lines.append(f"{family}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value[0]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{family}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{family}_sum{_format_labels(labels)} {value[1]!r}")
+                lines.append(f"{family}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+def merge_snapshots(series_snapshots):
+    """Additionner des instantanés de séries : {(famille, labels): compteur ou [seaux, somme]}."""
+    merged = {}
+    for snapshot in series_snapshots:
+        for family, labels, value in snapshot:
+            key = (family, tuple(tuple(pair) for pair in labels))
+            if isinstance(value, list):
+                total = merged.setdefault(key, [[0] * len(value[0]), 0.0])
+                total[0] = [a + b for a, b in zip(total[0], value[0])]
+                total[1] += value[1]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _merge_retired(retired, content):
+    series = merge_snapshots([retired["series"], content["series"]])
+    return {"series": [[family, [list(pair) for pair in labels], value] for (family, labels), value in series.items()]}
+
+
+def retire_snapshot(directory, pid):
+    """Intégrer l'instantané d'un worker arrêté à l'agrégat des workers recyclés (voir `snapshots.retire_snapshot`)."""
+    snapshots.retire_snapshot(directory, SNAPSHOT_PREFIX, pid, _merge_retired, EMPTY_RETIRED)
@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from explanations import NativeTreeExplainer, file_digest, positive_class
+from tree_engine import compile_verified
+from whatif import WhatIfEngine
+
+# Nom du modèle servi quand la requête n'en demande pas
+DEFAULT_MODEL = "default"
+
+
+def file_stamp(path):
+    """Signature bon marché (mtime, taille) d'un fichier, None s'il n'existe pas."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class InvalidModel(ValueError):
+    """Artefact refusé au chargement : il ne discrimine pas les clients de l'échantillon."""
+
+
+def discover_models(directory, names=None, prefix="best_model_"):
+    """Artefacts `best_model_<nom>.pkl` d'un répertoire, indexés par <nom>, limités à `names` s'il est donné."""
+    if not directory or not os.path.isdir(directory):
+        return {}
+    sources = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith(prefix) and filename.endswith(".pkl"):
+            sources[filename[len(prefix):-len(".pkl")]] = os.path.join(directory, filename)
+    if names is None:
+        return sources
+    missing = [name for name in names if name not in sources]
+    if missing:
+        logging.warning(f"Modèles introuvables dans {directory} : {', '.join(missing)}")
+    return {name: sources[name] for name in names if name in sources}
+
+
+def build_explainer(backend, model, background, num_threads=1, batch_threads=0):
+    """Explainer `backend` d'un modèle ; None si le backend natif ne s'applique pas (modèle non LightGBM).
+
+    Le paquet shap n'est importé que s'il sert : un déploiement en backend natif s'en passe.
+    """
+    if backend == "native":
+        return NativeTreeExplainer.for_model(model, num_threads, batch_threads)
+    import shap
+    if hasattr(model, "coef_"):
+        return shap.LinearExplainer(model, background)
+    return shap.TreeExplainer(model)
+
+
+class ModelBundle:
+    """Un modèle chargé avec ses composants préchauffés : explainer, moteur compilé, what-if.
+
+    Certains artefacts (dossier `best modele/`) ont été entraînés avec SK_ID_CURR en
+    première colonne : elle est ajoutée à la matrice des features avant le scoring, et
+    sa contribution SHAP est retirée des explications.
+    """
+
+    def __init__(self, name, path, model, engine, whatif, n_features, max_engine_rows=64,
+                 explainer_backend="shap", explain_threads=1, explain_batch_threads=0):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.explainer_backend = explainer_backend
+        self.explain_threads = explain_threads
+        self.explain_batch_threads = explain_batch_threads
+        self.background = None
+        self._explainers = {}
+        self._explainers_lock = threading.Lock()
+        self.engine = engine
+        self.whatif = whatif
+        self.version = file_digest(path)
+        self.stamp = file_stamp(path)
+        self.loaded_at = time.time()
+        self.max_engine_rows = max_engine_rows
+        self.prepends_id = getattr(model, "n_features_in_", n_features) == n_features + 1
+
+    @classmethod
+    def load(cls, name, path, feature_names, sample, use_engine=True, max_engine_rows=64,
+             explainer_backend="shap", explain_threads=1, explain_batch_threads=0):
+        """Charger un artefact et préparer (puis préchauffer) tout ce qu'il faut pour le servir.
+
+        `sample` (lignes de clients existants) sert à vérifier le moteur compilé, de fond
+        pour l'explainer linéaire et de préchauffage. Un modèle qui renvoie la même
+        probabilité pour tous les clients de l'échantillon (entraîné sur des entrées non
+        mises à l'échelle, par exemple) est refusé avec InvalidModel. Seul l'explainer du
+        backend par défaut est construit ici ; l'autre l'est à sa première demande.
+        """
+        model = joblib.load(path)
+        n_features = len(feature_names)
+        sample = np.asarray(sample, dtype=np.float64)
+        if len(sample) == 0:
+            sample = np.zeros((1, n_features))
+
+        bundle = cls(name, path, model, None, None, n_features, max_engine_rows, explainer_backend,
+                     explain_threads, explain_batch_threads)
+        design = bundle.design(sample)
+        bundle.background = design
+        if len(design) > 1 and np.ptp(model.predict_proba(design)[:, 1]) == 0:
+            raise InvalidModel(f"Le modèle {name} renvoie la même probabilité pour tous les clients de l'échantillon.")
+
+        if use_engine:
+            bundle.engine = compile_verified(model, design)
+            if bundle.engine is None:
+                logging.warning(f"Moteur compilé indisponible pour le modèle {name} : utilisation de predict_proba.")
+        # Le what-if incrémental travaille sur les indices des features servies (sans SK_ID_CURR)
+        if not bundle.prepends_id:
+            bundle.whatif = WhatIfEngine.for_model(bundle.engine, model, explain_threads)
+
+        bundle.warmup(sample[:1])
+        return bundle
+
+    def design(self, matrix, ids=None):
+        """Matrice passée au modèle : SK_ID_CURR ajouté en tête si le modèle l'attend (0 si inconnu)."""
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float64))
+        if not self.prepends_id:
+            return matrix
+        ids = np.zeros(len(matrix)) if ids is None else np.asarray(ids, dtype=np.float64).reshape(-1)
+        return np.column_stack([ids, matrix])
+
+    def predict_design(self, design):
+        if self.engine is not None and len(design) <= self.max_engine_rows:
+            return self.engine.predict_proba(design)[:, 1]
+        return self.model.predict_proba(design)[:, 1]
+
+    def _explainer(self, backend):
+        if backend not in self._explainers:
+            with self._explainers_lock:
+                if backend not in self._explainers:
+                    self._explainers[backend] = build_explainer(backend, self.model, self.background,
+                                                                self.explain_threads, self.explain_batch_threads)
+        return self._explainers[backend]
+
+    def explainer_name(self, backend=None):
+        """Backend effectivement utilisé : le natif n'existe que pour LightGBM (repli sur shap)."""
+        backend = backend or self.explainer_backend
+        if backend == "native" and self._explainer("native") is None:
+            return "shap"
+        return backend
+
+    @property
+    def explainer(self):
+        """Explainer du backend par défaut (interface `shap_values` commune aux deux backends)."""
+        return self._explainer(self.explainer_name())
+
+    def explain_design(self, design, backend=None):
+        shap_values = positive_class(self._explainer(self.explainer_name(backend)).shap_values(design))
+        return shap_values[:, 1:] if self.prepends_id else shap_values
+
+    def predict_positive(self, matrix, ids=None):
+        """Probabilité de défaut (classe positive) de chaque ligne d'une matrice de features."""
+        return self.predict_design(self.design(matrix, ids))
+
+    def shap_values(self, matrix, ids=None, backend=None):
+        """Valeurs SHAP (classe positive) des features servies, sous forme (n_lignes, n_features)."""
+        return self.explain_design(self.design(matrix, ids), backend)
+
+    def warmup(self, sample):
+        design = self.design(sample)
+        self.predict_design(design)
+        self.model.predict_proba(design)
+        self.explain_design(design)
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "type": type(self.model).__name__,
+            "compiled": self.engine is not None,
+            "incremental_whatif": self.whatif is not None,
+            "explainer": self.explainer_name(),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """Modèles chargés côte à côte, sélectionnables par requête et rechargés à chaud.
+
+    Un artefact modifié sur disque est rechargé et préchauffé en arrière-plan, puis
+    substitué d'un coup (remplacement du dictionnaire des modèles) : les requêtes en
+    cours gardent l'ancienne version, les suivantes reçoivent la nouvelle, sans pic de
+    latence. Un artefact illisible (en cours d'écriture par exemple) est ignoré
+    jusqu'au contrôle suivant. Un modèle autre que celui par défaut qui ne se charge
+    pas au démarrage (InvalidModel par exemple) n'est pas servi tant que son fichier
+    ne change pas.
+    """
+
+    def __init__(self, sources, loader, default=DEFAULT_MODEL, reload_interval=0):
+        self.sources = dict(sources)
+        self.loader = loader
+        self.default = default
+        self.reload_interval = reload_interval
+        self._models = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        for name, path in self.sources.items():
+            if name == default:
+                self._models[name] = loader(name, path)
+                continue
+            try:
+                self._models[name] = loader(name, path)
+            except Exception as e:
+                self._failed[name] = file_stamp(path)
+                logging.error(f"Modèle {name} non servi : {e}")
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def names(self):
+        return list(self._models)
+
+    def get(self, name=None):
+        """Modèle demandé (le modèle par défaut si `name` est None) ; KeyError s'il est inconnu."""
+        self._ensure_watching()
+        return self._models[self.default if name is None else name]
+
+    def reload(self, name):
+        """Recharger un artefact puis le substituer atomiquement à l'ancienne version."""
+        bundle = self.loader(name, self.sources[name])
+        with self._lock:
+            self._models = {**self._models, name: bundle}
+        logging.info(f"Modèle {name} rechargé (version {bundle.version}).")
+        return bundle
+
+    def reload_changed(self):
+        """Recharger les artefacts dont le fichier a changé ; renvoie leurs noms."""
+        reloaded = []
+        for name, path in self.sources.items():
+            current = self._models.get(name)
+            stamp = file_stamp(path)
+            if current is not None and stamp in (None, current.stamp):
+                continue
+            if current is None and stamp in (None, self._failed.get(name)):
+                continue
+            try:
+                self.reload(name)
+                self._failed.pop(name, None)
+                reloaded.append(name)
+            except Exception as e:
+                self._failed[name] = stamp
+                logging.error(f"Erreur lors du rechargement du modèle {name} : {e}")
+        return reloaded
+
+    def _ensure_watching(self):
+        # Un thread de surveillance par processus
+        if self.reload_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(self.reload_interval)
+                self.reload_changed()
+
+        threading.Thread(target=loop, name="model-registry-watch", daemon=True).start()
+
+    def stats(self):
+        return {"default": self.default,
+                "models": {name: bundle.describe() for name, bundle in self._models.items()}}
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class InvalidOverride(ValueError):
+    """Valeur personnalisée non numérique : erreur de la requête (400), pas du serveur."""
+
+
+class FeatureOverrides:
+    """Application de valeurs personnalisées sur des lignes de features, sans passer par pandas.
+
+    Le dictionnaire nom de feature -> colonne est construit une seule fois. Un jeu de
+    valeurs est validé et converti en float64 en un seul passage, puis écrit d'un bloc
+    (indexation NumPy) dans une copie de la ligne de référence ; plusieurs jeux donnent
+    une matrice (un jeu par ligne) scorée en un seul appel au modèle.
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+
+    def parse(self, values):
+        """(indices, valeurs float64) des features connues de `values` ; les autres clés et les None sont ignorés."""
+        keys = [key for key, value in values.items() if value is not None and key in self.index]
+        try:
+            coerced = np.array([values[key] for key in keys], dtype=np.float64)
+        except (TypeError, ValueError):
+            coerced = None
+        if coerced is None or coerced.ndim != 1:
+            invalid = [key for key in keys if not _is_number(values[key])]
+            raise InvalidOverride(f"Valeurs non numériques pour : {', '.join(invalid)}")
+        indices = np.fromiter((self.index[key] for key in keys), dtype=np.intp, count=len(keys))
+        return indices, coerced
+
+    def apply(self, base_row, values):
+        """Copie (1, n_features) de la ligne de référence avec les valeurs de `values`."""
+        indices, coerced = self.parse(values)
+        row = np.array(base_row, dtype=np.float64).reshape(1, -1)
+        row[0, indices] = coerced
+        return row
+
+    def apply_many(self, base_row, override_sets):
+        """Matrice (n_jeux, n_features) : la ligne de référence modifiée par chaque jeu de valeurs.
+
+        Tous les jeux sont validés avant l'écriture ; une erreur indique le numéro du jeu fautif.
+        """
+        parsed = []
+        for position, values in enumerate(override_sets):
+            if not isinstance(values, dict):
+                raise InvalidOverride(f"Le jeu de valeurs {position} n'est pas un objet JSON.")
+            try:
+                parsed.append(self.parse(values))
+            except InvalidOverride as e:
+                raise InvalidOverride(f"Jeu de valeurs {position} : {e}")
+
+        matrix = np.repeat(np.asarray(base_row, dtype=np.float64).reshape(1, -1), len(parsed), axis=0)
+        if parsed:
+            rows = np.repeat(np.arange(len(parsed)), [len(indices) for indices, _ in parsed])
+            matrix[rows, np.concatenate([indices for indices, _ in parsed])] = np.concatenate(
+                [coerced for _, coerced in parsed])
+        return matrix
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
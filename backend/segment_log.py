@@ -0,0 +1,178 @@
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from client_store import META_FILE, TABLE_FILE, read_ids, read_meta, write_ids, write_meta, write_table
+from imputation import IMPUTATION_FILE, ImputationTable
+
+# Fichiers du journal : le dernier numéro attribué, le verrou des ajouts et celui de la compaction
+SEQUENCE_FILE = "SEQUENCE"
+LOCK_FILE = "LOCK"
+COMPACT_LOCK_FILE = "COMPACT_LOCK"
+
+
+class SegmentLog:
+    """Journal des clients ingérés : un segment `.npy` par ingestion, jamais modifié ensuite.
+
+    Un segment contient des lignes complètes (colonnes du format binaire, features en
+    premier, SK_ID_CURR compris) ; les IDs qu'il apporte sont le delta de l'index des
+    clients. Les numéros de segments sont attribués sous verrou exclusif (`flock`) et
+    chaque segment est écrit puis renommé : un worker qui lit le répertoire ne voit que
+    des segments complets, dans l'ordre. La compaction les intègre au fichier principal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def segment_path(self, sequence):
+        return os.path.join(self.path, f"{sequence:012d}.npy")
+
+    @contextmanager
+    def _locked(self, filename, blocking=True):
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, filename), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def last_sequence(self):
+        """Numéro du dernier segment écrit (0 si aucun)."""
+        try:
+            with open(os.path.join(self.path, SEQUENCE_FILE), "r") as f:
+                raw = f.read().strip()
+        except FileNotFoundError:
+            return 0
+        return int(raw) if raw else 0
+
+    def append(self, rows, keep=None):
+        """Écrire un segment ; renvoie son numéro (None si aucune ligne n'est retenue).
+
+        `keep(rows)`, évalué sous le verrou des ajouts, renvoie le masque des lignes à
+        écrire : tous les segments déjà écrits, par n'importe quel processus, sont alors
+        visibles (contrôle des doublons entre workers).
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        with self._locked(LOCK_FILE):
+            if keep is not None:
+                rows = rows[np.asarray(keep(rows), dtype=bool)]
+            if not len(rows):
+                return None
+            sequence = self.last_sequence() + 1
+            tmp_path = os.path.join(self.path, f".{sequence}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.segment_path(sequence))
+            sequence_path = os.path.join(self.path, SEQUENCE_FILE)
+            with open(f"{sequence_path}.tmp", "w") as f:
+                f.write(str(sequence))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{sequence_path}.tmp", sequence_path)
+        return sequence
+
+    def sequences(self, after=0, through=None):
+        """Numéros des segments présents dans ]after, through], triés."""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        found = sorted(int(name[:-4]) for name in names if name.endswith(".npy") and name[:-4].isdigit())
+        return [seq for seq in found if seq > after and (through is None or seq <= through)]
+
+    def read_since(self, after=0, through=None):
+        """Segments (numéro, lignes) écrits après `after`, dans l'ordre."""
+        segments = []
+        for sequence in self.sequences(after, through):
+            try:
+                segments.append((sequence, np.load(self.segment_path(sequence))))
+            except FileNotFoundError:
+                # Intégré et supprimé par une compaction entre-temps : le stockage sera rechargé
+                break
+        return segments
+
+    def discard_through(self, through):
+        for sequence in self.sequences(0, through):
+            try:
+                os.remove(self.segment_path(sequence))
+            except FileNotFoundError:
+                pass
+
+
+def compact(store_path, log, feature_names, csv_path=None, chunksize=50000):
+    """Intégrer les segments du journal au format binaire ; renvoie le nombre de lignes de la nouvelle table.
+
+    La nouvelle table et son index des IDs sont écrits sous de nouveaux noms
+    (`table.<segment>.npy`, `ids.<segment>.npy`), puis meta.json est remplacé. Les
+    précédents sont conservés jusqu'à la compaction suivante : un worker qui vient de
+    lire l'ancien meta.json peut encore les ouvrir.
+    Les segments intégrés sont ensuite supprimés, ceux écrits pendant la compaction
+    sont conservés. Sans format binaire, il est
+    d'abord créé depuis `csv_path`. Renvoie None si une autre compaction est en cours
+    ou s'il n'y a rien à intégrer.
+    """
+    with log._locked(COMPACT_LOCK_FILE, blocking=False) as acquired:
+        if not acquired:
+            return None
+        if not os.path.exists(os.path.join(store_path, META_FILE)):
+            if csv_path is None or not os.path.exists(csv_path):
+                return None
+            write_table(csv_path, feature_names, store_path, chunksize)
+
+        meta = read_meta(store_path)
+        through = log.last_sequence()
+        segments = log.read_since(meta.get("segments_through", 0), through)
+        if not segments:
+            return None
+
+        # Comme au chargement, un client déjà présent garde sa première ligne
+        base = np.load(os.path.join(store_path, meta.get("table", TABLE_FILE)), mmap_mode="r")
+        id_column = meta["columns"].index("SK_ID_CURR")
+        base_ids = read_ids(store_path, meta, base)
+        known = set(base_ids.tolist())
+        new_rows = []
+        for _, rows in segments:
+            keep = np.zeros(len(rows), dtype=bool)
+            for i, sk_id in enumerate(rows[:, id_column].astype(np.int64).tolist()):
+                keep[i] = sk_id not in known
+                known.add(sk_id)
+            new_rows.append(rows[keep])
+        new_rows = np.concatenate(new_rows)
+
+        table_name = f"table.{through}.npy"
+        table_path = os.path.join(store_path, table_name)
+        table = np.lib.format.open_memmap(f"{table_path}.tmp", mode="w+", dtype=np.float64,
+                                          shape=(len(base) + len(new_rows), base.shape[1]))
+        for start in range(0, len(base), chunksize):
+            stop = min(start + chunksize, len(base))
+            table[start:stop] = base[start:stop]
+        table[len(base):] = new_rows
+        table.flush()
+        ImputationTable.compute(table[:, :len(feature_names)], feature_names).save(
+            os.path.join(store_path, IMPUTATION_FILE))
+        n_rows = len(table)
+        del table
+        os.replace(f"{table_path}.tmp", table_path)
+        ids_name = f"ids.{through}.npy"
+        write_ids(store_path, ids_name, np.concatenate([base_ids, new_rows[:, id_column].astype(np.int64)]))
+
+        write_meta(store_path, meta["columns"], feature_names, n_rows, meta["source"], meta["source_digest"],
+                   table=table_name, segments_through=through, ids=ids_name)
+        # Tables et index antérieurs aux précédents : plus aucun meta.json ne les désigne depuis une compaction
+        kept = (table_name, ids_name, meta.get("table", TABLE_FILE), meta.get("ids"))
+        for name in os.listdir(store_path):
+            if name.startswith(("table", "ids")) and name.endswith(".npy") and name not in kept:
+                os.remove(os.path.join(store_path, name))
+        log.discard_through(through)
+        logging.info(f"Compaction : {len(new_rows)} clients intégrés ({len(segments)} segments), {n_rows} au total.")
+        return n_rows
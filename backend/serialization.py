@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+
+# Sérialiseurs rapides optionnels : orjson pour le JSON, msgpack pour un format binaire
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+def _default(value):
+    """Convertir les types NumPy restants en types Python natifs."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def accepts_msgpack(accept_header):
+    return msgpack is not None and MSGPACK_MIMETYPE in (accept_header or "")
+
+
+def encode(payload, accept_header=None):
+    """Encoder une réponse ; renvoie (octets, type MIME).
+
+    msgpack si le client le demande (en-tête Accept) et qu'il est installé, sinon JSON
+    via orjson si disponible, avec repli sur le module json standard.
+    """
+    if accepts_msgpack(accept_header):
+        return msgpack.packb(payload, default=_default, use_bin_type=True), MSGPACK_MIMETYPE
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY), JSON_MIMETYPE
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8"), JSON_MIMETYPE
@@ -0,0 +1,128 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class ProcessSnapshots:
+    """Instantanés d'un état additif, un fichier par processus dans un répertoire partagé.
+
+    Chaque worker gunicorn écrit `<prefix>_<pid>.json` (remplacement atomique) toutes
+    les `flush_interval` secondes depuis un thread propre au processus : les threads ne
+    survivent pas au fork. Un instantané porte un jeton, renouvelé à chaque fork ; le
+    maître intègre l'instantané d'un worker arrêté à `<prefix>_retired.json` (voir
+    `retire_snapshot`) et la lecture ignore les instantanés que l'agrégat contient déjà.
+    Sans répertoire, rien n'est écrit ni lu.
+    """
+
+    def __init__(self, directory, prefix, flush_interval=1.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.token = uuid.uuid4().hex
+        self._pid = os.getpid()
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def forked(self):
+        """Vrai au premier appel dans un processus forké : l'état hérité du maître doit repartir de zéro."""
+        if self._pid == os.getpid():
+            return False
+        self._pid = os.getpid()
+        self.token = uuid.uuid4().hex
+        return True
+
+    def path(self, pid):
+        return snapshot_path(self.directory, self.prefix, pid)
+
+    def write(self, content):
+        """Écrire l'instantané du processus, avec son jeton."""
+        if not self.directory:
+            return
+        _write_json(self.path(os.getpid()), {"token": self.token, **content})
+
+    def ensure_flusher(self, flush):
+        """Démarrer, une fois par processus, le thread qui appelle `flush` périodiquement."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=loop, name=f"{self.prefix}-flush", daemon=True).start()
+
+    def read(self, empty):
+        """Instantanés des autres processus en vie (hors agrégat) et agrégat des workers arrêtés.
+
+        L'agrégat est lu en dernier : un worker qu'il contient déjà n'est pas compté deux fois.
+        """
+        if not self.directory:
+            return [], empty
+        own = self.path(os.getpid())
+        others = [content for path in glob.glob(os.path.join(self.directory, f"{self.prefix}_*.json"))
+                  if path not in (own, retired_path(self.directory, self.prefix))
+                  and (content := read_json(path)) is not None]
+        retired = read_json(retired_path(self.directory, self.prefix)) or {"tokens": [], **empty}
+        return [content for content in others if content.get("token") not in retired["tokens"]], retired
+
+
+def snapshot_path(directory, prefix, pid):
+    return os.path.join(directory, f"{prefix}_{pid}.json")
+
+
+def retired_path(directory, prefix):
+    return os.path.join(directory, f"{prefix}_retired.json")
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, content):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(content, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def retire_snapshot(directory, prefix, pid, merge, empty):
+    """Intégrer l'instantané d'un worker arrêté à l'agrégat, puis le supprimer.
+
+    Appelé par le maître gunicorn (child_exit), seul à écrire l'agrégat. `merge(agrégat,
+    instantané)` renvoie le nouveau contenu de l'agrégat (hors jetons) ; `empty` est celui
+    d'un agrégat vide. L'agrégat garde le jeton des instantanés qu'il contient tant que
+    leur fichier existe encore : une lecture concurrente ignore alors ce fichier.
+    """
+    path = snapshot_path(directory, prefix, pid)
+    content = read_json(path)
+    if content is not None:
+        retired = read_json(retired_path(directory, prefix)) or {"tokens": [], **empty}
+        present = {other.get("token") for other_path in glob.glob(os.path.join(directory, f"{prefix}_*.json"))
+                   if other_path != path and (other := read_json(other_path)) is not None}
+        _write_json(retired_path(directory, prefix), {
+            "tokens": [token for token in retired["tokens"] if token in present] + [content["token"]],
+            **merge(retired, content),
+        })
+    for stale in (path, f"{path}.tmp"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def clear_directory(directory, prefix):
+    """Supprimer les instantanés et l'agrégat d'une exécution précédente (au démarrage du serveur)."""
+    for path in glob.glob(os.path.join(directory, f"{prefix}_*.json*")):
+        os.remove(path)
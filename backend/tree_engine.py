@@ -0,0 +1,250 @@
+import numpy as np
+
+# Types de valeurs manquantes d'un noeud (mêmes conventions que LightGBM)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# Seuil sous lequel LightGBM considère une valeur comme nulle (kZeroThreshold, en float32)
+K_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+
+class TreeEnsemble:
+    """Ensemble d'arbres aplati en tableaux NumPy, scoré par un parcours vectorisé.
+
+    Tous les noeuds de tous les arbres sont numérotés globalement. Une feuille boucle
+    sur elle-même : après `max_depth` pas de parcours, chaque (ligne, arbre) est sur
+    sa feuille, sans test de fin par arbre.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, missing_type, value,
+                 roots, max_depth, n_features, transform="sigmoid", sigmoid=1.0,
+                 average_output=False, input_dtype=np.float64):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing_type = np.asarray(missing_type, dtype=np.int8)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        # Enfants entrelacés : children[2 * noeud + 1] à gauche, children[2 * noeud] à droite
+        self.children = np.column_stack([self.right, self.left]).reshape(-1)
+        # Sans valeur manquante dans l'entrée ni noeud de type "Zero", la règle se réduit à x <= seuil
+        self._plain_rule = not (self.missing_type == MISSING_ZERO).any()
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.transform = transform
+        self.sigmoid = sigmoid
+        self.average_output = average_output
+        self.input_dtype = input_dtype
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _prepare(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"{X.shape[1]} features reçues, {self.n_features} attendues.")
+        # Les arbres scikit-learn comparent des entrées converties en float32
+        return X.astype(self.input_dtype, copy=False).astype(np.float64, copy=False)
+
+    def go_left(self, x, node):
+        """Règle de décision numérique de LightGBM (valeurs manquantes comprises)."""
+        missing_type = self.missing_type[node]
+        is_nan = np.isnan(x)
+        x = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, x)
+        use_default = ((missing_type == MISSING_ZERO) & (np.abs(x) <= K_ZERO_THRESHOLD)) \
+            | ((missing_type == MISSING_NAN) & is_nan)
+        return np.where(use_default, self.default_left[node], x <= self.threshold[node])
+
+    def apply(self, X, trees=None):
+        """Feuille atteinte (identifiant global de noeud) pour chaque ligne et chaque arbre."""
+        X = self._prepare(X)
+        roots = self.roots if trees is None else self.roots[trees]
+        plain = self._plain_rule and not np.isnan(X).any()
+
+        if len(X) == 1:
+            # Chemin rapide d'une ligne unique : tableaux 1D, sans indexation par ligne
+            row = X[0]
+            node = roots.copy()
+            for _ in range(self.max_depth):
+                x = row[self.feature[node]]
+                left = x <= self.threshold[node] if plain else self.go_left(x, node)
+                node = self.children[2 * node + left]
+                if self.is_leaf[node].all():
+                    break
+            return node.reshape(1, -1)
+
+        node = np.broadcast_to(roots, (len(X), len(roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            left = x <= self.threshold[node] if plain else self.go_left(x, node)
+            node = self.children[2 * node + left]
+        return node
+
+    def raw_from_leaves(self, leaves):
+        """Sortie brute (somme ou moyenne des valeurs de feuilles)."""
+        raw = self.value[leaves].sum(axis=1)
+        if self.average_output:
+            raw /= self.n_trees
+        return raw
+
+    def raw_predict(self, X):
+        return self.raw_from_leaves(self.apply(X))
+
+    def transform_raw(self, raw):
+        if self.transform == "sigmoid":
+            return 1.0 / (1.0 + np.exp(-self.sigmoid * raw))
+        return raw
+
+    def predict_proba(self, X):
+        """Probabilités (n, 2), au même format que `predict_proba` de scikit-learn."""
+        positive = self.transform_raw(self.raw_predict(X))
+        return np.column_stack([1.0 - positive, positive])
+
+    def trees_using(self, feature_indices):
+        """Indices des arbres dont au moins un noeud interne sépare sur l'une des features."""
+        split_nodes = ~self.is_leaf & np.isin(self.feature, feature_indices)
+        tree_of_node = np.searchsorted(self.roots, np.arange(len(self.feature)), side="right") - 1
+        return np.unique(tree_of_node[split_nodes])
+
+
+class LinearEngine:
+    """Régression logistique scikit-learn évaluée directement (produit scalaire + sigmoïde)."""
+
+    def __init__(self, coef, intercept, n_features):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.n_features = n_features
+
+    def raw_predict(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if np.isnan(X).any():
+            raise ValueError("La régression logistique n'accepte pas de valeurs manquantes (NaN).")
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        positive = 1.0 / (1.0 + np.exp(-self.raw_predict(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+
+def _from_lightgbm(booster):
+    dump = booster.dump_model()
+    if dump.get("num_class", 1) != 1:
+        raise NotImplementedError("Seuls les modèles binaires sont pris en charge.")
+    objective = dump["objective"].split()
+    sigmoid = 1.0
+    for token in objective[1:]:
+        if token.startswith("sigmoid:"):
+            sigmoid = float(token.split(":", 1)[1])
+    transform = "sigmoid" if objective[0] in ("binary", "cross_entropy") else "identity"
+
+    columns = {name: [] for name in ("feature", "threshold", "left", "right", "default_left",
+                                     "missing_type", "value")}
+    roots = []
+    max_depth = 0
+    for tree in dump["tree_info"]:
+        if tree.get("is_linear"):
+            raise NotImplementedError("Les arbres linéaires ne sont pas pris en charge.")
+        offset = len(columns["feature"])
+        n_internal = tree["num_leaves"] - 1
+        n_nodes = n_internal + tree["num_leaves"]
+        local = {name: [None] * n_nodes for name in columns}
+        roots.append(offset)
+
+        def node_id(node):
+            if "leaf_index" in node or "split_index" not in node:
+                return n_internal + node.get("leaf_index", 0)
+            return node["split_index"]
+
+        stack = [(tree["tree_structure"], 0)]
+        while stack:
+            node, depth = stack.pop()
+            i = node_id(node)
+            if "split_index" not in node:
+                max_depth = max(max_depth, depth)
+                for name, default in (("feature", 0), ("threshold", 0.0), ("default_left", True),
+                                      ("missing_type", MISSING_NONE)):
+                    local[name][i] = default
+                local["left"][i] = local["right"][i] = offset + i
+                local["value"][i] = node["leaf_value"]
+                continue
+            if node["decision_type"] != "<=":
+                raise NotImplementedError("Les séparations catégorielles ne sont pas prises en charge.")
+            local["feature"][i] = node["split_feature"]
+            local["threshold"][i] = node["threshold"]
+            local["default_left"][i] = node["default_left"]
+            local["missing_type"][i] = _MISSING_TYPES[node["missing_type"]]
+            local["left"][i] = offset + node_id(node["left_child"])
+            local["right"][i] = offset + node_id(node["right_child"])
+            local["value"][i] = 0.0
+            stack.append((node["left_child"], depth + 1))
+            stack.append((node["right_child"], depth + 1))
+
+        for name in columns:
+            columns[name].extend(local[name])
+
+    return TreeEnsemble(roots=roots, max_depth=max_depth, n_features=dump["max_feature_idx"] + 1,
+                        transform=transform, sigmoid=sigmoid,
+                        average_output=bool(dump.get("average_output")), **columns)
+
+
+def _from_sklearn_forest(forest):
+    columns = {name: [] for name in ("feature", "threshold", "left", "right", "default_left",
+                                     "missing_type", "value")}
+    roots = []
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        offset = len(columns["feature"])
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left == -1
+
+        # Probabilité de la classe positive portée par chaque feuille (comme Tree.predict_proba)
+        counts = tree.value[:, 0, :]
+        positive = counts[:, 1] / counts.sum(axis=1)
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+
+        columns["feature"].extend(np.where(leaf, 0, tree.feature))
+        columns["threshold"].extend(np.where(leaf, 0.0, tree.threshold))
+        columns["left"].extend(offset + np.where(leaf, nodes, tree.children_left))
+        columns["right"].extend(offset + np.where(leaf, nodes, tree.children_right))
+        columns["default_left"].extend(missing_left.astype(bool))
+        columns["missing_type"].extend(np.full(tree.node_count, MISSING_NAN))
+        columns["value"].extend(np.where(leaf, positive, 0.0))
+
+    return TreeEnsemble(roots=roots, max_depth=max_depth, n_features=forest.n_features_in_,
+                        transform="identity", average_output=True, input_dtype=np.float32, **columns)
+
+
+def compile_model(model):
+    """Convertir un modèle entraîné (LightGBM, forêt aléatoire, régression logistique) en moteur NumPy."""
+    if hasattr(model, "booster_"):
+        return _from_lightgbm(model.booster_)
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        if len(model.classes_) != 2:
+            raise NotImplementedError("Seuls les modèles binaires sont pris en charge.")
+        return _from_sklearn_forest(model)
+    if hasattr(model, "coef_") and model.coef_.shape[0] == 1:
+        return LinearEngine(model.coef_[0], model.intercept_[0], model.n_features_in_)
+    raise NotImplementedError(f"Modèle non pris en charge : {type(model).__name__}")
+
+
+def compile_verified(model, sample, tolerance=1e-9):
+    """Compiler le modèle et vérifier ses probabilités sur un échantillon ; None en cas d'écart."""
+    try:
+        engine = compile_model(model)
+    except NotImplementedError:
+        return None
+    if len(sample):
+        gap = np.abs(engine.predict_proba(sample) - model.predict_proba(sample)).max()
+        if gap > tolerance:
+            return None
+    return engine
@@ -0,0 +1,104 @@
+import numpy as np
+
+from explanations import lightgbm_threads
+from tree_engine import TreeEnsemble
+
+
+def contiguous_runs(trees):
+    """Découper une liste triée d'indices d'arbres en plages contiguës [début, fin)."""
+    if len(trees) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(trees) != 1) + 1
+    return [(int(run[0]), int(run[-1]) + 1) for run in np.split(trees, breaks)]
+
+
+class WhatIfEngine:
+    """Simulation « et si » incrémentale à partir des feuilles de référence d'un client.
+
+    Seuls les arbres qui séparent sur les features modifiées sont réévalués : la
+    probabilité est mise à jour à partir des feuilles de référence, et les valeurs SHAP
+    en retranchant puis rajoutant les contributions (TreeSHAP natif de LightGBM) de ces
+    seuls arbres, lorsque c'est moins coûteux qu'un recalcul complet. Les appels à
+    LightGBM (une simulation, quelques lignes) utilisent `num_threads` threads.
+    """
+
+    # Coût fixe d'un appel à booster.predict(pred_contrib=True), en équivalent-arbres
+    CALL_COST_IN_TREES = 2.5
+
+    def __init__(self, engine, booster, num_threads=1):
+        self.engine = engine
+        self.booster = booster
+        self.num_threads = num_threads
+        features = np.arange(engine.n_features)
+        self.trees_by_feature = [engine.trees_using([f]) for f in features]
+
+    @classmethod
+    def for_model(cls, engine, model, num_threads=1):
+        """Moteur what-if si le modèle est un ensemble d'arbres LightGBM compilé, sinon None."""
+        booster = getattr(model, "booster_", None)
+        if not isinstance(engine, TreeEnsemble) or booster is None:
+            return None
+        return cls(engine, booster, num_threads)
+
+    def affected_trees(self, feature_indices):
+        if len(feature_indices) == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate([self.trees_by_feature[f] for f in feature_indices]))
+
+    def _contributions(self, rows, runs):
+        """Somme des contributions SHAP (sans la valeur attendue) des arbres des plages."""
+        total = np.zeros((len(rows), self.engine.n_features))
+        for start, stop in runs:
+            contributions = self.booster.predict(rows, pred_contrib=True, start_iteration=start,
+                                                 num_iteration=stop - start, **lightgbm_threads(self.num_threads))
+            total += contributions[:, :-1]
+        return total
+
+    def _incremental_is_cheaper(self, runs, n_trees):
+        # Deux lignes (référence et modifiée) par plage, contre un passage complet sur une ligne
+        incremental = len(runs) * self.CALL_COST_IN_TREES + 2 * n_trees
+        return incremental < self.CALL_COST_IN_TREES + self.engine.n_trees
+
+    def evaluate(self, base_row, base_shap, overrides):
+        """Probabilité et valeurs SHAP après modification de features.
+
+        `overrides` associe un indice de feature à sa nouvelle valeur ; `base_shap` sont les
+        valeurs SHAP de la ligne de référence (renvoyées telles quelles si rien ne change).
+        Renvoie (probabilité, valeurs SHAP, nombre d'arbres réévalués).
+        """
+        base_row = np.asarray(base_row, dtype=np.float64).reshape(-1)
+        row = base_row.copy()
+        for index, value in overrides.items():
+            row[index] = value
+        changed = [f for f in overrides
+                   if not (row[f] == base_row[f] or (np.isnan(row[f]) and np.isnan(base_row[f])))]
+
+        leaves = self.engine.apply(base_row)[0]
+        trees = self.affected_trees(changed)
+        if len(trees):
+            leaves[trees] = self.engine.apply(row, trees=trees)[0]
+        probability = float(self.engine.transform_raw(self.engine.raw_from_leaves(leaves[None]))[0])
+
+        if len(trees) == 0:
+            return probability, np.asarray(base_shap, dtype=np.float64), 0
+        runs = contiguous_runs(trees)
+        if self._incremental_is_cheaper(runs, len(trees)):
+            delta = self._contributions(np.vstack([base_row, row]), runs)
+            shap_values = np.asarray(base_shap, dtype=np.float64) - delta[0] + delta[1]
+        else:
+            shap_values = self.booster.predict(row[None], pred_contrib=True,
+                                               **lightgbm_threads(self.num_threads))[0, :-1]
+        return probability, shap_values, len(trees)
+
+    def sweep(self, base_row, feature_index, values):
+        """Courbe de dépendance partielle d'un client : probabilité pour chaque valeur d'une feature."""
+        base_row = np.asarray(base_row, dtype=np.float64).reshape(-1)
+        values = np.asarray(values, dtype=np.float64)
+        leaves = np.tile(self.engine.apply(base_row)[0], (len(values), 1))
+
+        trees = self.trees_by_feature[feature_index]
+        if len(trees):
+            matrix = np.tile(base_row, (len(values), 1))
+            matrix[:, feature_index] = values
+            leaves[:, trees] = self.engine.apply(matrix, trees=trees)
+        return self.engine.transform_raw(self.engine.raw_from_leaves(leaves))
@@ -0,0 +1,57 @@
+"""Comparer deux résultats de benchmarks/run.py (référence puis candidat).
+
+    python benchmarks/compare.py benchmarks/results/<ancien>.json benchmarks/results/<nouveau>.json
+
+Le code de sortie vaut 1 si la latence p95 d'un endpoint se dégrade de plus du seuil.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps", "peak_rss_mb")
+
+
+def compare(baseline, candidate):
+    """Variations relatives (en %) de chaque métrique, par mode et par endpoint."""
+    changes = {}
+    for mode, endpoints in candidate["results"].items():
+        for endpoint, metrics in endpoints.items():
+            reference = baseline["results"].get(mode, {}).get(endpoint)
+            if not isinstance(metrics, dict) or not isinstance(reference, dict):
+                continue
+            changes[(mode, endpoint)] = {
+                metric: 100.0 * (metrics[metric] - reference[metric]) / reference[metric]
+                for metric in METRICS if reference.get(metric) and metric in metrics
+            }
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Dégradation maximale tolérée de la latence p95, en %%.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r") as f:
+        candidate = json.load(f)
+    if baseline["config"].get("rows") != candidate["config"].get("rows"):
+        print("Attention : les deux résultats n'ont pas été mesurés sur le même jeu de données.")
+
+    print(f"{(baseline['commit'] or 'local')[:12]} -> {(candidate['commit'] or 'local')[:12]}")
+    regressions = []
+    for (mode, endpoint), changes in compare(baseline, candidate).items():
+        print(f"{mode:10s} {endpoint:28s} " + "  ".join(f"{metric}={change:+6.1f}%" for metric, change in changes.items()))
+        if changes.get("p95_ms", 0.0) > args.threshold:
+            regressions.append(f"{mode}/{endpoint}")
+
+    if regressions:
+        print(f"Régression de latence p95 (> {args.threshold}%) : {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
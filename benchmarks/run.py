@@ -0,0 +1,257 @@
+"""Benchmark de latence et de débit de l'API de scoring.
+
+Génère (une seule fois) une table clients synthétique et un modèle LightGBM factice,
+puis mesure chaque endpoint, dans le processus (client de test Flask) et/ou derrière
+gunicorn en local. Les résultats (p50/p95/p99, requêtes par seconde, pic de RSS) sont
+écrits en JSON pour comparer les commits entre eux (voir compare.py).
+
+    python benchmarks/run.py --rows 10000 --requests 500
+    python benchmarks/run.py --rows 1000000 --modes gunicorn --workers 4 --concurrency 8
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from synthetic import BACKEND_DIR, ROOT_DIR, feature_names, make_dataset, real_feature_names
+
+ENDPOINTS = ("predict", "predict_with_custom_values", "predict_new_client", "get_global_importance")
+
+# Configuration commune du backend pendant les mesures
+BACKEND_ENV = {
+    "MODELS_DIR": "",
+    "MODEL_RELOAD_SECONDS": "0",
+    "GLOBAL_IMPORTANCE_REFRESH_SECONDS": "0",
+}
+
+
+def summarize(latencies, wall_time, errors):
+    """Percentiles de latence (ms) et débit d'une série de requêtes."""
+    latencies = np.asarray(latencies) * 1000.0
+    if len(latencies) == 0:
+        return {"requests": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "rps": len(latencies) / wall_time if wall_time > 0 else 0.0,
+    }
+
+
+def make_requests(endpoint, ids, names, n, rng):
+    """Requêtes (méthode, chemin, corps JSON) tirées au hasard pour un endpoint."""
+    requests_ = []
+    for _ in range(n):
+        if endpoint == "predict":
+            body = {"SK_ID_CURR": int(rng.choice(ids))}
+        elif endpoint == "predict_with_custom_values":
+            body = {"SK_ID_CURR": int(rng.choice(ids))}
+            body.update({name: float(rng.normal()) for name in rng.choice(names, 3, replace=False)})
+        elif endpoint == "predict_new_client":
+            body = {name: float(rng.normal()) for name in rng.choice(names, 20, replace=False)}
+        else:
+            requests_.append(("GET", f"/{endpoint}", None))
+            continue
+        requests_.append(("POST", f"/{endpoint}", body))
+    return requests_
+
+
+def run_inprocess(args):
+    """Mesures dans le processus courant (les variables d'environnement sont déjà positionnées)."""
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+
+    client = backend.app.test_client()
+    ids = np.asarray(backend.client_store.ids)
+    names = backend.required_features
+    rng = np.random.default_rng(args.seed)
+    results = {"startup_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+    for endpoint in args.endpoints:
+        for method, path, body in make_requests(endpoint, ids, names, args.warmup, rng):
+            client.open(path, method=method, json=body)
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for method, path, body in make_requests(endpoint, ids, names, args.requests, rng):
+            t0 = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status_code != 200
+        results[endpoint] = summarize(latencies, time.perf_counter() - started, errors)
+        # Pic de RSS du processus depuis son démarrage (ru_maxrss est en Ko sous Linux)
+        results[endpoint]["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    for child in children:
+        pids.extend(_process_tree(child))
+    return pids
+
+
+def peak_rss_mb(pid):
+    """Somme des pics de RSS (VmHWM) du maître gunicorn et de ses workers, en Mo.
+
+    Les pages partagées après le fork sont comptées dans chaque processus : c'est un majorant.
+    """
+    total = 0
+    for child in _process_tree(pid):
+        try:
+            with open(f"/proc/{child}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024.0
+
+
+def run_gunicorn(args, env):
+    """Mesures à travers un serveur gunicorn local, avec `concurrency` clients simultanés."""
+    import requests
+
+    port = _free_port()
+    env = dict(env, PORT=str(port), GUNICORN_WORKERS=str(args.workers))
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            try:
+                if requests.get(f"{base_url}/schema", timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("Le serveur gunicorn n'a pas démarré.")
+            time.sleep(0.2)
+
+        ids = np.asarray(requests.get(f"{base_url}/get_client_ids").json()["client_ids"])
+        names = feature_names(args.features)
+        rng = np.random.default_rng(args.seed)
+        results = {"startup_rss_mb": peak_rss_mb(server.pid), "workers": args.workers,
+                   "concurrency": args.concurrency}
+
+        # Une session HTTP (connexion réutilisée) par thread client
+        local = threading.local()
+
+        def send(request_):
+            method, path, body = request_
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            session = local.session
+            t0 = time.perf_counter()
+            response = session.request(method, base_url + path, json=body)
+            return time.perf_counter() - t0, response.status_code != 200
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for endpoint in args.endpoints:
+                list(pool.map(send, make_requests(endpoint, ids, names, args.warmup, rng)))
+                started = time.perf_counter()
+                timings = list(pool.map(send, make_requests(endpoint, ids, names, args.requests, rng)))
+                wall_time = time.perf_counter() - started
+                latencies = [latency for latency, _ in timings]
+                results[endpoint] = summarize(latencies, wall_time, sum(error for _, error in timings))
+                results[endpoint]["peak_rss_mb"] = peak_rss_mb(server.pid)
+        return results
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="Nombre de clients synthétiques.")
+    parser.add_argument("--features", type=int, default=len(real_feature_names()),
+                        help="Nombre de features (les noms réels d'abord).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=300, help="Requêtes mesurées par endpoint.")
+    parser.add_argument("--warmup", type=int, default=20, help="Requêtes de préchauffage par endpoint.")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--modes", nargs="+", default=["inprocess", "gunicorn"], choices=["inprocess", "gunicorn"])
+    parser.add_argument("--workers", type=int, default=2, help="Workers gunicorn.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients simultanés (mode gunicorn).")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT_DIR, "benchmarks", "data"),
+                        help="Répertoire des jeux synthétiques (réutilisés d'une exécution à l'autre).")
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats.")
+    parser.add_argument("--inprocess-worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.inprocess_worker:
+        # Sous-processus dédié : import du backend et pic de RSS propres à cette mesure
+        json.dump(run_inprocess(args), sys.stdout)
+        return
+
+    directory = os.path.join(args.data_dir, f"synthetic_{args.rows}x{args.features}_s{args.seed}")
+    print(f"Jeu synthétique : {directory}", file=sys.stderr)
+    env = dict(os.environ, **BACKEND_ENV, **make_dataset(directory, args.rows, args.features, args.seed))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("inprocess_worker", "output")},
+        "results": {},
+    }
+    if "inprocess" in args.modes:
+        command = [sys.executable, os.path.abspath(__file__), "--inprocess-worker"] + (argv or sys.argv[1:])
+        output = subprocess.check_output(command, env=env, cwd=BACKEND_DIR, text=True)
+        report["results"]["inprocess"] = json.loads(output)
+    if "gunicorn" in args.modes:
+        report["results"]["gunicorn"] = run_gunicorn(args, env)
+
+    output = args.output or os.path.join(ROOT_DIR, "benchmarks", "results", f"{(report['commit'] or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for mode, endpoints in report["results"].items():
+        for endpoint in args.endpoints:
+            r = endpoints[endpoint]
+            print(f"{mode:10s} {endpoint:28s} p50={r['p50_ms']:8.2f} ms  p95={r['p95_ms']:8.2f} ms  "
+                  f"p99={r['p99_ms']:8.2f} ms  {r['rps']:8.1f} req/s  RSS={r['peak_rss_mb']:7.1f} Mo")
+    print(f"Résultats enregistrés dans {output}")
+
+
+if __name__ == "__main__":
+    main()
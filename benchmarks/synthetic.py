@@ -0,0 +1,99 @@
+import os
+import sys
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+
+# Réutiliser les formats définis côté backend
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+from client_store import IDS_FILE, META_FILE, TABLE_FILE, write_ids, write_meta  # noqa: E402
+from explanations import NativeTreeExplainer  # noqa: E402
+from global_importance import GlobalImportanceService  # noqa: E402
+from imputation import IMPUTATION_FILE, ImputationTable  # noqa: E402
+
+MODEL_FILE = "best_model.pkl"
+FEATURES_FILE = "selected_features.txt"
+STORE_DIR = "clients_store"
+
+# Nombre maximal de lignes utilisées pour entraîner le modèle factice
+TRAIN_ROWS = 50000
+
+
+def real_feature_names():
+    with open(os.path.join(BACKEND_DIR, "selected_features.txt"), "r") as f:
+        return f.read().strip().split(",")
+
+
+def feature_names(n_features):
+    """Noms des features réelles (selected_features.txt), complétés si besoin par des noms factices."""
+    real = real_feature_names()
+    return real[:n_features] + [f"feature_{i}" for i in range(len(real), n_features)]
+
+
+def _chunk(rng, n_rows, n_features, missing_rate):
+    chunk = rng.normal(size=(n_rows, n_features))
+    # Une feature sur cinq est binaire (comme les indicatrices issues du one-hot encoding)
+    chunk[:, ::5] = chunk[:, ::5] > 0.5
+    chunk[rng.random(chunk.shape) < missing_rate] = np.nan
+    return chunk
+
+
+def _labels(rng, features):
+    signal = np.nan_to_num(features[:, :10]) @ np.linspace(1.0, -1.0, min(10, features.shape[1]))
+    return (rng.random(len(features)) < 1.0 / (1.0 + np.exp(-(signal - 2.0)))).astype(int)
+
+
+def dataset_paths(directory):
+    return {
+        "MODEL_PATH": os.path.join(directory, MODEL_FILE),
+        "FEATURES_PATH": os.path.join(directory, FEATURES_FILE),
+        "CLIENTS_STORE_PATH": os.path.join(directory, STORE_DIR),
+        # Absent : seul le format binaire est utilisé
+        "CLIENTS_DATA_PATH": os.path.join(directory, "clients_data.csv"),
+    }
+
+
+def make_dataset(directory, n_rows, n_features, seed=0, missing_rate=0.02, chunk_rows=50000):
+    """Générer (si absents) une table clients synthétique, un modèle LightGBM factice entraîné
+    dessus et ses importances globales exactes ; renvoie les chemins à passer au backend.
+
+    La table est écrite par blocs au format binaire memory-mappé du backend : la mémoire
+    reste bornée jusqu'à plusieurs millions de lignes.
+    """
+    paths = dataset_paths(directory)
+    store_dir = paths["CLIENTS_STORE_PATH"]
+    if os.path.exists(os.path.join(store_dir, META_FILE)) and os.path.exists(paths["MODEL_PATH"]):
+        return paths
+
+    os.makedirs(store_dir, exist_ok=True)
+    names = feature_names(n_features)
+    with open(paths["FEATURES_PATH"], "w") as f:
+        f.write(",".join(names))
+
+    rng = np.random.default_rng(seed)
+    columns = names + ["SK_ID_CURR"]
+    table = np.lib.format.open_memmap(os.path.join(store_dir, TABLE_FILE), mode="w+",
+                                      dtype=np.float64, shape=(n_rows, len(columns)))
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        table[start:stop, :n_features] = _chunk(rng, stop - start, n_features, missing_rate)
+        table[start:stop, n_features] = np.arange(100000 + start, 100000 + stop)
+    table.flush()
+    write_ids(store_dir, IDS_FILE, np.arange(100000, 100000 + n_rows))
+    features = table[:, :n_features]
+    ImputationTable.compute(features, names).save(os.path.join(store_dir, IMPUTATION_FILE))
+
+    train = features[:TRAIN_ROWS]
+    model = lgb.LGBMClassifier(n_estimators=100, num_leaves=31, random_state=seed, verbose=-1)
+    model.fit(np.asarray(train), _labels(rng, train))
+    joblib.dump(model, paths["MODEL_PATH"])
+
+    write_meta(store_dir, columns, names, n_rows, "synthetic", f"synthetic-{n_rows}x{n_features}-s{seed}")
+
+    # Importances globales exactes précalculées : aucun calcul en arrière-plan pendant les mesures
+    service = GlobalImportanceService(directory, paths["MODEL_PATH"], os.path.join(store_dir, META_FILE), names)
+    service.start(model, NativeTreeExplainer.for_model(model), features, background=False)
+    return paths
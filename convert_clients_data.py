@@ -0,0 +1,22 @@
+import os
+import sys
+import time
+
+# Réutiliser le format défini côté backend
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+from client_store import write_table  # noqa: E402
+
+# Chemins des fichiers (surchargeables en ligne de commande : entrée puis sortie)
+input_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BACKEND_DIR, "clients_data.csv")
+output_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(BACKEND_DIR, "clients_store")
+features_file = os.path.join(BACKEND_DIR, "selected_features.txt")
+
+with open(features_file, "r") as f:
+    required_features = f.read().strip().split(",")
+
+# Conversion par blocs : la totalité des clients est conservée, sans troncature
+print(f"Conversion de {input_file} vers le format binaire...")
+start = time.time()
+n_rows = write_table(input_file, required_features, output_dir)
+print(f"{n_rows} clients enregistrés dans {output_dir} en {time.time() - start:.1f} s")
@@ -1,13 +1,97 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import requests
 import pandas as pd
-
-# Effacer le cache au démarrage
-st.cache_data.clear()
-st.cache_resource.clear()
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
 
 # URL de l'API
-API_URL = "https://projet7-1.onrender.com"
+API_URL = os.environ.get("API_URL", "https://projet7-1.onrender.com")
+
+# Durées de vie (secondes) des réponses mises en cache : les recherches d'IDs et les
+# importances globales changent rarement, une prédiction dépend de la version du modèle
+CLIENT_IDS_TTL = int(os.environ.get("CLIENT_IDS_TTL", "600"))
+PREDICTION_TTL = int(os.environ.get("PREDICTION_TTL", "300"))
+GLOBAL_IMPORTANCE_TTL = int(os.environ.get("GLOBAL_IMPORTANCE_TTL", "1800"))
+
+# Délai maximal d'une requête (connexion, lecture) ; l'API peut être en cours de réveil
+REQUEST_TIMEOUT = (5, 60)
+
+TOP_K = 15
+CLIENT_IDS_PAGE_SIZE = 50  # IDs proposés dans la liste déroulante pour une recherche
+OPTIMAL_THRESHOLD = 0.09  # Seuil pour la décision
+
+
+@st.cache_resource
+def get_session():
+    """Session HTTP partagée par toutes les exécutions du script : les connexions (TLS) sont réutilisées."""
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                    allowed_methods=("GET", "POST"))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def api_get(path):
+    response = get_session().get(f"{API_URL}{path}", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def api_post(path, payload):
+    response = get_session().post(f"{API_URL}{path}", json=payload, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=CLIENT_IDS_TTL, show_spinner=False, max_entries=500)
+def search_client_ids(prefix=""):
+    """Première page des IDs commençant par `prefix` et nombre total de correspondances."""
+    params = {"limit": CLIENT_IDS_PAGE_SIZE}
+    if prefix:
+        params["prefix"] = prefix
+    response = get_session().get(f"{API_URL}/get_client_ids", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return data.get("client_ids", []), data.get("total", 0)
+
+
+@st.cache_data(ttl=PREDICTION_TTL, show_spinner=False, max_entries=1000)
+def load_prediction(client_id):
+    """Prédiction, top des valeurs SHAP et informations descriptives d'un client (un seul appel)."""
+    return api_post("/predict", {"SK_ID_CURR": client_id, "top_k": TOP_K, "include_client_info": True})
+
+
+@st.cache_data(ttl=GLOBAL_IMPORTANCE_TTL, show_spinner=False)
+def load_global_importance():
+    return api_get("/get_global_importance").get("global_importances", [])
+
+
+def fetch_concurrently(**calls):
+    """Exécuter des appels indépendants en parallèle : une interaction coûte un seul aller-retour.
+
+    Chaque appel renvoie (résultat, None) ou (None, exception), pour que l'échec d'un
+    panneau n'empêche pas l'affichage des autres.
+    """
+    ctx = get_script_run_ctx()
+
+    def run(call):
+        # Les fonctions en cache de Streamlit ont besoin du contexte de la session courante
+        add_script_run_ctx(ctx=ctx)
+        try:
+            return call(), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = {name: pool.submit(run, call) for name, call in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
 
 # Configuration de la page
 st.set_page_config(
@@ -27,59 +111,77 @@ st.write(
 # Menu : Prédictions pour un client existant
 st.title("Prédictions pour un Client Existant")
 
-# Charger les IDs clients
+# Recherche d'un client par début d'ID : seule une page d'IDs est chargée (réponses en cache)
+search = st.text_input("Rechercher un ID client (début de SK_ID_CURR)", max_chars=12).strip()
+if search and not search.isdigit():
+    st.warning("L'ID client ne contient que des chiffres.")
+    search = ""
 try:
-    response = requests.get(f"{API_URL}/get_client_ids")
-    if response.status_code == 200:
-        client_ids = response.json().get("client_ids", [])
-    else:
-        st.error(f"Erreur lors de la récupération des IDs clients : {response.status_code}")
-        client_ids = []
+    client_ids, total = search_client_ids(search)
 except Exception as e:
     st.error(f"Erreur lors de la récupération des IDs clients : {e}")
-    client_ids = []
+    client_ids, total = [], 0
 
-# Afficher une liste déroulante pour sélectionner un client
+# Afficher une liste déroulante pour sélectionner un client parmi les correspondances
 if client_ids:
+    if total > len(client_ids):
+        st.caption(f"{total} clients correspondent, les {len(client_ids)} premiers sont proposés : "
+                   "précisez la recherche pour affiner.")
     selected_id = st.selectbox("Choisissez un ID client (SK_ID_CURR)", client_ids)
     if st.button("Prédire"):
-        try:
-            # Appel à l'API pour récupérer les prédictions
-            response = requests.post(f"{API_URL}/predict", json={"SK_ID_CURR": selected_id})
-            if response.status_code == 200:
-                data = response.json()
-                prediction = data.get("probability_of_default", None)
-                shap_values = data.get("shap_values", [])
-                feature_names = data.get("feature_names", [])
-
-                # Affichage de la probabilité de défaut
-                if prediction is not None:
-                    optimal_threshold = 0.09  # Seuil pour la décision
-                    if prediction > optimal_threshold:
-                        st.error(f"Résultat : Crédit REFUSÉ (Probabilité de défaut : {prediction:.2f})")
-                    else:
-                        st.success(f"Résultat : Crédit ACCEPTÉ (Probabilité de défaut : {prediction:.2f})")
-
-                # Affichage des 15 principales valeurs SHAP
-                if shap_values and feature_names:
-                    st.subheader("Top 15 des facteurs influençant la décision")
-                    # Convertir les données en DataFrame et trier par valeur SHAP absolue
-                    shap_df = pd.DataFrame({
-                        "feature": feature_names,
-                        "shap_value": shap_values
-                    })
-                    
-                    # Trier les 15 principales caractéristiques par valeur absolue de SHAP
-                    shap_df = shap_df.reindex(shap_df["shap_value"].abs().sort_values(ascending=False).index).head(15)
-
-                    # Afficher le barplot horizontal
-                    st.bar_chart(shap_df.set_index("feature"))
+        # Prédiction (avec informations client) et importances globales récupérées en parallèle
+        with st.spinner("Appel de l'API..."):
+            panels = fetch_concurrently(
+                prediction=lambda: load_prediction(int(selected_id)),
+                global_importance=load_global_importance,
+            )
+
+        data, error = panels["prediction"]
+        if error is not None:
+            st.error(f"Erreur lors de l'appel API : {error}")
+        else:
+            prediction = data.get("probability_of_default", None)
+            shap_values = data.get("shap_values", [])
+            feature_names = data.get("feature_names", [])
+
+            # Affichage de la probabilité de défaut
+            if prediction is not None:
+                if prediction > OPTIMAL_THRESHOLD:
+                    st.error(f"Résultat : Crédit REFUSÉ (Probabilité de défaut : {prediction:.2f})")
                 else:
-                    st.warning("Valeurs SHAP indisponibles.")
+                    st.success(f"Résultat : Crédit ACCEPTÉ (Probabilité de défaut : {prediction:.2f})")
+
+            # Affichage des 15 principales valeurs SHAP
+            if shap_values and feature_names:
+                st.subheader(f"Top {TOP_K} des facteurs influençant la décision")
+                # Convertir les données en DataFrame et trier par valeur SHAP absolue
+                shap_df = pd.DataFrame({
+                    "feature": feature_names,
+                    "shap_value": shap_values
+                })
+
+                # Trier les principales caractéristiques par valeur absolue de SHAP
+                shap_df = shap_df.reindex(shap_df["shap_value"].abs().sort_values(ascending=False).index).head(TOP_K)
+
+                # Afficher le barplot horizontal
+                st.bar_chart(shap_df.set_index("feature"))
             else:
-                st.error(f"Erreur API : {response.status_code}")
-                st.write(response.json())
-        except Exception as e:
-            st.error(f"Erreur lors de l'appel API : {e}")
+                st.warning("Valeurs SHAP indisponibles.")
+
+            # Informations descriptives du client
+            client_info = data.get("client_info")
+            if client_info:
+                with st.expander("Informations du client"):
+                    st.dataframe(pd.DataFrame(client_info.items(), columns=["feature", "valeur"]))
+
+        # Importances globales (communes à tous les clients)
+        importances, error = panels["global_importance"]
+        if error is not None:
+            st.warning(f"Importances globales indisponibles : {error}")
+        elif importances:
+            st.subheader(f"Top {TOP_K} des facteurs au niveau global")
+            # Liste déjà triée par importance décroissante
+            importance_df = pd.DataFrame(importances).head(TOP_K)
+            st.bar_chart(importance_df.set_index("Feature"))
 else:
     st.warning("Aucun ID client disponible.")
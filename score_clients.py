@@ -0,0 +1,224 @@
+"""Scoring hors ligne d'un fichier de clients (CSV ou Parquet), en parallèle et par blocs.
+
+    python score_clients.py portefeuille.csv scores.csv --decision
+    python score_clients.py portefeuille.parquet scores.parquet --top-k 5 --workers 8   # nécessite pyarrow
+
+Le fichier est lu par blocs de lignes ; chaque bloc est scoré par un processus du pool
+(qui charge le modèle une seule fois) et les résultats sont écrits au fil de l'eau, dans
+l'ordre du fichier d'entrée. Au plus deux blocs par worker sont en vol : la mémoire reste
+bornée quelle que soit la taille du portefeuille. La liste des features, le modèle par
+défaut, le backend d'explication et le seuil de décision sont ceux du backend (app.py).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Réutiliser la configuration du backend ; l'import de l'application ne charge ni les
+# données clients ni les modèles (WARM_START=lazy)
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("WARM_START", "lazy")
+import app as backend  # noqa: E402
+from explanations import EXPLAINER_BACKENDS, top_k_indices  # noqa: E402
+from model_registry import ModelBundle  # noqa: E402
+
+# Lignes par bloc et threads de prédiction par processus du pool (le parallélisme vient des processus)
+CHUNK_ROWS = int(os.environ.get("SCORE_CHUNK_ROWS", "50000"))
+NUM_THREADS = int(os.environ.get("SCORE_NUM_THREADS", "1"))
+
+# Modèle et features chargés une fois par processus (voir _init_worker)
+_worker = {}
+
+
+def is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def input_columns(path):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_chunks(path, columns, chunk_rows=CHUNK_ROWS):
+    """Blocs (DataFrame) des colonnes utiles du fichier d'entrée."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def empty_result(feature_names, top_k=0, decision=False):
+    """Résultat sans ligne, avec les colonnes et les types de `score_chunk`."""
+    columns = {"SK_ID_CURR": "int64", "probability_of_default": "float64"}
+    if decision:
+        columns["decision"] = "string"
+    for rank in range(min(top_k, len(feature_names))):
+        columns[f"top_{rank + 1}_feature"] = "string"
+        columns[f"top_{rank + 1}_shap"] = "float64"
+    return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in columns.items()})
+
+
+class ResultWriter:
+    """Écriture des résultats bloc par bloc dans un fichier temporaire, renommé à la fermeture.
+
+    Le fichier final est toujours créé (`empty`, l'en-tête seul, pour une entrée vide) ;
+    en cas d'échec, `abort` supprime le fichier temporaire.
+    """
+
+    def __init__(self, path, empty=None):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.rows = 0
+        self.empty = empty
+        self._opened = False
+        self._parquet_writer = None
+
+    def write(self, frame):
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.tmp_path, mode="a" if self._opened else "w", header=not self._opened, index=False)
+        self._opened = True
+        self.rows += len(frame)
+
+    def close(self):
+        if not self._opened:
+            self.write(self.empty if self.empty is not None else pd.DataFrame())
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._parquet_writer is not None:
+            try:
+                self._parquet_writer.close()
+            except Exception:
+                pass
+            self._parquet_writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _init_worker(model_path, feature_names, explainer, num_threads):
+    """Charger le modèle dans le processus, sans moteur compilé (les blocs sont de grande taille)."""
+    bundle = ModelBundle.load("bulk", model_path, feature_names, np.zeros((1, len(feature_names))),
+                              use_engine=False, explainer_backend=explainer, explain_threads=num_threads,
+                              explain_batch_threads=num_threads)
+    if num_threads > 0 and "n_jobs" in bundle.model.get_params():
+        bundle.model.set_params(n_jobs=num_threads)
+    _worker.update(bundle=bundle, feature_names=np.asarray(feature_names))
+
+
+def score_chunk(ids, matrix, top_k=0, decision=False):
+    """Probabilité de défaut de chaque ligne, avec la décision et les top-k contributions si demandées."""
+    bundle = _worker["bundle"]
+    probabilities = bundle.predict_positive(matrix, ids)
+    result = {"SK_ID_CURR": ids, "probability_of_default": probabilities}
+    if decision:
+        result["decision"] = [backend.credit_decision(p) for p in probabilities]
+    if top_k:
+        shap_values = bundle.shap_values(matrix, ids)
+        indices = top_k_indices(shap_values, top_k)
+        names = _worker["feature_names"][indices]
+        values = np.take_along_axis(shap_values, indices, axis=1)
+        for rank in range(indices.shape[1]):
+            result[f"top_{rank + 1}_feature"] = names[:, rank]
+            result[f"top_{rank + 1}_shap"] = values[:, rank]
+    return pd.DataFrame(result)
+
+
+def _ordered_results(pool, tasks, max_pending):
+    """Résultats du pool dans l'ordre des tâches, avec au plus `max_pending` tâches en vol."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(score_chunk, *task))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def score_file(input_path, output_path, model_path=None, top_k=0, decision=False, explainer=None,
+               workers=None, chunk_rows=CHUNK_ROWS, num_threads=NUM_THREADS):
+    """Scorer `input_path` vers `output_path` (CSV ou Parquet selon l'extension) ; renvoie le nombre de lignes."""
+    feature_names = backend.read_required_features()
+    columns = input_columns(input_path)
+    missing = [col for col in ["SK_ID_CURR"] + feature_names if col not in columns]
+    if missing:
+        raise KeyError(f"Colonnes absentes du fichier d'entrée : {missing}")
+
+    tasks = ((chunk["SK_ID_CURR"].to_numpy(dtype=np.int64), chunk[feature_names].to_numpy(dtype=np.float64),
+              top_k, decision)
+             for chunk in read_chunks(input_path, ["SK_ID_CURR"] + feature_names, chunk_rows) if len(chunk))
+    init_args = (model_path or backend.MODEL_PATH, feature_names, explainer or backend.EXPLAINER, num_threads)
+    workers = workers or os.cpu_count()
+
+    writer = ResultWriter(output_path, empty_result(feature_names, top_k, decision))
+    start = time.time()
+    pool = None
+    try:
+        if workers <= 1:
+            _init_worker(*init_args)
+            results = (score_chunk(*task) for task in tasks)
+        else:
+            # spawn : un fork d'un processus dont des threads tournent (OpenMP, chargement
+            # en arrière-plan du backend) peut bloquer les workers sur un verrou hérité
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=init_args)
+            results = _ordered_results(pool, tasks, 2 * workers)
+        for frame in results:
+            writer.write(frame)
+            print(f"{writer.rows} lignes scorées ({writer.rows / max(time.time() - start, 1e-9):.0f} lignes/s)")
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return writer.rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_path", help="Fichier CSV ou Parquet (SK_ID_CURR et features de selected_features.txt).")
+    parser.add_argument("output_path", help="Fichier de résultats (.csv, ou .parquet).")
+    parser.add_argument("--model", default=None, help="Artefact du modèle (défaut : MODEL_PATH du backend).")
+    parser.add_argument("--top-k", type=int, default=0, help="Nombre de contributions SHAP par client (0 : aucune).")
+    parser.add_argument("--decision", action="store_true", help="Ajouter la décision (seuil du backend).")
+    parser.add_argument("--explainer", choices=EXPLAINER_BACKENDS, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Processus du pool (défaut : nombre de coeurs).")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--threads", type=int, default=NUM_THREADS, help="Threads de prédiction par processus.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.input_path):
+        raise FileNotFoundError(f"Fichier de clients introuvable : {args.input_path}")
+    start = time.time()
+    n_rows = score_file(args.input_path, args.output_path, args.model, args.top_k, args.decision, args.explainer,
+                        args.workers, args.chunk_rows, args.threads)
+    print(f"{n_rows} clients scorés dans {args.output_path} en {time.time() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
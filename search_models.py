@@ -0,0 +1,475 @@
+"""Recherche d'hyperparamètres en validation croisée, en parallèle, suivie au format MLflow.
+
+    python search_models.py data/clients_data.csv --model lightgbm --search grid --workers 4
+    python search_models.py data/clients_data.csv --model random_forest --search random --trials 40 --balanced
+    python search_models.py data/clients_data.csv --model lightgbm --search bayes --trials 60   # nécessite optuna
+
+La matrice d'entraînement est celle de train_model.py (float32 memory-mappée, mise en
+cache) : chaque worker du pool la rouvre en lecture seule, les pages sont partagées par
+le cache du système au lieu d'être recopiées dans chaque processus. Pour LightGBM, chaque
+worker la discrétise une seule fois (lgb.Dataset) et les plis en sont des sous-ensembles,
+sans copie des lignes ; l'early stopping se fait sur une partie réservée du pli
+d'entraînement, jamais sur le pli qui sert à classer les essais. Un essai est
+abandonné dès qu'un pli le place nettement sous le meilleur AUC obtenu. Chaque essai
+est enregistré comme un run de l'expérience « Credit Scoring Model » (mlruns/ et
+mlartifacts/), comme ceux du notebook de modélisation.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import lightgbm as lgb
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from train_model import (BASE_DIR, CACHE_DIR, DATA_PATH, FEATURES_FILE, META_FILE, TARGET_FILE,
+                         load_training_matrix)
+
+# Arborescence MLflow existante (runs du notebook)
+MLFLOW_DIR = os.environ.get("MLFLOW_DIR", os.path.join(BASE_DIR, "nelly_fifi_dossier_codee_112024"))
+EXPERIMENT_NAME = os.environ.get("MLFLOW_EXPERIMENT_NAME", "Credit Scoring Model")
+
+# Coût métier : un faux négatif (crédit accordé à tort) coûte dix fois un faux positif
+FN_COST = 10
+FP_COST = 1
+
+# Un essai est arrêté si la moyenne de ses plis passe sous (meilleur AUC - PRUNE_MARGIN)
+PRUNE_MARGIN = float(os.environ.get("SEARCH_PRUNE_MARGIN", "0.02"))
+
+# Tours sans progression de l'AUC de validation avant l'arrêt du boosting LightGBM, et part du
+# pli d'entraînement réservée à cette validation interne
+EARLY_STOPPING_ROUNDS = 20
+EARLY_STOPPING_FRACTION = 0.1
+
+# Lignes du pli de validation lues et prédites à la fois depuis la matrice memory-mappée
+PREDICT_CHUNK_ROWS = 50000
+
+MODEL_LABELS = {
+    "lightgbm": "LightGBM",
+    "random_forest": "RandomForest",
+    "logistic_regression": "LogisticRegression",
+}
+
+# Espaces de recherche du notebook : (type, bornes) pour les tirages, liste de valeurs pour la grille
+SEARCH_SPACES = {
+    "lightgbm": {
+        "n_estimators": ("int", 50, 200, 10),
+        "num_leaves": ("int", 20, 50, 1),
+        "learning_rate": ("float", 0.01, 0.2),
+        "max_depth": ("int", -1, 10, 1),
+        "subsample": ("float", 0.6, 1.0),
+        "colsample_bytree": ("float", 0.6, 1.0),
+    },
+    "random_forest": {
+        "n_estimators": ("int", 50, 200, 10),
+        "max_depth": ("int", 5, 30, 1),
+        "min_samples_split": ("float", 0.1, 1.0),
+        "min_samples_leaf": ("float", 0.1, 0.5),
+    },
+    "logistic_regression": {
+        "C": ("log", np.exp(-4), np.exp(2)),
+        "solver": ("choice", ["lbfgs", "liblinear", "saga"]),
+    },
+}
+
+PARAM_GRIDS = {
+    "lightgbm": {
+        "n_estimators": [200],
+        "num_leaves": [20, 32, 50],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_depth": [3, 6, -1],
+        "colsample_bytree": [0.6, 1.0],
+    },
+    "random_forest": {
+        "n_estimators": [100, 200],
+        "max_depth": [6, 12, 30],
+        "min_samples_leaf": [0.01, 0.1],
+    },
+    "logistic_regression": {
+        "C": [0.02, 0.1, 0.5, 2.0, 7.0],
+        "solver": ["lbfgs", "liblinear"],
+    },
+}
+
+# État des workers du pool, initialisé une fois par processus
+_matrix = None
+_target = None
+_features = None
+_best_auc = None
+_num_threads = 1
+_dataset = None
+
+
+def business_cost(y_true, y_pred, fn_cost=FN_COST, fp_cost=FP_COST):
+    fn = int(np.sum((y_true == 1) & (y_pred == 0)))
+    fp = int(np.sum((y_true == 0) & (y_pred == 1)))
+    return fn * fn_cost + fp * fp_cost
+
+
+def evaluate(y_true, y_proba):
+    """Métriques du notebook, au seuil qui minimise le coût métier (pas de 0,01)."""
+    thresholds = np.arange(0.01, 1.0, 0.01)
+    costs = [business_cost(y_true, (y_proba >= threshold).astype(int)) for threshold in thresholds]
+    threshold = float(thresholds[int(np.argmin(costs))])
+    y_pred = (y_proba >= threshold).astype(int)
+    return {
+        "AUC": roc_auc_score(y_true, y_proba),
+        "Accuracy": accuracy_score(y_true, y_pred),
+        "Precision": precision_score(y_true, y_pred, zero_division=0),
+        "Recall": recall_score(y_true, y_pred, zero_division=0),
+        "F1-Score": f1_score(y_true, y_pred, zero_division=0),
+        "Business Cost": min(costs),
+        "Optimal Threshold": threshold,
+    }
+
+
+def make_estimator(model_type, params, balanced, num_threads):
+    """Estimateur scikit-learn d'un essai ; `balanced` pondère les classes inversement à leur fréquence."""
+    class_weight = "balanced" if balanced else None
+    if model_type == "lightgbm":
+        # subsample n'a d'effet qu'avec un bagging actif (subsample_freq > 0)
+        return lgb.LGBMClassifier(**params, subsample_freq=1, class_weight=class_weight, random_state=42,
+                                  n_jobs=num_threads, verbose=-1)
+    if model_type == "random_forest":
+        return RandomForestClassifier(**params, class_weight=class_weight, random_state=42, n_jobs=num_threads)
+    return LogisticRegression(**params, class_weight=class_weight, max_iter=1000)
+
+
+def grid_trials(model_type):
+    grid = PARAM_GRIDS[model_type]
+    for values in itertools.product(*grid.values()):
+        yield dict(zip(grid.keys(), values))
+
+
+def sample_params(space, rng):
+    """Tirage aléatoire d'un jeu de paramètres dans un espace de SEARCH_SPACES."""
+    params = {}
+    for name, spec in space.items():
+        if spec[0] == "int":
+            params[name] = int(rng.choice(np.arange(spec[1], spec[2] + 1, spec[3])))
+        elif spec[0] == "float":
+            params[name] = float(rng.uniform(spec[1], spec[2]))
+        elif spec[0] == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+        else:
+            params[name] = spec[1][int(rng.integers(len(spec[1])))]
+    return params
+
+
+def suggest_params(space, trial):
+    """Paramètres proposés par un essai optuna (recherche bayésienne TPE)."""
+    params = {}
+    for name, spec in space.items():
+        if spec[0] == "int":
+            params[name] = trial.suggest_int(name, spec[1], spec[2], step=spec[3])
+        elif spec[0] == "float":
+            params[name] = trial.suggest_float(name, spec[1], spec[2])
+        elif spec[0] == "log":
+            params[name] = trial.suggest_float(name, spec[1], spec[2], log=True)
+        else:
+            params[name] = trial.suggest_categorical(name, spec[1])
+    return params
+
+
+def _init_worker(cache_dir, best_auc, num_threads):
+    global _matrix, _target, _features, _best_auc, _num_threads, _dataset
+    _dataset = None
+    _matrix = np.load(os.path.join(cache_dir, FEATURES_FILE), mmap_mode="r")
+    _target = np.load(os.path.join(cache_dir, TARGET_FILE))
+    with open(os.path.join(cache_dir, META_FILE), "r") as f:
+        _features = json.load(f)["features"]
+    _best_auc = best_auc
+    _num_threads = num_threads
+
+
+def _fit(estimator, model_type, X, y):
+    if model_type != "lightgbm":
+        return estimator.fit(X, y)
+    return estimator.fit(X, y, feature_name=_features)
+
+
+def _training_dataset():
+    """Matrice discrétisée par LightGBM, construite une fois par worker ; les plis en sont des sous-ensembles."""
+    global _dataset
+    if _dataset is None:
+        _dataset = lgb.Dataset(_matrix, label=_target, feature_name=_features, params={"verbose": -1})
+        _dataset.construct()
+    return _dataset
+
+
+def _subset(positions, balanced):
+    subset = _training_dataset().subset(np.sort(positions))
+    if balanced:
+        # Équivalent de class_weight="balanced" : n / (2 * effectif de la classe)
+        labels = _target[np.sort(positions)]
+        subset.set_weight((len(labels) / (2.0 * np.bincount(labels, minlength=2)))[labels])
+    return subset
+
+
+def _train_lightgbm_fold(params, balanced, train_idx):
+    """Booster entraîné sur le pli, arrêté sur une validation interne tirée du pli lui-même."""
+    fit_idx, stop_idx = train_test_split(train_idx, test_size=EARLY_STOPPING_FRACTION,
+                                         stratify=_target[train_idx], random_state=42)
+    booster_params = {key: value for key, value in params.items() if key != "n_estimators"}
+    booster_params.update(objective="binary", metric="auc", subsample_freq=1, seed=42,
+                          num_threads=_num_threads, verbose=-1)
+    return lgb.train(booster_params, _subset(fit_idx, balanced), num_boost_round=params.get("n_estimators", 100),
+                     valid_sets=[_subset(stop_idx, balanced)],
+                     callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+
+
+def _predict_rows(predict, positions):
+    """Prédictions sur des lignes de la matrice, lues par blocs (la copie reste bornée)."""
+    return np.concatenate([predict(_matrix[positions[start:start + PREDICT_CHUNK_ROWS]])
+                           for start in range(0, len(positions), PREDICT_CHUNK_ROWS)])
+
+
+def run_trial(model_type, params, balanced, n_folds, refit=True):
+    """Validation croisée d'un jeu de paramètres dans un worker du pool.
+
+    Pour LightGBM, les plis sont des sous-ensembles du lgb.Dataset du worker et le pli de
+    validation est lu par blocs ; les autres modèles (scikit-learn) reçoivent une copie du
+    pli d'entraînement. L'essai s'arrête dès que la moyenne de ses plis passe sous le
+    meilleur AUC partagé moins PRUNE_MARGIN ; sinon le modèle est réentraîné sur toutes les
+    données (avec, pour LightGBM, le nombre d'arbres retenu par l'early stopping).
+    """
+    start_time = time.time()
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42)
+    oof = np.empty(len(_target), dtype=np.float64)
+    fold_auc, best_iterations = [], []
+    for train_idx, val_idx in folds.split(np.zeros(len(_target)), _target):
+        if model_type == "lightgbm":
+            booster = _train_lightgbm_fold(params, balanced, train_idx)
+            best_iterations.append(booster.best_iteration or params.get("n_estimators", 100))
+            oof[val_idx] = _predict_rows(lambda X: booster.predict(X, num_iteration=best_iterations[-1]), val_idx)
+        else:
+            estimator = _fit(make_estimator(model_type, params, balanced, _num_threads), model_type,
+                             _matrix[train_idx], _target[train_idx])
+            oof[val_idx] = _predict_rows(lambda X: estimator.predict_proba(X)[:, 1], val_idx)
+        fold_auc.append(roc_auc_score(_target[val_idx], oof[val_idx]))
+        if np.mean(fold_auc) < _best_auc.value - PRUNE_MARGIN:
+            return {"params": params, "status": "KILLED", "fold_auc": fold_auc,
+                    "metrics": {"AUC": float(np.mean(fold_auc))}, "model": None,
+                    "start_time": start_time, "end_time": time.time()}
+
+    metrics = evaluate(_target, oof)
+    with _best_auc.get_lock():
+        _best_auc.value = max(_best_auc.value, metrics["AUC"])
+
+    model = None
+    if refit:
+        final_params = dict(params)
+        if best_iterations:
+            final_params["n_estimators"] = int(np.mean(best_iterations))
+        model = _fit(make_estimator(model_type, final_params, balanced, _num_threads), model_type, _matrix, _target)
+    return {"params": params, "status": "FINISHED", "fold_auc": fold_auc, "metrics": metrics, "model": model,
+            "start_time": start_time, "end_time": time.time()}
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def experiment_id(mlflow_dir, name):
+    """Identifiant de l'expérience `name` dans mlruns/, créée au besoin."""
+    mlruns = os.path.join(mlflow_dir, "mlruns")
+    os.makedirs(mlruns, exist_ok=True)
+    for entry in sorted(os.listdir(mlruns)):
+        meta_path = os.path.join(mlruns, entry, "meta.yaml")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, "r") as f:
+            if f"name: {name}" in f.read().splitlines():
+                return entry
+    exp_id = str(uuid.uuid4().int % 10**18)
+    os.makedirs(os.path.join(mlruns, exp_id))
+    now = int(time.time() * 1000)
+    with open(os.path.join(mlruns, exp_id, "meta.yaml"), "w") as f:
+        f.write(f"artifact_location: mlflow-artifacts:/{exp_id}\ncreation_time: {now}\nexperiment_id: {_quote(exp_id)}\n"
+                f"last_update_time: {now}\nlifecycle_stage: active\nname: {name}\n")
+    return exp_id
+
+
+def _write_model_artifact(directory, run_id, artifact_name, model):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "model.pkl"), "wb") as f:
+        pickle.dump(model, f)
+    python_version = platform.python_version()
+    requirements = [f"numpy=={np.__version__}", f"scikit-learn=={sklearn.__version__}",
+                    f"lightgbm=={lgb.__version__}"]
+    with open(os.path.join(directory, "requirements.txt"), "w") as f:
+        f.write("\n".join(requirements))
+    with open(os.path.join(directory, "python_env.yaml"), "w") as f:
+        f.write(f"python: {python_version}\nbuild_dependencies:\n- pip\ndependencies:\n- -r requirements.txt\n")
+    with open(os.path.join(directory, "conda.yaml"), "w") as f:
+        f.write(f"channels:\n- conda-forge\ndependencies:\n- python={python_version}\n- pip\n- pip:\n"
+                + "".join(f"  - {line}\n" for line in requirements) + "name: mlflow-env\n")
+    created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    with open(os.path.join(directory, "MLmodel"), "w") as f:
+        f.write(f"artifact_path: {artifact_name}\nflavors:\n  python_function:\n    env:\n      conda: conda.yaml\n"
+                f"      virtualenv: python_env.yaml\n    loader_module: mlflow.sklearn\n    model_path: model.pkl\n"
+                f"    predict_fn: predict\n    python_version: {python_version}\n  sklearn:\n    code: null\n"
+                f"    pickled_model: model.pkl\n    serialization_format: pickle\n"
+                f"    sklearn_version: {sklearn.__version__}\n"
+                f"model_size_bytes: {os.path.getsize(os.path.join(directory, 'model.pkl'))}\n"
+                f"model_uuid: {uuid.uuid4().hex}\nrun_id: {run_id}\nutc_time_created: {_quote(created)}\n")
+
+
+def write_run(mlflow_dir, exp_id, run_name, artifact_name, result, tags=None):
+    """Écrire un essai comme un run MLflow (meta.yaml, params/, metrics/, tags/ et artefact du modèle)."""
+    run_id = uuid.uuid4().hex
+    run_dir = os.path.join(mlflow_dir, "mlruns", exp_id, run_id)
+    for sub in ("params", "metrics", "tags"):
+        os.makedirs(os.path.join(run_dir, sub), exist_ok=True)
+
+    start_ms, end_ms = int(result["start_time"] * 1000), int(result["end_time"] * 1000)
+    status = {"FINISHED": 3, "FAILED": 4, "KILLED": 5}[result["status"]]
+    with open(os.path.join(run_dir, "meta.yaml"), "w") as f:
+        f.write(f"artifact_uri: mlflow-artifacts:/{exp_id}/{run_id}/artifacts\nend_time: {end_ms}\n"
+                f"entry_point_name: ''\nexperiment_id: {_quote(exp_id)}\nlifecycle_stage: active\n"
+                f"run_id: {run_id}\nrun_name: {run_name}\nrun_uuid: {run_id}\nsource_name: ''\nsource_type: 4\n"
+                f"source_version: ''\nstart_time: {start_ms}\nstatus: {status}\ntags: []\n"
+                f"user_id: {os.environ.get('USER', 'user')}\n")
+
+    for name, value in result["params"].items():
+        with open(os.path.join(run_dir, "params", name), "w") as f:
+            f.write(str(value))
+    for name, value in result["metrics"].items():
+        with open(os.path.join(run_dir, "metrics", name), "w") as f:
+            f.write(f"{end_ms} {float(value)} 0\n")
+    with open(os.path.join(run_dir, "metrics", "Fold AUC"), "w") as f:
+        f.writelines(f"{end_ms} {float(auc)} {step}\n" for step, auc in enumerate(result["fold_auc"]))
+
+    tags = dict({"mlflow.runName": run_name, "mlflow.source.name": os.path.abspath(__file__),
+                 "mlflow.source.type": "LOCAL", "mlflow.user": os.environ.get("USER", "user")}, **(tags or {}))
+    for name, value in tags.items():
+        with open(os.path.join(run_dir, "tags", name), "w") as f:
+            f.write(str(value))
+
+    if result["model"] is not None:
+        artifact_dir = os.path.join(mlflow_dir, "mlartifacts", exp_id, run_id, "artifacts", artifact_name)
+        _write_model_artifact(artifact_dir, run_id, artifact_name, result["model"])
+    return run_id
+
+
+def search(matrix_dir, model_type, strategy="grid", n_trials=20, n_folds=5, balanced=False, workers=None,
+           mlflow_dir=MLFLOW_DIR, experiment=EXPERIMENT_NAME, seed=42):
+    """Évaluer les essais dans un pool de processus et enregistrer chacun comme un run MLflow.
+
+    `strategy` vaut "grid" (PARAM_GRIDS), "random" ou "bayes" (TPE d'optuna, qui propose
+    chaque nouvel essai à partir des résultats déjà reçus). Renvoie la liste des
+    (run_id, résultat sans le modèle), triée par AUC décroissant.
+    """
+    workers = workers or min(4, os.cpu_count())
+    num_threads = max(1, os.cpu_count() // workers)
+    space = SEARCH_SPACES[model_type]
+    label = MODEL_LABELS[model_type]
+    exp_id = experiment_id(mlflow_dir, experiment)
+    tags = {"search.strategy": strategy, "search.balanced": str(balanced), "search.folds": str(n_folds)}
+
+    study = None
+    if strategy == "grid":
+        pending_params = iter(grid_trials(model_type))
+    elif strategy == "random":
+        rng = np.random.default_rng(seed)
+        pending_params = (sample_params(space, rng) for _ in range(n_trials))
+    elif strategy == "bayes":
+        try:
+            import optuna
+        except ImportError:
+            raise SystemExit("La recherche bayésienne nécessite optuna (pip install optuna).")
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=seed))
+
+        def ask():
+            for _ in range(n_trials):
+                trial = study.ask()
+                yield trial, suggest_params(space, trial)
+        pending_params = ask()
+    else:
+        raise ValueError(f"Stratégie de recherche inconnue : {strategy}")
+
+    best_auc = multiprocessing.Value("d", 0.0)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(matrix_dir, best_auc, num_threads)) as pool:
+        running = {}
+
+        def submit_next():
+            item = next(pending_params, None)
+            if item is None:
+                return False
+            trial, params = item if study is not None else (None, item)
+            running[pool.submit(run_trial, model_type, params, balanced, n_folds)] = trial
+            return True
+
+        # Autant d'essais en vol que de workers : la recherche bayésienne profite des résultats reçus
+        for _ in range(workers):
+            if not submit_next():
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = running.pop(future)
+                result = future.result()
+                if study is not None:
+                    if result["status"] == "FINISHED":
+                        study.tell(trial, result["metrics"]["AUC"])
+                    else:
+                        study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                run_id = write_run(mlflow_dir, exp_id, f"{label} optimization", f"{label}_Model", result, tags)
+                result.pop("model")
+                results.append((run_id, result))
+                print(f"[{len(results)}] {result['status']:8s} AUC={result['metrics']['AUC']:.4f} "
+                      f"{result['params']} -> run {run_id}")
+                submit_next()
+    return sorted(results, key=lambda item: item[1]["metrics"]["AUC"], reverse=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv_path", nargs="?", default=DATA_PATH, help="CSV prétraité (SK_ID_CURR, TARGET, features).")
+    parser.add_argument("--model", choices=sorted(MODEL_LABELS), default="lightgbm")
+    parser.add_argument("--search", choices=["grid", "random", "bayes"], default="grid")
+    parser.add_argument("--trials", type=int, default=20, help="Nombre d'essais (random et bayes).")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--balanced", action="store_true", help="Pondérer les classes (class_weight='balanced').")
+    parser.add_argument("--workers", type=int, default=None, help="Processus du pool (défaut : min(4, coeurs)).")
+    parser.add_argument("--mlflow-dir", default=MLFLOW_DIR, help="Répertoire contenant mlruns/ et mlartifacts/.")
+    parser.add_argument("--experiment", default=EXPERIMENT_NAME)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.csv_path):
+        raise FileNotFoundError(f"Fichier de données introuvable : {args.csv_path}")
+    cache_dir = CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(args.csv_path)), "train_cache")
+    # Conversion (ou réutilisation) de la matrice avant de lancer les workers, qui ne font que la relire
+    load_training_matrix(args.csv_path, cache_dir)
+
+    results = search(cache_dir, args.model, args.search, args.trials, args.folds, args.balanced, args.workers,
+                     args.mlflow_dir, args.experiment, args.seed)
+    finished = [(run_id, result) for run_id, result in results if result["status"] == "FINISHED"]
+    print(f"{len(finished)} essais terminés, {len(results) - len(finished)} arrêtés précocement.")
+    if finished:
+        run_id, best = finished[0]
+        print(f"Meilleur run {run_id} : AUC={best['metrics']['AUC']:.4f}, "
+              f"coût métier={best['metrics']['Business Cost']}, paramètres={best['params']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
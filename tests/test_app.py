@@ -27,3 +27,245 @@ def test_clients_data_is_loaded():
     assert "SK_ID_CURR" in clients_data.columns, "La colonne 'SK_ID_CURR' est absente des données clients."
 
 
+
+def test_predict_batch_reports_unknown_clients(client):
+    """Un ID inconnu dans un lot renvoie une erreur pour cette ligne sans faire échouer le lot."""
+    response = client.post("/predict_batch", json={"SK_ID_CURR": [-1], "include_shap": False})
+    assert response.status_code == 200
+    assert "error" in response.get_json()["results"][0]
+
+
+def test_predict_batch_rejects_invalid_rows(client):
+    """Une ligne brute qui n'est pas un objet ou dont une valeur n'est pas numérique renvoie 400."""
+    for rows in ([{"AMT_CREDIT": "abc"}], ["AMT_CREDIT"], [{"SK_ID_CURR": "abc"}]):
+        response = client.post("/predict_batch", json={"rows": rows, "include_shap": False})
+        assert response.status_code == 400
+    response = client.post("/predict_batch", json={"rows": [{"AMT_CREDIT": "1000.5"}], "include_shap": False})
+    assert response.status_code == 200
+
+    for payload in ({"SK_ID_CURR": ["abc"]}, {"SK_ID_CURR": [None]}, {"SK_ID_CURR": [1], "chunk_size": "x"},
+                    {"SK_ID_CURR": [1], "chunk_size": 0}):
+        assert client.post("/predict_batch", json=payload).status_code == 400
+
+
+def test_predict_batch_size_limit(client, monkeypatch):
+    """Un lot de plus de BATCH_MAX_ROWS lignes (IDs et lignes brutes) renvoie 400."""
+    import app as app_module
+    monkeypatch.setattr(app_module, "BATCH_MAX_ROWS", 2)
+    response = client.post("/predict_batch", json={"SK_ID_CURR": [-1, -2], "rows": [{}], "include_shap": False})
+    assert response.status_code == 400
+    response = client.post("/predict_batch", json={"SK_ID_CURR": [-1], "rows": [{}], "include_shap": False})
+    assert response.status_code == 200
+
+
+def test_schema_etag(client):
+    """Le schéma est servi avec un ETag et renvoie 304 s'il n'a pas changé."""
+    response = client.get("/schema")
+    assert response.status_code == 200
+    assert response.get_json()["feature_names"]
+    etag = response.headers["ETag"]
+
+    cached = client.get("/schema", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+
+def test_predict_top_k(client):
+    """Avec top_k, seules les k plus fortes contributions SHAP sont renvoyées."""
+    client_id = client.get("/get_client_ids").get_json()["client_ids"][0]
+    response = client.post("/predict", json={"SK_ID_CURR": client_id, "top_k": 5,
+                                             "include_client_info": False})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data["shap_values"]) == 5
+    assert len(data["feature_names"]) == len(data["feature_indices"]) == 5
+    assert "client_info" not in data
+
+    for top_k in (-3, 0, 1.5, "5", True):
+        assert client.post("/predict", json={"SK_ID_CURR": client_id, "top_k": top_k}).status_code == 400
+        assert client.post("/predict_batch", json={"SK_ID_CURR": [client_id], "top_k": top_k}).status_code == 400
+
+
+def test_metrics_endpoint(client):
+    """/metrics expose les durées par étape au format Prometheus."""
+    client_id = client.get("/get_client_ids").get_json()["client_ids"][0]
+    client.post("/predict", json={"SK_ID_CURR": client_id})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'projet7_stage_duration_seconds_count{endpoint="predict",stage="lookup"}' in body
+    assert "projet7_model_info" in body
+
+
+def test_coalesced_scoring_stats(client, monkeypatch):
+    """Avec le micro-batching, /stats et /metrics exposent les regroupeurs par modèle et par explainer."""
+    import app as app_module
+    monkeypatch.setattr(app_module, "PREDICT_COALESCE", True)
+    monkeypatch.setattr(app_module, "coalescers", {})
+    client_id = client.get("/get_client_ids").get_json()["client_ids"][0]
+    response = client.post("/predict", json={"SK_ID_CURR": client_id, "explainer": "native"})
+    assert response.status_code == 200
+
+    response = client.get("/stats")
+    assert response.status_code == 200
+    assert response.get_json()["coalescer"]["default"]["native"]["queue_depth"] == 0
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'projet7_coalescer_queue_depth{explainer="native",model="default"} 0' in body
+
+
+def test_get_client_ids_pagination(client):
+    """Les pages successives couvrent tous les IDs triés, une seule fois."""
+    everything = client.get("/get_client_ids").get_json()["client_ids"]
+    seen, cursor = [], None
+    while True:
+        url = "/get_client_ids?limit=7" + (f"&cursor={cursor}" if cursor is not None else "")
+        data = client.get(url).get_json()
+        assert data["total"] == len(set(everything))
+        seen += data["client_ids"]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(set(everything))
+
+    prefix = str(everything[0])[:3]
+    data = client.get(f"/get_client_ids?prefix={prefix}").get_json()
+    assert all(str(sk_id).startswith(prefix) for sk_id in data["client_ids"])
+    assert client.get("/get_client_ids?limit=0").status_code == 400
+    assert client.get("/get_client_ids?prefix=abc").status_code == 400
+
+
+def test_custom_values_scenarios(client):
+    """Les scénarios sont scorés ensemble ; un scénario vide redonne la prédiction principale."""
+    from app import required_features
+    client_id = client.get("/get_client_ids?limit=1").get_json()["client_ids"][0]
+    response = client.post("/predict_with_custom_values", json={
+        "SK_ID_CURR": client_id, required_features[0]: 0.5, "include_client_info": False, "top_k": 3,
+        "override_sets": [{}, {required_features[1]: 2.0}]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data["scenarios"]) == 2
+    assert abs(data["scenarios"][0]["probability_of_default"] - data["probability_of_default"]) < 1e-9
+    assert len(data["scenarios"][1]["shap_values"]) == 3
+
+    invalid = client.post("/predict_with_custom_values", json={"SK_ID_CURR": client_id, required_features[0]: "abc"})
+    assert invalid.status_code == 400
+
+
+def test_custom_values_sweep_validation(client):
+    """Un balayage mal formé (pas un objet, valeurs non numériques) renvoie 400."""
+    from app import required_features
+    client_id = client.get("/get_client_ids?limit=1").get_json()["client_ids"][0]
+    for sweep in ([required_features[0]], {"feature": required_features[0], "values": ["abc"]},
+                  {"feature": required_features[0], "values": 3}, {"feature": [1], "values": [1.0]}):
+        response = client.post("/predict_with_custom_values", json={"SK_ID_CURR": client_id, "sweep": sweep})
+        assert response.status_code == 400
+    response = client.post("/predict_with_custom_values", json={
+        "SK_ID_CURR": client_id, "sweep": {"feature": required_features[0], "values": [0.1, 0.9]}})
+    assert len(response.get_json()["sweep"]["probabilities"]) == 2
+
+    # Au-delà de SWEEP_VALUES_MAX valeurs, le balayage est refusé
+    response = client.post("/predict_with_custom_values", json={
+        "SK_ID_CURR": client_id, "sweep": {"feature": required_features[0], "values": [0.5] * 1001}})
+    assert response.status_code == 400
+
+
+def test_custom_values_report_explainer(client):
+    """L'explainer renvoyé est celui qui a produit les valeurs SHAP ; les deux donnent les mêmes valeurs."""
+    from app import required_features
+    client_id = client.get("/get_client_ids?limit=1").get_json()["client_ids"][0]
+    responses = {}
+    for explainer in ("native", "shap"):
+        response = client.post("/predict_with_custom_values", json={
+            "SK_ID_CURR": client_id, required_features[0]: 0.5, "explainer": explainer, "include_client_info": False})
+        assert response.status_code == 200
+        responses[explainer] = response.get_json()
+        assert responses[explainer]["explainer"] == explainer
+    assert responses["native"]["shap_values"] == pytest.approx(responses["shap"]["shap_values"], abs=1e-9)
+
+
+def test_explainer_selection(client):
+    """Le backend d'explication se choisit par requête et donne les mêmes valeurs SHAP."""
+    client_id = client.get("/get_client_ids?limit=1").get_json()["client_ids"][0]
+    responses = {}
+    for explainer in ("native", "shap"):
+        response = client.post("/predict", json={"SK_ID_CURR": client_id, "explainer": explainer,
+                                                 "include_client_info": False})
+        assert response.status_code == 200
+        responses[explainer] = response.get_json()
+        assert responses[explainer]["explainer"] == explainer
+    assert responses["native"]["shap_values"] == pytest.approx(responses["shap"]["shap_values"], abs=1e-9)
+
+    unknown = client.post("/predict", json={"SK_ID_CURR": client_id, "explainer": "kernel"})
+    assert unknown.status_code == 400
+
+
+@pytest.fixture
+def isolated_ingest(tmp_path, monkeypatch):
+    """Journal, pool d'IDs et copie du stockage propres au test : les clients ingérés ne fuient pas dans les suivants."""
+    import app as backend
+    from client_store import ClientStore
+    from id_allocator import IdAllocator
+    from segment_log import SegmentLog
+    backend.load_state()
+    store = backend.client_store
+    monkeypatch.setattr(backend, "client_store", ClientStore(
+        store.base_ids, store.features, store.feature_names, frame=store.frame, imputation=store.imputation,
+        columns=store.columns, segments_through=store.segments_through))
+    monkeypatch.setattr(backend, "clients_data", backend.clients_data)
+    monkeypatch.setattr(backend, "segment_log", SegmentLog(str(tmp_path / "segments")))
+    (tmp_path / "current_id.txt").write_text("999100001,999100002")
+    monkeypatch.setattr(backend, "id_allocator", IdAllocator(str(tmp_path / "current_id.txt")))
+    return backend
+
+
+def test_ingest_clients(client, isolated_ingest):
+    """Un client ingéré est aussitôt interrogeable ; un ID déjà présent est signalé sans bloquer les autres."""
+    backend = isolated_ingest
+
+    existing_id = int(backend.client_store.ids[0])
+    response = client.post("/ingest_clients", json={"clients": [
+        {"SK_ID_CURR": 999000001, "AMT_CREDIT": 250000.0},
+        {"SK_ID_CURR": existing_id},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["ingested"] == 1
+    assert "error" in data["results"][1]
+
+    response = client.post("/predict", json={"SK_ID_CURR": 999000001, "include_client_info": True})
+    assert response.status_code == 200
+    assert response.get_json()["client_info"]["AMT_CREDIT"] == 250000.0
+
+    # Client écrit dans le journal par un autre worker, pas encore appliqué ici : refusé aussi
+    backend.segment_log.append(backend.client_table_row({}, 999000002))
+    response = client.post("/ingest_clients", json={"clients": [{"SK_ID_CURR": 999000002}]})
+    assert response.get_json()["ingested"] == 0
+    assert response.get_json()["segment"] is None
+
+
+def test_rejected_ingest_allocates_no_id(client, isolated_ingest):
+    """Une ingestion refusée (400) ne consomme aucun ID ; les IDs sont attribués une fois toutes les lignes validées."""
+    backend = isolated_ingest
+    response = client.post("/ingest_clients", json={"clients": [{}, {"AMT_CREDIT": "abc"}]})
+    assert response.status_code == 400
+    assert backend.id_allocator.remaining() == 2
+
+    response = client.post("/ingest_clients", json={"clients": [{}, {"AMT_CREDIT": 1000.0}]})
+    assert [result["SK_ID_CURR"] for result in response.get_json()["results"]] == [999100001, 999100002]
+
+
+def test_drift_report(client):
+    """Les requêtes scorées alimentent le rapport de dérive."""
+    import app as backend
+    sk_id = int(backend.client_store.ids[0])
+    before = client.get("/drift").get_json()["rows"]
+    client.post("/predict", json={"SK_ID_CURR": sk_id, "include_client_info": False})
+
+    response = client.get("/drift?top=5")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["rows"] == before + 1
+    assert len(data["features"]) == 5
+    assert data["features"][0]["psi"] >= data["features"][-1]["psi"]
+
+    for top in ("-1", "abc"):
+        assert client.get(f"/drift?top={top}").status_code == 400
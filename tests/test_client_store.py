@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from client_store import ClientStore, write_table
+
+
+@pytest.fixture
+def frame():
+    """DataFrame client synthétique (ID + deux features + une colonne descriptive)."""
+    return pd.DataFrame({
+        "SK_ID_CURR": [100002, 100003, 100004],
+        "AMT_CREDIT": [1000.0, 2000.0, 3000.0],
+        "EXT_SOURCE_2": [0.1, 0.2, 0.3],
+        "TARGET": [0, 1, 0],
+    })
+
+
+def test_row_is_a_view_in_feature_order(frame):
+    """La ligne renvoyée est une vue sur la matrice, dans l'ordre des features demandées."""
+    store = ClientStore.from_frame(frame, ["EXT_SOURCE_2", "AMT_CREDIT"])
+    row = store.row(100003)
+    assert row.shape == (1, 2)
+    assert np.shares_memory(row, store.features), "La ligne devrait être une vue sans copie."
+    assert row.tolist() == [[0.2, 2000.0]]
+
+
+def test_unknown_client_returns_none(frame):
+    """Un ID inconnu ne doit pas lever d'erreur."""
+    store = ClientStore.from_frame(frame, ["AMT_CREDIT"])
+    assert store.row(999999) is None
+    assert 999999 not in store
+    assert store.client_info(999999) is None
+
+
+def test_client_info_contains_all_columns(frame):
+    """Les informations descriptives incluent les colonnes hors features."""
+    store = ClientStore.from_frame(frame, ["AMT_CREDIT"])
+    assert store.client_info(100004)["TARGET"] == 0
+
+
+def test_empty_frame():
+    """Un DataFrame vide donne un stockage vide."""
+    store = ClientStore.from_frame(pd.DataFrame(), ["AMT_CREDIT"])
+    assert store.empty
+    assert store.features.shape == (0, 1)
+
+
+def test_binary_table_roundtrip(frame, tmp_path):
+    """Le format binaire memory-mappé restitue les mêmes lignes que le CSV."""
+    csv_path = tmp_path / "clients_data.csv"
+    frame.to_csv(csv_path, index=False)
+    assert write_table(str(csv_path), ["EXT_SOURCE_2", "AMT_CREDIT"], str(tmp_path / "store"), chunksize=2) == 3
+
+    store = ClientStore.from_directory(str(tmp_path / "store"), ["EXT_SOURCE_2", "AMT_CREDIT"])
+    assert np.shares_memory(store.frame.to_numpy(), store.features), "Le DataFrame doit partager le memory-map."
+    assert store.row(100003).tolist() == [[0.2, 2000.0]]
+    assert store.client_info(100004)["TARGET"] == 0
+    assert store.ids.tolist() == [100002, 100003, 100004]
+
+    # Les IDs sont lus dans leur propre fichier ; sans lui (ancien format), dans la colonne de la table
+    assert np.load(tmp_path / "store" / "ids.npy").tolist() == [100002, 100003, 100004]
+    os.remove(tmp_path / "store" / "ids.npy")
+    store = ClientStore.from_directory(str(tmp_path / "store"), ["EXT_SOURCE_2", "AMT_CREDIT"])
+    assert store.ids.tolist() == [100002, 100003, 100004]
+
+
+def test_search_ids_prefix_and_cursor():
+    """Recherche par préfixe et pagination par curseur sur les IDs triés."""
+    ids = [5, 1300, 12, 129, 120, 1200, 99, 125]
+    store = ClientStore(ids, np.zeros((len(ids), 1)), ["AMT_CREDIT"])
+
+    page, total, cursor = store.search_ids(limit=2, prefix="12")
+    assert (page, total, cursor) == ([12, 120], 5, 120)
+    page, total, cursor = store.search_ids(limit=2, prefix="12", after=cursor)
+    assert (page, cursor) == ([125, 129], 129)
+    page, total, cursor = store.search_ids(limit=2, prefix="12", after=cursor)
+    assert (page, cursor) == ([1200], None)
+
+    assert store.search_ids(min_id=10, max_id=130) == ([12, 99, 120, 125, 129], 5, None)
+
+    # "01" ne désigne pas les IDs commençant par 1
+    assert store.search_ids(prefix="01") == ([], 0, None)
+    assert store.search_ids(prefix="0") == ([], 0, None)
@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+import pytest
+from coalescer import MicroBatcher
+
+
+def test_concurrent_rows_are_scored_together():
+    """Les lignes soumises en même temps sont scorées en un seul lot et redistribuées."""
+    calls = []
+    release = threading.Event()
+
+    def score_batch(matrix, shap_mask):
+        release.wait(1)
+        calls.append(len(matrix))
+        return matrix[:, 0] * 2, matrix[shap_mask]
+
+    batcher = MicroBatcher(score_batch, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(np.array([float(i), 0.0]), with_shap=i % 2 == 0) for i in range(4)]
+    release.set()
+
+    results = [future.result(timeout=5) for future in futures]
+    assert [probability for probability, _ in results] == [0.0, 2.0, 4.0, 6.0]
+    assert results[1][1] is None
+    assert results[2][1].tolist() == [2.0, 0.0]
+    assert sum(calls) == 4 and len(calls) < 4
+    assert batcher.stats()["requests"] == 4
+
+
+def test_errors_are_propagated_to_every_request():
+    """Une erreur de scoring est renvoyée à chaque requête du lot."""
+    def score_batch(matrix, shap_mask):
+        raise ValueError("modèle indisponible")
+
+    batcher = MicroBatcher(score_batch, max_batch_size=4, max_wait_ms=1)
+    future = batcher.submit(np.zeros(3))
+    with pytest.raises(ValueError, match="indisponible"):
+        future.result(timeout=5)
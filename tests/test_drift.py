@@ -0,0 +1,68 @@
+import numpy as np
+from drift import DriftMonitor, population_stability_index, retire_snapshot
+
+
+def _monitor(directory=None):
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(2000, 2))
+    return DriftMonitor(["AMT_CREDIT", "EXT_SOURCE_2"], reference, rng.random(2000), threshold=0.5,
+                        directory=directory)
+
+
+def test_psi_detects_shift():
+    """Le PSI est nul pour des distributions identiques et élevé pour une distribution décalée."""
+    reference = np.array([100, 100, 100, 100])
+    assert population_stability_index(reference * 3, reference) < 1e-12
+    assert population_stability_index(np.array([10, 10, 10, 370]), reference) > 0.25
+
+
+def test_report_flags_drifted_feature():
+    """Seule la feature décalée est signalée ; moyennes, valeurs manquantes et refus sont suivis."""
+    rng = np.random.default_rng(1)
+    monitor = _monitor()
+    features = rng.normal(size=(1000, 2))
+    features[:, 0] += 3.0
+    features[:10, 1] = np.nan
+    for row, probability in zip(features, rng.random(1000)):
+        monitor.observe(row, probability)
+
+    report = monitor.report()
+    assert report["rows"] == 1000
+    assert report["drifted_features"] == 1
+    first, second = report["features"]
+    assert (first["feature"], first["status"]) == ("AMT_CREDIT", "significant")
+    assert second["status"] == "stable"
+    assert abs(first["mean"] - 3.0) < 0.2
+    assert second["missing_rate"] == 0.01
+    assert report["prediction"]["status"] == "stable"
+    assert abs(report["prediction"]["refusal_rate"] - 0.5) < 0.1
+
+
+def test_snapshots_are_merged_across_processes(tmp_path):
+    """Les instantanés des autres workers (même référence) sont additionnés au rapport."""
+    other = _monitor(str(tmp_path))
+    other.observe(np.zeros((3, 2)), np.full(3, 0.9))
+    other.flush()
+    # Simuler un autre processus : renommer son instantané
+    (tmp_path / "drift_1.json").write_text(next(tmp_path.glob("drift_*.json")).read_text())
+
+    monitor = _monitor(str(tmp_path))
+    monitor.observe(np.zeros((1, 2)), [0.1])
+    report = monitor.report()
+    assert report["rows"] == 4
+    assert report["prediction"]["refusal_rate"] == 0.75
+
+
+def test_retired_worker_is_merged_once(tmp_path):
+    """L'instantané d'un worker arrêté est intégré à l'agrégat de sa référence puis supprimé."""
+    other = _monitor(str(tmp_path))
+    other.observe(np.zeros((3, 2)), np.full(3, 0.9))
+    other.flush()
+    (tmp_path / "drift_1.json").write_text(next(tmp_path.glob("drift_*.json")).read_text())
+    next(p for p in tmp_path.glob("drift_*.json") if p.name != "drift_1.json").unlink()
+
+    monitor = _monitor(str(tmp_path))
+    for pid in (1, 1):
+        retire_snapshot(str(tmp_path), pid)
+        assert monitor.report()["rows"] == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["drift_retired.json"]
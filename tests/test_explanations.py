@@ -0,0 +1,78 @@
+import os
+
+import joblib
+import numpy as np
+import shap
+from explanations import ENTRY_OVERHEAD_BYTES, NativeTreeExplainer, ShapCache, positive_class, top_k_indices
+from sklearn.linear_model import LogisticRegression
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "backend", "best_model_lgb_no.pkl")
+
+
+def test_cache_hits_and_misses():
+    """Les compteurs distinguent les hits des misses."""
+    cache = ShapCache(max_bytes=1024 * 1024)
+    assert cache.get(("v1", 1)) is None
+    cache.put(("v1", 1), np.arange(3.0))
+    assert cache.get(("v1", 1)).tolist() == [0.0, 1.0, 2.0]
+    assert cache.get(("v2", 1)) is None, "Une autre version du modèle ne doit pas partager le cache."
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used():
+    """Le cache évince l'entrée la moins récemment utilisée au-delà du plafond mémoire."""
+    entry_size = np.zeros(10).nbytes + ENTRY_OVERHEAD_BYTES
+    cache = ShapCache(max_bytes=2 * entry_size)
+    cache.put(("v1", 1), np.zeros(10))
+    cache.put(("v1", 2), np.zeros(10))
+    cache.get(("v1", 1))
+    cache.put(("v1", 3), np.zeros(10))
+    assert cache.get(("v1", 2)) is None
+    assert cache.get(("v1", 1)) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_positive_class_formats():
+    """Les sorties SHAP en liste ou en tableau 3D sont ramenées à la classe positive."""
+    values = np.ones((2, 4))
+    assert positive_class([-values, values]).tolist() == values.tolist()
+    assert positive_class(np.stack([-values, values], axis=-1)).tolist() == values.tolist()
+    assert positive_class(values).shape == (2, 4)
+
+
+def test_top_k_indices_sorted_by_magnitude():
+    """Les indices renvoyés sont triés par valeur absolue décroissante."""
+    values = np.array([[0.1, -0.5, 0.3, 0.05], [1.0, 0.0, -2.0, 0.5]])
+    assert top_k_indices(values, 2).tolist() == [[1, 2], [2, 0]]
+    assert top_k_indices(values, 10).shape == (2, 4)
+
+
+def test_native_explainer_matches_shap():
+    """Les contributions natives de LightGBM ont la disposition et les valeurs de shap.TreeExplainer."""
+    model = joblib.load(MODEL_PATH)
+    X = np.random.default_rng(0).normal(size=(20, model.n_features_in_))
+    native = NativeTreeExplainer.for_model(model, num_threads=2)
+    reference = positive_class(shap.TreeExplainer(model).shap_values(X))
+    assert native.shap_values(X).shape == reference.shape
+    np.testing.assert_allclose(native.shap_values(X), reference, rtol=0, atol=1e-9)
+
+
+def test_native_explainer_threads(monkeypatch):
+    """Une ligne seule est expliquée sur un thread, un lot sur tous les coeurs (par défaut)."""
+    model = joblib.load(MODEL_PATH)
+    native = NativeTreeExplainer.for_model(model)
+    calls = []
+    predict = native.booster.predict
+    monkeypatch.setattr(native.booster, "predict", lambda X, **params: calls.append(params) or predict(X, **params))
+    X = np.zeros((3, model.n_features_in_))
+    native.shap_values(X[:1])
+    native.shap_values(X)
+    assert [params["num_threads"] for params in calls] == [1, os.cpu_count()]
+
+
+def test_native_explainer_requires_lightgbm():
+    """Pas d'explainer natif pour un modèle qui n'est pas LightGBM."""
+    model = LogisticRegression().fit(np.eye(2), [0, 1])
+    assert NativeTreeExplainer.for_model(model) is None
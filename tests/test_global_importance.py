@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+from global_importance import GlobalImportanceService, compute_global_importance, stratified_sample
+
+
+class IdentityExplainer:
+    """Explainer factice : les valeurs SHAP sont les features elles-mêmes."""
+
+    def shap_values(self, features):
+        return np.asarray(features)
+
+
+class LinearModel:
+    """Modèle factice dont le score est la première feature."""
+
+    def predict_proba(self, features):
+        return np.column_stack([1 - features[:, 0], features[:, 0]])
+
+
+def test_compute_global_importance_is_sorted_mean_abs():
+    """L'importance globale est la moyenne des |SHAP|, triée par ordre décroissant."""
+    features = np.array([[1.0, -6.0], [-3.0, 0.0]])
+    result = compute_global_importance(IdentityExplainer(), features, ["a", "b"], chunk_size=1)
+    assert result == [{"Feature": "b", "Global Importance": 3.0}, {"Feature": "a", "Global Importance": 2.0}]
+
+
+def test_stratified_sample_covers_all_deciles():
+    """L'échantillon stratifié couvre toute la distribution des scores."""
+    scores = np.linspace(0, 1, 1000)
+    positions = stratified_sample(scores, 100)
+    assert 90 <= len(positions) <= 110
+    assert len(set(np.digitize(scores[positions], np.linspace(0, 1, 11)[1:-1]))) == 10
+
+
+def test_artifact_is_persisted_and_reused(tmp_path):
+    """Le calcul exact est enregistré puis relu tel quel au démarrage suivant."""
+    model_path = tmp_path / "model.pkl"
+    data_path = tmp_path / "clients_data.csv"
+    model_path.write_bytes(b"model")
+    data_path.write_bytes(b"data")
+    features = np.random.default_rng(0).random((50, 3))
+
+    service = GlobalImportanceService(str(tmp_path), str(model_path), str(data_path), ["a", "b", "c"])
+    service.start(LinearModel(), IdentityExplainer(), features, background=False)
+    assert service.result["mode"] == "exact"
+    assert len([p for p in os.listdir(tmp_path) if p.startswith("global_importance_")]) == 1
+
+    reloaded = GlobalImportanceService(str(tmp_path), str(model_path), str(data_path), ["a", "b", "c"])
+    reloaded.start(LinearModel(), None, features, background=False)
+    assert reloaded.result["global_importances"] == service.result["global_importances"]
+
+
+def test_worker_follows_artifact_of_changed_model(tmp_path):
+    """Un worker (sans calcul ni surveillance) sert l'artefact correspondant au modèle courant."""
+    model_path = tmp_path / "model.pkl"
+    data_path = tmp_path / "clients_data.csv"
+    model_path.write_bytes(b"model")
+    data_path.write_bytes(b"data")
+    features = np.random.default_rng(0).random((50, 3))
+
+    master = GlobalImportanceService(str(tmp_path), str(model_path), str(data_path), ["a", "b", "c"])
+    master.start(LinearModel(), IdentityExplainer(), features, background=False)
+    worker = GlobalImportanceService(str(tmp_path), str(model_path), str(data_path), ["a", "b", "c"])
+    worker.start(LinearModel(), None, features, background=False)
+    first_version = worker.current()["model_version"]
+
+    model_path.write_bytes(b"retrained model")
+    master.start(LinearModel(), IdentityExplainer(), features * 2, background=False)
+    worker._last_reload = 0.0
+    assert worker.current()["model_version"] == master.result["model_version"] != first_version
+
+
+def test_data_version_follows_binary_store(tmp_path):
+    """Avec le format binaire, la version des données est celle de meta.json et non celle du CSV."""
+    data_path = tmp_path / "clients_data.csv"
+    data_path.write_bytes(b"data")
+    service = GlobalImportanceService(str(tmp_path), str(data_path), str(data_path), ["a"],
+                                      store_path=str(tmp_path / "store"))
+    assert service.data_path == str(data_path)
+    (tmp_path / "store").mkdir()
+    (tmp_path / "store" / "meta.json").write_text("{}")
+    assert service.data_path == str(tmp_path / "store" / "meta.json")
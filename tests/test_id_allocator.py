@@ -0,0 +1,52 @@
+import multiprocessing
+
+from id_allocator import IdAllocator
+
+
+def _allocate_all(pool_path, lease_size, queue):
+    allocator = IdAllocator(pool_path, lease_size=lease_size)
+    ids = []
+    while (next_id := allocator.allocate()) is not None:
+        ids.append(next_id)
+    queue.put(ids)
+
+
+def test_pool_file_is_never_rewritten(tmp_path):
+    """Le pool reste intact : seul le curseur avance, jusqu'à épuisement."""
+    pool = tmp_path / "current_id.txt"
+    pool.write_text("10,11,12")
+    allocator = IdAllocator(str(pool), lease_size=2)
+
+    assert [allocator.allocate() for _ in range(4)] == [10, 11, 12, None]
+    assert pool.read_text() == "10,11,12"
+    assert allocator.remaining() == 0
+
+
+def test_ids_are_unique_across_processes(tmp_path):
+    """Plusieurs processus concurrents ne reçoivent jamais le même ID."""
+    pool = tmp_path / "current_id.txt"
+    pool.write_text(",".join(str(i) for i in range(1000, 1500)))
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=_allocate_all, args=(str(pool), 7, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    allocated = [i for _ in workers for i in queue.get(timeout=30)]
+    for worker in workers:
+        worker.join()
+
+    assert sorted(allocated) == list(range(1000, 1500))
+
+
+def test_released_ids_are_reused(tmp_path):
+    """Les IDs d'un bail rendus à l'arrêt d'un processus sont attribués avant ceux du curseur."""
+    pool = tmp_path / "current_id.txt"
+    pool.write_text("10,11,12,13,14")
+    first = IdAllocator(str(pool), lease_size=3)
+    assert first.allocate() == 10
+    assert first.release() == 2
+    assert first.remaining() == 4
+
+    second = IdAllocator(str(pool), lease_size=3)
+    assert [second.allocate() for _ in range(5)] == [11, 12, 13, 14, None]
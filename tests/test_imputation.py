@@ -0,0 +1,24 @@
+import numpy as np
+from imputation import ImputationTable
+
+
+def test_fill_replaces_only_default_values():
+    """Seules les valeurs restées à 0 sont remplacées par la médiane de la colonne."""
+    features = np.array([[1.0, 10.0], [3.0, np.nan], [5.0, 30.0]])
+    table = ImputationTable.compute(features, ["a", "b"])
+    assert table.statistics["median"].tolist() == [3.0, 20.0]
+    assert table.fill(np.array([[0.0, 7.0]])).tolist() == [[3.0, 7.0]]
+    assert table.fill(np.array([[0.0, 0.0]]), statistic="mean").tolist() == [[3.0, 20.0]]
+
+
+def test_save_and_load(tmp_path):
+    """La table enregistrée est relue à l'identique."""
+    table = ImputationTable.compute(np.array([[1.0], [2.0]]), ["a"])
+    table.save(str(tmp_path / "imputation.json"))
+    assert ImputationTable.load(str(tmp_path / "imputation.json")).statistics["median"].tolist() == [1.5]
+
+
+def test_empty_data_keeps_defaults():
+    """Sans données de référence, la ligne est laissée telle quelle."""
+    table = ImputationTable.compute(np.empty((0, 2)), ["a", "b"])
+    assert table.fill(np.zeros((1, 2))).tolist() == [[0.0, 0.0]]
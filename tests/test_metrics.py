@@ -0,0 +1,50 @@
+from metrics import Metrics, retire_snapshot
+
+
+def _metrics(directory=None):
+    metrics = Metrics("test", directory)
+    metrics.histogram("duration_seconds", "Durées.", buckets=(0.1, 1.0))
+    metrics.counter("requests_total", "Requêtes.")
+    return metrics
+
+
+def test_histogram_is_cumulative():
+    """Les seaux Prometheus sont cumulés et une valeur égale à une borne y est comptée."""
+    metrics = _metrics()
+    for value in (0.05, 0.1, 0.5, 3.0):
+        metrics.observe("duration_seconds", value, endpoint="predict")
+    lines = metrics.render()
+
+    assert 'test_duration_seconds_bucket{endpoint="predict",le="0.1"} 2' in lines
+    assert 'test_duration_seconds_bucket{endpoint="predict",le="1"} 3' in lines
+    assert 'test_duration_seconds_bucket{endpoint="predict",le="+Inf"} 4' in lines
+    assert 'test_duration_seconds_count{endpoint="predict"} 4' in lines
+
+
+def test_snapshots_are_merged_across_processes(tmp_path):
+    """Les instantanés écrits par les autres workers sont additionnés à l'export."""
+    other = _metrics(str(tmp_path))
+    other.inc("requests_total", endpoint="predict", status=200)
+    other.flush()
+    # Simuler un autre processus : renommer son instantané
+    (tmp_path / "metrics_1.json").write_text(next(tmp_path.glob("metrics_*.json")).read_text())
+
+    metrics = _metrics(str(tmp_path))
+    metrics.inc("requests_total", 2, endpoint="predict", status=200)
+    assert 'test_requests_total{endpoint="predict",status="200"} 3' in metrics.render()
+
+
+def test_retired_worker_is_merged_once(tmp_path):
+    """L'instantané d'un worker arrêté est intégré à l'agrégat puis supprimé, sans changer l'export."""
+    other = _metrics(str(tmp_path))
+    other.inc("requests_total", endpoint="predict", status=200)
+    other.flush()
+    (tmp_path / "metrics_1.json").write_text(next(tmp_path.glob("metrics_*.json")).read_text())
+    next(p for p in tmp_path.glob("metrics_*.json") if p.name != "metrics_1.json").unlink()
+
+    metrics = _metrics(str(tmp_path))
+    expected = 'test_requests_total{endpoint="predict",status="200"} 1'
+    for pid in (1, 1):
+        retire_snapshot(str(tmp_path), pid)
+        assert expected in metrics.render()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["metrics_retired.json"]
@@ -0,0 +1,76 @@
+import functools
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from model_registry import InvalidModel, ModelBundle, ModelRegistry, discover_models
+
+FEATURES = ["a", "b", "c"]
+
+
+def _train(path, X, y, with_id=False):
+    design = np.column_stack([np.arange(len(X)), X]) if with_id else X
+    joblib.dump(LogisticRegression().fit(design, y), path)
+
+
+def _data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    return X, (X[:, 0] + rng.normal(scale=0.5, size=200) > 0).astype(int)
+
+
+def test_bundle_prepends_client_id(tmp_path):
+    """Un artefact entraîné avec SK_ID_CURR reçoit l'ID en tête ; sa contribution SHAP est retirée."""
+    X, y = _data()
+    path = tmp_path / "best_model_lr_id.pkl"
+    _train(path, X, y, with_id=True)
+    bundle = ModelBundle.load("lr_id", str(path), FEATURES, X[:50])
+
+    assert bundle.prepends_id
+    expected = joblib.load(path).predict_proba(np.column_stack([[7, 8], X[:2]]))[:, 1]
+    assert np.allclose(bundle.predict_positive(X[:2], ids=[7, 8]), expected)
+    assert bundle.shap_values(X[:2], ids=[7, 8]).shape == (2, 3)
+    assert discover_models(str(tmp_path)) == {"lr_id": str(path)}
+
+
+def test_registry_hot_swaps_changed_artifact(tmp_path):
+    """Un artefact modifié est rechargé et substitué ; les autres ne sont pas rechargés."""
+    X, y = _data()
+    first, second = tmp_path / "first.pkl", tmp_path / "second.pkl"
+    _train(first, X, y)
+    _train(second, X, 1 - y)
+    loader = functools.partial(ModelBundle.load, feature_names=FEATURES, sample=X[:50])
+    registry = ModelRegistry({"default": str(first), "other": str(second)}, loader)
+
+    before, other = registry.get(), registry.get("other")
+    assert registry.reload_changed() == []
+
+    _train(first, X, 1 - y)
+    os.utime(first, ns=(before.stamp[0] + 10**9, before.stamp[0] + 10**9))
+    assert registry.reload_changed() == ["default"]
+
+    after = registry.get()
+    assert after is not before and after.version != before.version
+    assert registry.get("other") is other
+    assert np.allclose(after.predict_positive(X[:5]), joblib.load(first).predict_proba(X[:5])[:, 1])
+
+
+def test_constant_model_is_not_served(tmp_path):
+    """Un modèle à probabilité constante sur l'échantillon n'est pas servi ; seuls les noms demandés sont découverts."""
+    X, y = _data()
+    default, constant = tmp_path / "best_model_lr.pkl", tmp_path / "best_model_flat.pkl"
+    _train(default, X, y)
+    _train(constant, np.zeros_like(X), y)
+    loader = functools.partial(ModelBundle.load, feature_names=FEATURES, sample=X[:50])
+
+    with pytest.raises(InvalidModel):
+        loader("flat", str(constant))
+    registry = ModelRegistry({"default": str(default), "flat": str(constant)}, loader)
+    assert registry.names() == ["default"]
+    assert registry.reload_changed() == []
+
+    assert discover_models(str(tmp_path), ["lr", "absent"]) == {"lr": str(default)}
+    assert discover_models(str(tmp_path), []) == {}
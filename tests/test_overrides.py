@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from overrides import FeatureOverrides, InvalidOverride
+
+
+@pytest.fixture
+def overrides():
+    return FeatureOverrides(["AMT_CREDIT", "EXT_SOURCE_2", "DAYS_BIRTH"])
+
+
+def test_parse_ignores_unknown_keys_and_none(overrides):
+    """Seules les features connues sont retenues, converties en float64."""
+    indices, values = overrides.parse({"SK_ID_CURR": 100002, "DAYS_BIRTH": "-12000", "EXT_SOURCE_2": None,
+                                       "AMT_CREDIT": True})
+    assert indices.tolist() == [2, 0]
+    assert values.dtype == np.float64
+    assert values.tolist() == [-12000.0, 1.0]
+
+
+def test_invalid_values_are_reported(overrides):
+    """Les features aux valeurs non numériques sont citées dans l'erreur."""
+    with pytest.raises(InvalidOverride, match="EXT_SOURCE_2"):
+        overrides.parse({"AMT_CREDIT": 1.0, "EXT_SOURCE_2": "abc"})
+    with pytest.raises(InvalidOverride, match="Jeu de valeurs 1"):
+        overrides.apply_many(np.zeros(3), [{"AMT_CREDIT": 1.0}, {"DAYS_BIRTH": [1, 2]}])
+
+
+def test_apply_many_builds_one_row_per_set(overrides):
+    """Chaque jeu modifie sa propre copie de la ligne de référence."""
+    base_row = np.array([[1000.0, 0.5, -10000.0]])
+    matrix = overrides.apply_many(base_row, [{"AMT_CREDIT": 2000.0}, {}, {"EXT_SOURCE_2": 0.1, "DAYS_BIRTH": -9000}])
+    assert matrix.tolist() == [[2000.0, 0.5, -10000.0], [1000.0, 0.5, -10000.0], [1000.0, 0.1, -9000.0]]
+    assert base_row.tolist() == [[1000.0, 0.5, -10000.0]]
+    assert overrides.apply_many(base_row, []).shape == (0, 3)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from score_clients import score_file  # noqa: E402
+import app as backend  # noqa: E402
+
+
+def _clients_csv(tmp_path, n_rows=300):
+    rng = np.random.default_rng(0)
+    features = backend.read_required_features()
+    df = pd.DataFrame(rng.normal(size=(n_rows, len(features))), columns=features)
+    df.insert(0, "SK_ID_CURR", np.arange(100000, 100000 + n_rows))
+    path = tmp_path / "clients.csv"
+    df.to_csv(path, index=False)
+    return path, df
+
+
+def test_score_file_matches_model(tmp_path):
+    """Le scoring parallèle par blocs conserve l'ordre et donne les probabilités du modèle."""
+    input_path, df = _clients_csv(tmp_path)
+    output_path = tmp_path / "scores.csv"
+    n_rows = score_file(str(input_path), str(output_path), top_k=3, decision=True, workers=2, chunk_rows=64)
+
+    scores = pd.read_csv(output_path)
+    assert n_rows == len(df) == len(scores)
+    assert scores["SK_ID_CURR"].tolist() == df["SK_ID_CURR"].tolist()
+
+    model = joblib.load(backend.MODEL_PATH)
+    expected = model.predict_proba(df[backend.read_required_features()].to_numpy())[:, 1]
+    np.testing.assert_allclose(scores["probability_of_default"], expected, rtol=1e-9)
+    assert (scores["decision"] == [backend.credit_decision(p) for p in expected]).all()
+    assert {"top_1_feature", "top_3_shap"} <= set(scores.columns)
+    assert (scores["top_1_shap"].abs() >= scores["top_3_shap"].abs()).all()
+
+
+def test_empty_input_and_failure(tmp_path):
+    """Une entrée vide donne un fichier avec l'en-tête seul ; un échec ne laisse aucun fichier."""
+    input_path, df = _clients_csv(tmp_path, n_rows=0)
+    output_path = tmp_path / "scores.csv"
+    assert score_file(str(input_path), str(output_path), top_k=2, decision=True, workers=1) == 0
+    assert pd.read_csv(output_path).columns.tolist() == [
+        "SK_ID_CURR", "probability_of_default", "decision",
+        "top_1_feature", "top_1_shap", "top_2_feature", "top_2_shap",
+    ]
+
+    # Une valeur non numérique dans le deuxième bloc fait échouer le scoring après une première écriture
+    input_path, df = _clients_csv(tmp_path, n_rows=100)
+    column = backend.read_required_features()[0]
+    df[column] = df[column].astype(object)
+    df.loc[80, column] = "x"
+    df.to_csv(input_path, index=False)
+    failed_path = tmp_path / "failed.csv"
+    with pytest.raises(ValueError):
+        score_file(str(input_path), str(failed_path), workers=1, chunk_rows=64)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["clients.csv", "scores.csv"]
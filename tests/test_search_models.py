@@ -0,0 +1,67 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_models import business_cost, experiment_id, search  # noqa: E402
+from train_model import load_training_matrix  # noqa: E402
+
+
+def _matrix_dir(tmp_path, n_rows=400):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(n_rows, 4))
+    target = (rng.random(n_rows) < 1.0 / (1.0 + np.exp(-(2.0 * features[:, 0] - 1.0)))).astype(int)
+    df = pd.DataFrame(features, columns=["AMT CREDIT", "EXT_SOURCE_1", "EXT_SOURCE_2", "DAYS_BIRTH"])
+    df.insert(0, "SK_ID_CURR", np.arange(n_rows))
+    df["TARGET"] = target
+    df.to_csv(tmp_path / "clients.csv", index=False)
+    cache_dir = str(tmp_path / "cache")
+    load_training_matrix(str(tmp_path / "clients.csv"), cache_dir)
+    return cache_dir
+
+
+def test_business_cost():
+    """Un faux négatif coûte dix fois un faux positif."""
+    y_true = np.array([1, 1, 0, 0, 0])
+    y_pred = np.array([0, 1, 1, 1, 0])
+    assert business_cost(y_true, y_pred) == 12
+
+
+def test_search_writes_mlflow_runs(tmp_path):
+    """Chaque essai devient un run MLflow (métriques, paramètres, artefact) de la même expérience."""
+    cache_dir = _matrix_dir(tmp_path)
+    mlflow_dir = str(tmp_path / "mlflow")
+    results = search(cache_dir, "logistic_regression", "random", n_trials=3, n_folds=3, workers=2,
+                     mlflow_dir=mlflow_dir, experiment="Tests")
+
+    assert len(results) == 3
+    assert results[0][1]["metrics"]["AUC"] >= results[-1][1]["metrics"]["AUC"]
+    exp_id = experiment_id(mlflow_dir, "Tests")
+    assert sorted(os.listdir(os.path.join(mlflow_dir, "mlruns", exp_id))) == sorted(
+        ["meta.yaml"] + [run_id for run_id, _ in results])
+
+    run_id, best = results[0]
+    run_dir = os.path.join(mlflow_dir, "mlruns", exp_id, run_id)
+    with open(os.path.join(run_dir, "metrics", "AUC"), "r") as f:
+        assert float(f.read().split()[1]) == best["metrics"]["AUC"]
+    with open(os.path.join(run_dir, "params", "C"), "r") as f:
+        assert float(f.read()) == best["params"]["C"]
+
+    model = joblib.load(os.path.join(mlflow_dir, "mlartifacts", exp_id, run_id, "artifacts",
+                                     "LogisticRegression_Model", "model.pkl"))
+    assert model.predict_proba(np.zeros((1, 4))).shape == (1, 2)
+
+
+def test_lightgbm_search_uses_fold_subsets(tmp_path):
+    """LightGBM : plis tirés du Dataset du worker, early stopping interne et modèle final réentraîné."""
+    cache_dir = _matrix_dir(tmp_path, n_rows=600)
+    mlflow_dir = str(tmp_path / "mlflow")
+    results = search(cache_dir, "lightgbm", "random", n_trials=2, n_folds=3, workers=1, balanced=True,
+                     mlflow_dir=mlflow_dir, experiment="Tests")
+
+    finished = [result for _, result in results if result["status"] == "FINISHED"]
+    assert finished and len(finished[0]["fold_auc"]) == 3
+    assert finished[0]["metrics"]["AUC"] > 0.7
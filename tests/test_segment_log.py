@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pandas as pd
+from client_store import ClientStore, read_meta, write_table
+from segment_log import SegmentLog, compact
+
+FEATURES = ["EXT_SOURCE_2", "AMT_CREDIT"]
+
+
+def _store_dir(tmp_path):
+    frame = pd.DataFrame({
+        "SK_ID_CURR": [100002, 100003],
+        "AMT_CREDIT": [1000.0, 2000.0],
+        "EXT_SOURCE_2": [0.1, 0.2],
+        "TARGET": [0, 1],
+    })
+    csv_path = tmp_path / "clients_data.csv"
+    frame.to_csv(csv_path, index=False)
+    write_table(str(csv_path), FEATURES, str(tmp_path / "store"))
+    return str(tmp_path / "store")
+
+
+def test_segments_are_read_in_order(tmp_path):
+    """Les segments sont numérotés dans l'ordre d'écriture et relus à partir d'un numéro."""
+    log = SegmentLog(str(tmp_path / "segments"))
+    assert log.read_since(0) == []
+    assert log.append([[0.3, 3000.0, 100004.0, 0.0]]) == 1
+    assert log.append([[0.4, 4000.0, 100005.0, 1.0]]) == 2
+
+    segments = log.read_since(1)
+    assert [sequence for sequence, _ in segments] == [2]
+    assert segments[0][1].tolist() == [[0.4, 4000.0, 100005.0, 1.0]]
+
+    # Filtre évalué sous le verrou : rien n'est écrit si aucune ligne n'est retenue
+    assert log.append([[0.5, 5000.0, 100006.0, 0.0]], keep=lambda rows: [False]) is None
+    assert log.last_sequence() == 2
+
+
+def test_appended_clients_are_queryable(tmp_path):
+    """Les lignes ajoutées sont interrogeables sans recopier la matrice principale ; un ID connu garde sa ligne."""
+    store = ClientStore.from_directory(_store_dir(tmp_path), FEATURES)
+    base = store.features
+    assert store.append([[0.3, 3000.0, 100004.0, 0.0], [0.9, 9000.0, 100002.0, 1.0]], sequence=1) == 1
+
+    assert store.features is base
+    assert store.row(100004).tolist() == [[0.3, 3000.0]]
+    assert store.row(100002).tolist() == [[0.1, 1000.0]]
+    assert store.client_info(100004)["TARGET"] == 0
+    assert store.search_ids(prefix="10000") == ([100002, 100003, 100004], 3, None)
+    assert store.search_ids(limit=2) == ([100002, 100003], 3, 100003)
+    assert store.search_ids(limit=2, after=100003) == ([100004], 3, None)
+    assert store.ids.tolist() == [100002, 100003, 100004, 100002]
+    assert store.segments_through == 1
+
+
+def test_compaction_merges_segments(tmp_path):
+    """La compaction intègre les segments au format binaire et supprime ceux qu'elle a intégrés."""
+    store_dir = _store_dir(tmp_path)
+    log = SegmentLog(str(tmp_path / "segments"))
+    log.append([[0.3, 3000.0, 100004.0, 0.0], [0.5, 5000.0, 100003.0, 1.0]])
+    log.append([[0.4, 4000.0, 100005.0, 1.0]])
+
+    assert compact(store_dir, log, FEATURES) == 4
+    assert log.read_since(0) == []
+    assert read_meta(store_dir)["segments_through"] == 2
+    assert compact(store_dir, log, FEATURES) is None
+
+    store = ClientStore.from_directory(store_dir, FEATURES)
+    assert store.ids.tolist() == [100002, 100003, 100004, 100005]
+    assert store.row(100003).tolist() == [[0.2, 2000.0]]
+    assert store.row(100005).tolist() == [[0.4, 4000.0]]
+
+    # Les segments suivants continuent la numérotation et sont appliqués au rechargement
+    assert log.append([[0.6, 6000.0, 100006.0, 0.0]]) == 3
+    assert [sequence for sequence, _ in log.read_since(store.segments_through)] == [3]
+
+    # La table et l'index des IDs précédents sont conservés jusqu'à la compaction suivante
+    assert compact(store_dir, log, FEATURES) == 5
+    assert sorted(p for p in os.listdir(store_dir) if p.startswith(("table", "ids"))) == [
+        "ids.2.npy", "ids.3.npy", "table.2.npy", "table.3.npy"]
+    assert np.load(os.path.join(store_dir, "ids.3.npy")).tolist() == [100002, 100003, 100004, 100005, 100006]
@@ -0,0 +1,19 @@
+import json
+
+import numpy as np
+
+from serialization import JSON_MIMETYPE, encode
+
+
+def test_encode_numpy_payload():
+    """Les tableaux et scalaires NumPy sont encodés en JSON compact."""
+    body, mimetype = encode({"values": np.array([0.5, -1.25]), "count": np.int64(2)})
+    assert mimetype == JSON_MIMETYPE
+    assert json.loads(body) == {"values": [0.5, -1.25], "count": 2}
+
+
+def test_encode_non_contiguous_array():
+    """Une vue non contiguë passe par la conversion de repli."""
+    matrix = np.arange(6, dtype=np.float64).reshape(2, 3)
+    body, _ = encode({"column": matrix[:, 1]})
+    assert json.loads(body) == {"column": [1.0, 4.0]}
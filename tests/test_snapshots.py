@@ -0,0 +1,24 @@
+from snapshots import ProcessSnapshots, clear_directory, retire_snapshot
+
+
+def _merge(retired, content):
+    return {"total": retired["total"] + content["total"]}
+
+
+def test_retired_snapshot_is_read_once(tmp_path):
+    """Un instantané intégré à l'agrégat n'est plus lu ; le nettoyage ne touche que son préfixe."""
+    other = ProcessSnapshots(str(tmp_path), "test")
+    (tmp_path / "test_1.json").write_text('{"token": "a", "total": 2}')
+    (tmp_path / "test_2.json").write_text('{"token": "b", "total": 3}')
+    (tmp_path / "other_1.json").write_text("{}")
+
+    others, retired = other.read({"total": 0})
+    assert sorted(content["total"] for content in others) == [2, 3] and retired["total"] == 0
+
+    retire_snapshot(str(tmp_path), "test", 1, _merge, {"total": 0})
+    others, retired = other.read({"total": 0})
+    assert [content["total"] for content in others] == [3]
+    assert (retired["total"], retired["tokens"]) == (2, ["a"])
+
+    clear_directory(str(tmp_path), "test")
+    assert [p.name for p in tmp_path.iterdir()] == ["other_1.json"]
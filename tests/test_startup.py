@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+
+from app import app, load_state
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# Budget de l'import de l'application (secondes), sans chargement des données ni des modèles
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "1.0"))
+HEAVY_MODULES = ("pandas", "joblib", "lightgbm", "sklearn", "shap")
+
+
+def test_import_time_budget():
+    """L'import de l'application reste sous le budget et n'importe aucun module lourd."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, WARM_START="lazy")
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["heavy"] == []
+    assert result["elapsed"] < IMPORT_BUDGET_SECONDS, f"Import en {result['elapsed']:.2f} s"
+
+
+def test_ready_once_loaded():
+    """/ready répond 200 une fois l'état chargé, avec les modèles et le nombre de clients."""
+    load_state()
+    response = app.test_client().get("/ready")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["status"] == "ready"
+    assert "default" in data["models"]
+    assert data["clients"] > 0
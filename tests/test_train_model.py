@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train_model import FEATURES_FILE, load_training_matrix  # noqa: E402
+
+
+def _write_csv(path, n_rows=23):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "SK_ID_CURR": np.arange(n_rows),
+        "TARGET": rng.integers(0, 2, n_rows),
+        "AMT CREDIT": rng.normal(size=n_rows),
+        "NAME_TYPE_SUITE_Spouse, partner": rng.integers(0, 2, n_rows),
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_streamed_matrix_matches_csv(tmp_path):
+    """La matrice construite par blocs correspond au CSV, avec les noms de colonnes nettoyés."""
+    csv_path = tmp_path / "clients.csv"
+    df = _write_csv(csv_path)
+    matrix, target, features = load_training_matrix(str(csv_path), str(tmp_path / "cache"), chunk_rows=5)
+
+    assert features == ["AMT_CREDIT", "NAME_TYPE_SUITE_Spouse__partner"]
+    assert matrix.dtype == np.float32
+    expected = df[["AMT CREDIT", "NAME_TYPE_SUITE_Spouse, partner"]].to_numpy(dtype=np.float32)
+    assert np.array_equal(matrix, expected)
+    assert np.array_equal(target, df["TARGET"].to_numpy())
+
+
+def test_cached_matrix_is_reused(tmp_path):
+    """Un second appel sur le même CSV relit le cache sans reconvertir."""
+    csv_path = tmp_path / "clients.csv"
+    _write_csv(csv_path)
+    cache_dir = tmp_path / "cache"
+    load_training_matrix(str(csv_path), str(cache_dir))
+    stamp = os.stat(cache_dir / FEATURES_FILE).st_mtime_ns
+
+    load_training_matrix(str(csv_path), str(cache_dir))
+    assert os.stat(cache_dir / FEATURES_FILE).st_mtime_ns == stamp
+
+
+def test_missing_values_are_rejected(tmp_path):
+    csv_path = tmp_path / "clients.csv"
+    df = _write_csv(csv_path)
+    df.loc[17, "AMT CREDIT"] = np.nan
+    df.to_csv(csv_path, index=False)
+    with pytest.raises(ValueError):
+        load_training_matrix(str(csv_path), str(tmp_path / "cache"), chunk_rows=5)
@@ -0,0 +1,68 @@
+import os
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from tree_engine import compile_model
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "backend", "best_model_lgb_no.pkl")
+
+
+def threshold_inputs(engine, n_rows, seed=0):
+    """Lignes construites autour des seuils du modèle (égalités, voisins, NaN, zéros)."""
+    rng = np.random.default_rng(seed)
+    internal = ~engine.is_leaf
+    X = rng.normal(size=(n_rows, engine.n_features))
+    for f in np.unique(engine.feature[internal]):
+        thresholds = engine.threshold[internal & (engine.feature == f)]
+        X[:, f] = rng.choice(thresholds, n_rows) + rng.choice([-1e-6, 0.0, 1e-6], n_rows)
+    X[rng.random(X.shape) < 0.05] = 0.0
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X
+
+
+def test_backend_model_matches_lightgbm():
+    """Le moteur compilé reproduit predict_proba du modèle servi à 1e-9 près."""
+    model = joblib.load(MODEL_PATH)
+    engine = compile_model(model)
+    X = threshold_inputs(engine, 500)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(engine.predict_proba(X[:1]), model.predict_proba(X[:1]), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("params", [{}, {"zero_as_missing": True}, {"use_missing": False}])
+def test_missing_value_handling_matches_lightgbm(params):
+    """Les règles de valeurs manquantes (NaN, Zero, None) suivent celles de LightGBM."""
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(2000, 5))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    X[rng.random(X.shape) < 0.2] = 0.0
+    y = (np.nan_to_num(X[:, 0]) + np.isnan(X[:, 1]) > 0.5).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=20, num_leaves=8, verbose=-1, **params).fit(X, y)
+    engine = compile_model(model)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_random_forest_matches_scikit_learn():
+    """Les forêts aléatoires scikit-learn sont aussi prises en charge."""
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(500, 4))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(X, y)
+    engine = compile_model(model)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_trees_using_feature():
+    """Seuls les arbres qui séparent sur la feature sont renvoyés."""
+    model = joblib.load(MODEL_PATH)
+    engine = compile_model(model)
+    trees = engine.trees_using([28])
+    assert 0 < len(trees) <= engine.n_trees
+    for tree in range(engine.n_trees):
+        start = engine.roots[tree]
+        end = engine.roots[tree + 1] if tree + 1 < engine.n_trees else len(engine.feature)
+        splits = (~engine.is_leaf[start:end]) & (engine.feature[start:end] == 28)
+        assert splits.any() == (tree in trees)
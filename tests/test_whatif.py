@@ -0,0 +1,55 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+from tree_engine import compile_model
+from whatif import WhatIfEngine, contiguous_runs
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "backend", "best_model_lgb_no.pkl")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def whatif(model):
+    return WhatIfEngine.for_model(compile_model(model), model)
+
+
+def reference(model, row):
+    """Probabilité et valeurs SHAP recalculées entièrement par LightGBM."""
+    return model.predict_proba(row[None])[0, 1], model.booster_.predict(row[None], pred_contrib=True)[0, :-1]
+
+
+def test_contiguous_runs():
+    """Les indices d'arbres sont regroupés en plages contiguës."""
+    assert contiguous_runs(np.array([0, 1, 2, 5, 7, 8])) == [(0, 3), (5, 6), (7, 9)]
+    assert contiguous_runs(np.array([], dtype=int)) == []
+
+
+@pytest.mark.parametrize("overrides", [{0: 3.0}, {28: 0.9}, {0: 2.0, 6: -12000.0}, {}])
+def test_incremental_update_matches_full_recomputation(model, whatif, overrides):
+    """La mise à jour incrémentale donne la même probabilité et les mêmes SHAP qu'un recalcul complet."""
+    base_row = np.random.default_rng(0).normal(size=model.n_features_in_)
+    _, base_shap = reference(model, base_row)
+    probability, shap_values, _ = whatif.evaluate(base_row, base_shap, overrides)
+
+    row = base_row.copy()
+    for index, value in overrides.items():
+        row[index] = value
+    expected_probability, expected_shap = reference(model, row)
+    assert abs(probability - expected_probability) <= 1e-9
+    np.testing.assert_allclose(shap_values, expected_shap, rtol=0, atol=1e-9)
+
+
+def test_sweep_matches_predict_proba(model, whatif):
+    """Le balayage d'une feature reproduit predict_proba sur chaque valeur."""
+    base_row = np.random.default_rng(1).normal(size=model.n_features_in_)
+    values = np.linspace(0, 1, 7)
+    matrix = np.tile(base_row, (len(values), 1))
+    matrix[:, 28] = values
+    np.testing.assert_allclose(whatif.sweep(base_row, 28, values), model.predict_proba(matrix)[:, 1],
+                               rtol=0, atol=1e-9)
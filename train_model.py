@@ -1,51 +1,145 @@
+import hashlib
+import json
 import os
-import pandas as pd
+import re
+import sys
+
 import joblib
 import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Chemin vers les données prétraitées (surchargeable en ligne de commande ou par TRAIN_DATA_PATH)
+DATA_PATH = os.environ.get("TRAIN_DATA_PATH", "/Users/Nelly/Desktop/projet 7/data/clients_data.csv")
+
+# Matrice float32 memory-mappée des features et cibles, réutilisée tant que le CSV ne change pas
+CACHE_DIR = os.environ.get("TRAIN_CACHE_DIR", "")
+
+# Lignes lues par bloc et nombre de threads LightGBM (0 : tous les coeurs)
+CHUNK_ROWS = int(os.environ.get("TRAIN_CHUNK_ROWS", "50000"))
+NUM_THREADS = int(os.environ.get("TRAIN_NUM_THREADS", "0"))
+
+MODEL_PATH = os.path.join(BASE_DIR, "backend", "best_model_lgb_no.pkl")
+FEATURES_PATH = os.path.join(BASE_DIR, "backend", "selected_features.txt")
+
+FEATURES_FILE = "features.npy"
+TARGET_FILE = "target.npy"
+META_FILE = "meta.json"
+
+
+def clean_column(name):
+    """Nettoyer un nom de colonne (caractères spéciaux et espaces remplacés par _)."""
+    return re.sub(r"[^\w\s]", "_", name).replace(" ", "_")
+
+
+def source_digest(path):
+    """Empreinte bon marché du CSV (taille, date de modification, premier Mo)."""
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(1 << 20))
+    return digest.hexdigest()[:12]
+
+
+def count_rows(path):
+    n_lines = 0
+    last = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            n_lines += block.count(b"\n")
+            last = block
+    return n_lines - 1 if n_lines and last.endswith(b"\n") else n_lines
+
+
+def build_training_matrix(csv_path, cache_dir, chunk_rows=CHUNK_ROWS):
+    """Convertir le CSV en matrice float32 memory-mappée, bloc par bloc.
+
+    Le nettoyage des noms de colonnes et le contrôle des valeurs manquantes sont faits
+    sur chaque bloc : la mémoire reste bornée à un bloc, quelle que soit la taille du
+    CSV. Renvoie (features memory-mappées, cible, noms des features nettoyés).
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    if "SK_ID_CURR" not in header or "TARGET" not in header:
+        raise ValueError("Les colonnes 'SK_ID_CURR' et 'TARGET' doivent être présentes dans les données.")
+    raw_features = [col for col in header if col not in ("SK_ID_CURR", "TARGET")]
+    features = [clean_column(col) for col in raw_features]
+
+    n_rows = count_rows(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    features_path = os.path.join(cache_dir, FEATURES_FILE)
+    matrix = np.lib.format.open_memmap(f"{features_path}.tmp", mode="w+", dtype=np.float32,
+                                       shape=(n_rows, len(features)))
+    target = np.empty(n_rows, dtype=np.int8)
+
+    start = 0
+    dtypes = {col: np.float32 for col in raw_features}
+    for chunk in pd.read_csv(csv_path, usecols=raw_features + ["TARGET"], dtype=dtypes, chunksize=chunk_rows):
+        values = chunk[raw_features].to_numpy(dtype=np.float32)
+        if np.isnan(values).any():
+            raise ValueError("Des valeurs manquantes existent encore dans les données !")
+        matrix[start:start + len(chunk)] = values
+        target[start:start + len(chunk)] = chunk["TARGET"].to_numpy()
+        start += len(chunk)
+        print(f"{start}/{n_rows} lignes converties")
+    if start != n_rows:
+        raise ValueError(f"Nombre de lignes incohérent : {start} lues, {n_rows} attendues.")
+
+    matrix.flush()
+    del matrix
+    os.replace(f"{features_path}.tmp", features_path)
+    np.save(os.path.join(cache_dir, TARGET_FILE), target)
+    with open(os.path.join(cache_dir, META_FILE), "w") as f:
+        json.dump({"features": features, "rows": n_rows, "source_digest": source_digest(csv_path)}, f)
+    return np.load(features_path, mmap_mode="r"), target, features
+
 
-# Chemin vers les données prétraitées
-DATA_PATH = "/Users/Nelly/Desktop/projet 7/data/clients_data.csv"
+def load_training_matrix(csv_path, cache_dir, chunk_rows=CHUNK_ROWS):
+    """Matrice d'entraînement depuis le cache si le CSV n'a pas changé, sinon reconstruite."""
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["source_digest"] == source_digest(csv_path):
+            print(f"Matrice d'entraînement réutilisée depuis {cache_dir}")
+            matrix = np.load(os.path.join(cache_dir, FEATURES_FILE), mmap_mode="r")
+            return matrix, np.load(os.path.join(cache_dir, TARGET_FILE)), meta["features"]
+    return build_training_matrix(csv_path, cache_dir, chunk_rows)
 
-# Vérifiez si le fichier de données existe
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError(f"Fichier de données introuvable : {DATA_PATH}")
 
-# Charger les données prétraitées
-print("Chargement des données prétraitées...")
-df = pd.read_csv(DATA_PATH)
+def train(matrix, target, features, num_threads=NUM_THREADS):
+    """Entraîner le LGBMClassifier sur la matrice memory-mappée (aucune copie pandas)."""
+    model = lgb.LGBMClassifier(random_state=42, n_jobs=num_threads or os.cpu_count())
+    model.fit(matrix, target, feature_name=features)
+    return model
 
-# Vérifier si 'SK_ID_CURR' et 'TARGET' sont présents
-if 'SK_ID_CURR' not in df.columns or 'TARGET' not in df.columns:
-    raise ValueError("Les colonnes 'SK_ID_CURR' et 'TARGET' doivent être présentes dans les données.")
 
-# Nettoyer les noms des colonnes (supprimer les caractères spéciaux et espaces)
-df.columns = df.columns.str.replace(r"[^\w\s]", "_", regex=True).str.replace(" ", "_")
-print(f"Noms de colonnes nettoyés : {df.columns.tolist()}")
+def main(csv_path):
+    # Vérifiez si le fichier de données existe
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Fichier de données introuvable : {csv_path}")
+    cache_dir = CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(csv_path)), "train_cache")
 
-# Exclure 'SK_ID_CURR' et 'TARGET' lors de la définition des features
-X = df.drop(columns=['SK_ID_CURR', 'TARGET'])
-y = df['TARGET']
+    # Charger les données prétraitées par blocs
+    print("Chargement des données prétraitées...")
+    matrix, target, features = load_training_matrix(csv_path, cache_dir)
+    print(f"Colonnes utilisées pour l'entraînement : {features}")
 
-# Vérifier les colonnes utilisées pour l'entraînement
-print(f"Colonnes utilisées pour l'entraînement : {X.columns.tolist()}")
+    # Entraîner le modèle
+    print("Entraînement du modèle LightGBM...")
+    model = train(matrix, target, features)
 
-# Vérifier les valeurs manquantes
-if X.isnull().sum().sum() > 0:
-    raise ValueError("Des valeurs manquantes existent encore dans les données !")
+    # Sauvegarder le modèle entraîné
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    joblib.dump(model, MODEL_PATH)
+    print(f"Modèle sauvegardé dans : {MODEL_PATH}")
 
-# Entraîner le modèle
-print("Entraînement du modèle LightGBM...")
-model = lgb.LGBMClassifier(random_state=42)
-model.fit(X, y)
+    # Sauvegarder les colonnes utilisées pour l'entraînement
+    with open(FEATURES_PATH, "w") as f:
+        f.write(",".join(features))
+    print(f"Colonnes sauvegardées dans : {FEATURES_PATH}")
 
-# Sauvegarder le modèle entraîné
-MODEL_PATH = os.path.join("backend", "best_model_lgb_no.pkl")
-os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-joblib.dump(model, MODEL_PATH)
-print(f"Modèle sauvegardé dans : {MODEL_PATH}")
 
-# Sauvegarder les colonnes utilisées pour l'entraînement
-FEATURES_PATH = os.path.join("backend", "selected_features.txt")
-with open(FEATURES_PATH, "w") as f:
-    f.write(",".join(X.columns.tolist()))
-print(f"Colonnes sauvegardées dans : {FEATURES_PATH}")
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH)